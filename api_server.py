@@ -0,0 +1,376 @@
+"""Asynchronous HTTP/JSON API to generate resumes without the Streamlit interface.
+
+Routes (authentication: "Authorization: Bearer <key>" header, keys in API_KEYS):
+    GET  /health                    server state and MongoDB ping
+    POST /resumes                   generates a resume; JSON body with the batch_generate.py fields
+    GET  /resumes                   lists the account's generations (?cursor= for the next page)
+    GET  /resumes/{id}              text and structure of one generation
+    GET  /resumes/{id}/{format}     docx, pdf, txt or html file (?template= for another template)
+
+Usage:
+    python api_server.py --port 8000
+    curl -X POST -H "Authorization: Bearer chave" -d @candidato.json http://127.0.0.1:8000/resumes
+
+A single process keeps hundreds of requests in flight: the OpenAI calls run on the
+GenerationService loop, MongoDB and file exports in a thread pool (and the .docx in the
+render_worker process pool), and the server loop only waits for the results.
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+from urllib.parse import parse_qs, urlsplit
+
+from bson.errors import InvalidId
+from dotenv import load_dotenv
+
+# Started with python api_server.py: the settings of every module below may come from .env
+load_dotenv()
+
+import batch_generate
+import instrumentation
+import render_worker
+import resume_export
+import resume_generator as rg
+
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+# Comma-separated "key:email" pairs; each key generates on behalf of that account
+API_KEYS = dict(
+    pair.strip().split(":", 1) for pair in os.getenv("API_KEYS", "").split(",") if ":" in pair
+)
+# Generations allowed per account through the API
+API_GENERATION_LIMIT = int(os.getenv("API_GENERATION_LIMIT", str(rg.GENERATION_LIMIT)))
+API_MAX_BODY_BYTES = int(os.getenv("API_MAX_BODY_BYTES", str(1024 * 1024)))
+# Threads for MongoDB calls and file exports, which would otherwise block the event loop
+API_EXECUTOR_THREADS = int(os.getenv("API_EXECUTOR_THREADS", "32"))
+
+HTTP_REASONS = {
+    200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 402: "Payment Required",
+    404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error",
+    501: "Not Implemented", 502: "Bad Gateway", 503: "Service Unavailable",
+}
+
+
+# Error answered to the client with an HTTP status and a message
+class APIError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# Response of a route: status, body bytes, content type and extra headers
+class Response:
+    def __init__(self, status, body, content_type="application/json", headers=None):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    @classmethod
+    def json(cls, status, payload):
+        return cls(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+
+# Function to read the Content-Length header; None when it is not a non-negative integer
+def content_length(headers):
+    value = headers.get("content-length", "") or "0"
+    if not (value.isascii() and value.isdigit()):
+        return None
+    return int(value)
+
+
+# Request counters of the API, exported with the other metrics
+class APIMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.generations = 0
+
+    def snapshot(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "generations": self.generations,
+        }
+
+
+# The API: routes, authentication and the HTTP/1.1 connection handling
+class ResumeAPI:
+    def __init__(self, collection, history, templates_dir, service=None, api_keys=None,
+                 generation_limit=API_GENERATION_LIMIT, executor_threads=API_EXECUTOR_THREADS):
+        self.collection = collection
+        self.history = history
+        self.templates_dir = templates_dir
+        self.service = service or rg.get_generation_service()
+        self.api_keys = API_KEYS if api_keys is None else api_keys
+        self.generation_limit = generation_limit
+        self.executor = ThreadPoolExecutor(max_workers=executor_threads, thread_name_prefix="api")
+        self.metrics = APIMetrics()
+
+    # Function to run a blocking call in the API thread pool
+    async def blocking(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    # Function to run a coroutine on the generation service loop and wait for it here
+    async def on_service_loop(self, coroutine):
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self.service.loop))
+
+    def authenticate(self, headers):
+        scheme, _, key = headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and key:
+            for known_key, email in self.api_keys.items():
+                if hmac.compare_digest(known_key.encode("utf-8"), key.encode("utf-8")):
+                    return email
+        raise APIError(401, "Chave de API inválida ou ausente.")
+
+    async def route(self, method, path, query, headers, body):
+        parts = [part for part in path.split("/") if part]
+        if parts == ["health"]:
+            if method != "GET":
+                raise APIError(405, "Método não permitido.")
+            mongodb = await self.blocking(rg.check_mongodb_health, self.collection.database.client)
+            return Response.json(200 if mongodb["ok"] else 503, {"ok": mongodb["ok"], "mongodb": mongodb, **self.metrics.snapshot()})
+        if not parts or parts[0] != "resumes" or len(parts) > 3:
+            raise APIError(404, "Rota não encontrada.")
+
+        email = self.authenticate(headers)
+        if len(parts) == 1:
+            if method == "POST":
+                return await self.create_resume(email, body)
+            if method == "GET":
+                return await self.list_resumes(email, query)
+        elif method == "GET":
+            entry = await self.blocking(rg.get_history_entry, self.history, email, parts[1])
+            if entry is None:
+                raise APIError(404, "Currículo não encontrado.")
+            if len(parts) == 2:
+                return self.resume_detail(entry)
+            return await self.export_file(entry, parts[2], query)
+        raise APIError(405, "Método não permitido.")
+
+    def resume_summary(self, entry):
+        return {
+            "id": str(entry["_id"]),
+            "created_at": entry["created_at"].replace(tzinfo=timezone.utc).isoformat(),
+            "template": entry["template"],
+        }
+
+    def resume_detail(self, entry):
+        content = rg.history_content(entry)
+        resume = rg.load_resume(content)
+        return Response.json(200, {
+            **self.resume_summary(entry),
+            "text": rg.resume_display_text(content, resume),
+            "resume": resume.to_dict(),
+        })
+
+    async def create_resume(self, email, body):
+        try:
+            record = json.loads(body or b"{}")
+        except ValueError:
+            raise APIError(400, "O corpo deve ser um objeto JSON.")
+        if not isinstance(record, dict) or not record.get("name"):
+            raise APIError(400, "Informe pelo menos o campo \"name\".")
+        template_name = record.get("template") or None
+        templates, _ = await self.blocking(rg.scan_templates, self.templates_dir)
+        if not templates:
+            raise APIError(503, "Nenhum template disponível no servidor.")
+        template_name = template_name or templates[0]
+        if template_name not in templates:
+            raise APIError(400, f"Template desconhecido: {template_name}")
+
+        # The account behind the API key, not the body, is the one generating
+        record = {**record, "email": email}
+        gen_args = batch_generate.generation_args(record)
+        response_cache = rg.get_response_cache()
+        cache_key = rg.resume_cache_key(*gen_args)
+        start = time.perf_counter()
+        resume_content = await self.blocking(response_cache.get, cache_key)
+        from_cache = resume_content is not None
+
+        if not from_cache:
+            # Reserve the credit up front, as the UI does, and give it back if the model call fails
+            new_count = await self.blocking(rg.reserve_generation, email, self.collection, self.generation_limit)
+            if new_count is None:
+                raise APIError(402, f"Limite de {self.generation_limit} currículos atingido para esta conta.")
+            messages = rg.build_resume_messages(*gen_args)
+            try:
+                if rg.RESUME_OUTPUT_FORMAT == "json":
+                    _, resume_content = await self.on_service_loop(rg.complete_resume_json(self.service, messages))
+                else:
+                    resume_content = await self.on_service_loop(self.service.complete(messages))
+            except Exception as e:
+                await self.blocking(rg.refund_generation, email, self.collection)
+                raise APIError(502, f"Erro ao gerar o currículo: {e}")
+            await self.blocking(response_cache.set, cache_key, resume_content)
+        generation_time = time.perf_counter() - start
+
+        entry_id = await self.blocking(
+            rg.record_generation, self.history, email, cache_key, resume_content, template_name,
+            (gen_args[0], gen_args[2], gen_args[9]), {"api_generation": generation_time},
+        )
+        if entry_id is None:
+            raise APIError(500, "Não foi possível gravar o currículo gerado.")
+        self.metrics.generations += 1
+        resume = rg.load_resume(resume_content)
+        return Response.json(201, {
+            "id": str(entry_id),
+            "template": template_name,
+            "from_cache": from_cache,
+            "text": rg.resume_display_text(resume_content, resume),
+            "resume": resume.to_dict(),
+            "files": {export_format: f"/resumes/{entry_id}/{export_format}" for export_format in resume_export.EXPORT_FORMATS},
+        })
+
+    async def list_resumes(self, email, query):
+        cursor = query.get("cursor", [None])[0]
+        try:
+            entries, next_cursor = await self.blocking(rg.list_history, self.history, email, cursor)
+        except (ValueError, InvalidId):
+            raise APIError(400, "Cursor inválido.")
+        return Response.json(200, {
+            "resumes": [self.resume_summary(entry) for entry in entries],
+            "next_cursor": next_cursor,
+        })
+
+    async def export_file(self, entry, export_format, query):
+        if export_format not in resume_export.EXPORT_FORMATS:
+            raise APIError(404, f"Formato desconhecido: {export_format}")
+        template_name = query.get("template", [entry["template"]])[0]
+        try:
+            files = await self.blocking(rg.render_history_entry, entry, self.templates_dir, template_name, (export_format,))
+        except render_worker.RenderQueueFull:
+            raise APIError(503, "O servidor está ocupado. Tente novamente em instantes.")
+        _, mime, extension = resume_export.EXPORT_FORMATS[export_format]
+        return Response(200, files[export_format], mime, {
+            "Content-Disposition": f'attachment; filename="curriculo-{entry["_id"]}.{extension}"',
+        })
+
+    async def respond(self, method, target, headers, body):
+        url = urlsplit(target)
+        self.metrics.requests += 1
+        self.metrics.in_flight += 1
+        self.metrics.max_in_flight = max(self.metrics.max_in_flight, self.metrics.in_flight)
+        try:
+            with instrumentation.stage("api_request"):
+                return await self.route(method, url.path, parse_qs(url.query), headers, body)
+        except APIError as e:
+            self.metrics.errors += 1
+            return Response.json(e.status, {"error": e.message})
+        except Exception as e:
+            self.metrics.errors += 1
+            print(f"Erro inesperado na API: {e}")
+            return Response.json(500, {"error": "Erro interno do servidor."})
+        finally:
+            self.metrics.in_flight -= 1
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    return
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+
+                # Chunked bodies are not read, so the connection is closed rather than reading
+                # the body as the next request; with Content-Length as well, the framing is ambiguous
+                if "transfer-encoding" in headers:
+                    if "content-length" in headers:
+                        response = Response.json(400, {"error": "Transfer-Encoding e Content-Length na mesma requisição."})
+                    else:
+                        response = Response.json(501, {"error": "Transfer-Encoding não suportado; envie Content-Length."})
+                    keep_alive = False
+                elif (length := content_length(headers)) is None:
+                    response = Response.json(400, {"error": "Cabeçalho Content-Length inválido."})
+                    keep_alive = False
+                elif length > API_MAX_BODY_BYTES:
+                    response = Response.json(413, {"error": "Corpo da requisição muito grande."})
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    response = await self.respond(method.upper(), target, headers, body)
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+                header_block = [
+                    f"HTTP/1.1 {response.status} {HTTP_REASONS.get(response.status, '')}",
+                    f"Content-Type: {response.content_type}",
+                    f"Content-Length: {len(response.body)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}",
+                ] + [f"{name}: {value}" for name, value in response.headers.items()]
+                writer.write(("\r\n".join(header_block) + "\r\n\r\n").encode("latin-1") + response.body)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=API_HOST, port=API_PORT, ready=None):
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+# Function to build the API on the app's MongoDB collections
+def create_api():
+    collection = rg.connect_to_mongodb()
+    if collection is None:
+        raise SystemExit("Não foi possível conectar ao MongoDB.")
+    _, templates_dir = rg.list_templates()
+    api = ResumeAPI(collection, rg.get_history_collection(), templates_dir)
+    instrumentation.registry.register_collector("api", api.metrics.snapshot)
+    return api
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor da API de geração de currículos.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    if not rg.OPENAI_API_KEY:
+        raise SystemExit("Configure a variável OPENAI_API_KEY.")
+    if not API_KEYS:
+        print("Aviso: API_KEYS está vazio; nenhuma chave consegue gerar currículos.")
+    if instrumentation.METRICS_ENABLED:
+        instrumentation.start_metrics_server()
+
+    api = create_api()
+    print(f"API de currículos em http://{args.host}:{args.port}")
+    try:
+        asyncio.run(api.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Batch generation of resumes from a CSV or JSONL file, without the Streamlit interface.
+
+Usage:
+    python batch_generate.py candidatos.csv --output-dir curriculos/
+    python batch_generate.py candidatos.jsonl --zip curriculos.zip --template template2.docx
+
+Each record accepts the fields id, name, email, phone, linkedin, industry, job_type,
+experiences, educations, skills, languages and template. In JSONL, experiences and
+educations may be lists of objects (company, title, start_date, end_date, duties / degree,
+institution, graduation_date); in CSV they are free text, one item per line.
+
+Progress is written to a checkpoint file, so running the same command again continues
+where it stopped and only redoes the records that failed.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+import zipfile
+
+from dotenv import load_dotenv
+
+# Run as a script: load .env before the modules below read their settings
+load_dotenv()
+
+import render_worker
+import resume_generator as rg
+
+
+# Function to read candidate records from a CSV or JSONL file
+def read_records(path):
+    with open(path, "r", encoding="utf-8-sig") as file:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            return [json.loads(line) for line in file if line.strip()]
+        return list(csv.DictReader(file))
+
+
+# Function to give each record a stable id, used by the checkpoint
+def record_id(record):
+    if record.get("id"):
+        return str(record["id"])
+    payload = json.dumps(record, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+# Function to turn a list field into a list of strings
+def as_list(value, separator=","):
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value or "").split(separator) if item.strip()]
+
+
+# Function to format the experiences the same way as the Streamlit form
+def format_experiences(value):
+    if isinstance(value, list):
+        entries = [
+            f"{exp.get('title', '')} na {exp.get('company', '')} ({exp.get('start_date', '')} - {exp.get('end_date', '')}): {exp.get('duties', '')}"
+            if isinstance(exp, dict) else str(exp)
+            for exp in value
+        ]
+    else:
+        entries = as_list(value, "\n")
+    return "\n".join(f"- {entry}" for entry in entries)
+
+
+# Function to format the educations the same way as the Streamlit form
+def format_educations(value):
+    if isinstance(value, list):
+        entries = [
+            f"{edu.get('degree', '')} na {edu.get('institution', '')} ({edu.get('graduation_date', '')})"
+            if isinstance(edu, dict) else str(edu)
+            for edu in value
+        ]
+    else:
+        entries = as_list(value, "\n")
+    return "\n".join(f"- {entry}" for entry in entries)
+
+
+# Function to build the generate_resume arguments of a record
+def generation_args(record):
+    return (
+        # CSV rows with missing columns hold None
+        record.get("name") or "", record.get("email") or "", record.get("phone") or "",
+        record.get("industry") or "", record.get("job_type") or "",
+        format_experiences(record.get("experiences")), format_educations(record.get("educations")),
+        as_list(record.get("skills")), as_list(record.get("languages")), record.get("linkedin") or "",
+    )
+
+
+# Function to build a safe output file name for a record
+def output_name(record, rid):
+    slug = re.sub(r"[^a-z0-9]+", "-", str(record.get("name") or "").lower()).strip("-") or "curriculo"
+    return f"{slug}-{rid}.docx"
+
+
+# Progress of a batch, appended to a JSONL checkpoint file
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        if entry.get("status") == "done":
+                            self.done.add(entry["id"])
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, rid, status, **details):
+        self._file.write(json.dumps({"id": rid, "status": status, **details}, ensure_ascii=False) + "\n")
+        self._file.flush()
+        if status == "done":
+            self.done.add(rid)
+
+    def close(self):
+        self._file.close()
+
+
+# Per-stage durations of a batch
+class StageTimings:
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        self.stages.setdefault(stage, []).append(seconds)
+
+    def report(self):
+        lines = []
+        for stage, values in self.stages.items():
+            ordered = sorted(values)
+            p95 = ordered[int(0.95 * (len(ordered) - 1))]
+            lines.append(f"  {stage:<10} n={len(values):<5} média={sum(values) / len(values):.2f}s p95={p95:.2f}s máx={ordered[-1]:.2f}s")
+        return "\n".join(lines)
+
+
+# Function to generate one record: model call, render in the pool, then write the file
+async def process_record(record, rid, args, service, render_pool, limiter, writer, checkpoint, timings, templates_dir):
+    async with limiter:
+        try:
+            gen_args = generation_args(record)
+            response_cache = rg.get_response_cache()
+            cache_key = rg.resume_cache_key(*gen_args)
+
+            start = time.perf_counter()
+            resume_content = response_cache.get(cache_key)
+            if resume_content is None:
+                messages = rg.build_resume_messages(*gen_args)
+                if rg.RESUME_OUTPUT_FORMAT == "json":
+                    future = asyncio.run_coroutine_threadsafe(rg.complete_resume_json(service, messages), service.loop)
+                    _, resume_content = await asyncio.wrap_future(future)
+                else:
+                    future = asyncio.run_coroutine_threadsafe(service.complete(messages), service.loop)
+                    resume_content = await asyncio.wrap_future(future)
+                response_cache.set(cache_key, resume_content)
+            timings.add("geração", time.perf_counter() - start)
+
+            start = time.perf_counter()
+            template_name = record.get("template") or args.template
+            doc_bytes, render_time, _ = await asyncio.wrap_future(render_pool.submit(
+                resume_content, gen_args[0], gen_args[1], gen_args[2], gen_args[9], template_name, templates_dir
+            ))
+            timings.add("render", render_time)
+            timings.add("fila", time.perf_counter() - start - render_time)
+
+            start = time.perf_counter()
+            filename = output_name(record, rid)
+            writer(filename, doc_bytes)
+            timings.add("gravação", time.perf_counter() - start)
+
+            checkpoint.record(rid, "done", file=filename)
+            return True
+        except Exception as e:
+            print(f"Falha no registro {rid}: {e}")
+            checkpoint.record(rid, "failed", error=str(e))
+            return False
+
+
+async def run_batch(args):
+    records = read_records(args.input)
+    if args.limit:
+        records = records[:args.limit]
+
+    templates, templates_dir = rg.list_templates()
+    if not args.template:
+        if not templates:
+            raise SystemExit("Nenhum template encontrado na pasta 'templates'.")
+        args.template = templates[0]
+
+    checkpoint_path = args.checkpoint or f"{args.zip or args.output_dir.rstrip(os.sep)}.checkpoint.jsonl"
+    checkpoint = Checkpoint(checkpoint_path)
+    pending = [(record, record_id(record)) for record in records]
+    pending = [(record, rid) for record, rid in pending if rid not in checkpoint.done]
+    print(f"{len(records)} registros, {len(records) - len(pending)} já concluídos, {len(pending)} a gerar.")
+
+    # Output goes either to a directory or to a single zip (appended to when resuming)
+    archive = None
+    if args.zip:
+        archive = zipfile.ZipFile(args.zip, "a", compression=zipfile.ZIP_DEFLATED)
+
+        def writer(filename, data):
+            archive.writestr(filename, data)
+    else:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+        def writer(filename, data):
+            with open(os.path.join(args.output_dir, filename), "wb") as file:
+                file.write(data)
+
+    service = rg.get_generation_service()
+    limiter = asyncio.Semaphore(args.concurrency)
+    timings = StageTimings()
+    start = time.perf_counter()
+    # At most `concurrency` records render at once, so submitting to the pool never blocks the loop
+    render_pool = render_worker.RenderPool(templates_dir, workers=args.workers, max_pending=args.concurrency)
+    try:
+        results = await asyncio.gather(*[
+            process_record(record, rid, args, service, render_pool, limiter, writer, checkpoint, timings, templates_dir)
+            for record, rid in pending
+        ])
+    finally:
+        render_pool.shutdown()
+        checkpoint.close()
+        if archive is not None:
+            archive.close()
+    elapsed = time.perf_counter() - start
+
+    succeeded = sum(results)
+    print(f"\nConcluídos: {succeeded}, falhas: {len(results) - succeeded}, tempo total: {elapsed:.1f}s")
+    if elapsed > 0 and succeeded:
+        print(f"Vazão: {succeeded / elapsed * 60:.1f} currículos/minuto")
+    if timings.stages:
+        print("Tempos por etapa:")
+        print(timings.report())
+    print(f"Cache de respostas: {rg.get_response_cache().stats()}")
+    print(f"OpenAI: {service.metrics.snapshot()}")
+    print(f"Render: {render_pool.stats()}")
+    return 0 if succeeded == len(results) else 1
+
+
+# Function to parse a command-line count that must be at least 1
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"deve ser pelo menos 1: {value}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera currículos em lote a partir de um arquivo CSV ou JSONL.")
+    parser.add_argument("input", help="arquivo .csv ou .jsonl com os candidatos")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--output-dir", help="diretório onde gravar os arquivos .docx")
+    output.add_argument("--zip", help="arquivo .zip onde gravar todos os currículos")
+    parser.add_argument("--template", help="template padrão (nome do arquivo em templates/)")
+    parser.add_argument("--checkpoint", help="arquivo de checkpoint (padrão: <saída>.checkpoint.jsonl)")
+    parser.add_argument("--concurrency", type=positive_int, default=rg.OPENAI_MAX_CONCURRENCY,
+                        help="registros processados ao mesmo tempo")
+    parser.add_argument("--workers", type=positive_int, default=os.cpu_count(), help="processos para montar os .docx")
+    parser.add_argument("--limit", type=int, help="processa apenas os primeiros N registros")
+    args = parser.parse_args()
+
+    if not rg.OPENAI_API_KEY:
+        raise SystemExit("Configure a variável OPENAI_API_KEY.")
+    raise SystemExit(asyncio.run(run_batch(args)))
+
+
+if __name__ == "__main__":
+    main()
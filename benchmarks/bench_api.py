@@ -0,0 +1,182 @@
+"""Benchmark: the asyncio JSON API under many concurrent generations.
+
+Starts benchmarks/mock_openai.py and the API (api_server.ResumeAPI) on mongomock, then sends
+--requests POST /resumes at once from --clients connections and reports throughput, latency
+and the most requests the server had in flight. Afterwards it checks the other routes: the
+listing, one resume, every export format (the .docx read back with python-docx), the
+401 / 402 / 404 answers, and that a request with Transfer-Encoding is refused and its
+connection closed without answering the body as another request.
+
+Run with: python benchmarks/bench_api.py [--requests 200] [--latency 1.0]
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+# The app's own rate limit would otherwise be what this measures
+os.environ.setdefault("OPENAI_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("OPENAI_MAX_CONCURRENCY", "1000")
+os.environ.setdefault("OPENAI_BURST", "1000")
+os.environ.setdefault("RESPONSE_CACHE_BACKEND", "memory")
+
+from docx import Document  # noqa: E402
+
+import api_server  # noqa: E402
+import resume_generator as rg  # noqa: E402
+from mock_openai import start_mock_openai  # noqa: E402
+
+API_KEY = "bench-key"
+API_EMAIL = "api-bench@example.com"
+
+
+# Function to send one HTTP/1.1 request on a new connection; returns (status, headers, body)
+async def http_request(port, method, path, payload=None, key=API_KEY):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    headers = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(body)}", "Connection: close"]
+    if key:
+        headers.append(f"Authorization: Bearer {key}")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    response_headers = {name.lower(): value.strip() for name, _, value in (line.partition(":") for line in header_lines)}
+    return int(status_line.split(" ")[1]), response_headers, content
+
+
+# Function to send raw bytes on a new connection; returns everything the server sent until it closed
+async def raw_request(port, data):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    await writer.drain()
+    response = await asyncio.wait_for(reader.read(), timeout=5)
+    writer.close()
+    return response
+
+
+def candidate(i):
+    return {
+        "name": f"Candidata {i}",
+        "phone": "+258 84 000 0000",
+        "industry": "Tecnologia",
+        "job_type": "Desenvolvedor",
+        "experiences": [{"title": "Analista", "company": "ABC", "start_date": "01/2020", "end_date": "12/2023", "duties": f"dashboards {i}"}],
+        "educations": [{"degree": "Bacharel", "institution": "UEM", "graduation_date": "2019"}],
+        "skills": "Python, SQL",
+        "languages": "Português, Inglês",
+    }
+
+
+# Function to start the API on a background loop; returns (api, port)
+def start_api(collection, history, templates_dir, generation_limit):
+    api = api_server.ResumeAPI(collection, history, templates_dir, api_keys={API_KEY: API_EMAIL},
+                               generation_limit=generation_limit)
+    started = threading.Event()
+    server_holder = {}
+
+    def ready(server):
+        server_holder["port"] = server.sockets[0].getsockname()[1]
+        started.set()
+
+    thread = threading.Thread(target=lambda: asyncio.run(api.serve("127.0.0.1", 0, ready)), name="api", daemon=True)
+    thread.start()
+    started.wait()
+    return api, server_holder["port"]
+
+
+async def run(args, port):
+    # Generations: many at once, each on its own connection
+    semaphore = asyncio.Semaphore(args.clients)
+
+    async def generate(i):
+        async with semaphore:
+            start = time.perf_counter()
+            status, _, body = await http_request(port, "POST", "/resumes", candidate(i))
+            return status, time.perf_counter() - start, body
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[generate(i) for i in range(args.requests)])
+    elapsed = time.perf_counter() - start
+    durations = sorted(duration for status, duration, _ in results if status == 201)
+    errors = [status for status, _, _ in results if status != 201]
+    print(f"{len(durations)} generations in {elapsed:.2f}s ({len(durations) / elapsed:.1f}/s), {len(errors)} errors {errors[:5]}")
+    if durations:
+        p95 = durations[math.ceil(0.95 * len(durations)) - 1]
+        print(f"latency: mean {statistics.fmean(durations):.2f}s p95 {p95:.2f}s (model latency {args.latency}s)")
+
+    checks = []
+    created = json.loads(next(body for status, _, body in results if status == 201))
+    status, _, body = await http_request(port, "GET", "/resumes")
+    listing = json.loads(body)
+    checks.append(("GET /resumes", status == 200 and len(listing["resumes"]) == rg.HISTORY_PAGE_SIZE and listing["next_cursor"]))
+    status, _, body = await http_request(port, "GET", f"/resumes?cursor={listing['next_cursor']}")
+    checks.append(("GET /resumes?cursor", status == 200 and json.loads(body)["resumes"][0]["id"] != listing["resumes"][0]["id"]))
+    status, _, body = await http_request(port, "GET", f"/resumes/{created['id']}")
+    checks.append(("GET /resumes/{id}", status == 200 and json.loads(body)["resume"]["experiences"]))
+    for export_format in ("docx", "pdf", "txt", "html"):
+        status, headers, body = await http_request(port, "GET", f"/resumes/{created['id']}/{export_format}")
+        ok = status == 200 and body
+        if ok and export_format == "docx":
+            ok = Document(io.BytesIO(body)).paragraphs[0].text.startswith("Candidata")
+        checks.append((f"GET /resumes/{{id}}/{export_format} ({headers.get('content-type')})", ok))
+    status, _, _ = await http_request(port, "GET", "/resumes", key="wrong")
+    checks.append(("401 for a wrong key", status == 401))
+    status, _, _ = await http_request(port, "GET", "/resumes/000000000000000000000000/docx")
+    checks.append(("404 for an unknown id", status == 404))
+    status, _, _ = await http_request(port, "POST", "/resumes", {"name": "Sem crédito", "experiences": "nova"})
+    checks.append(("402 after the generation limit", status == 402))
+    # A chunked body holding a second request, which must not be answered
+    smuggled = b"GET /resumes HTTP/1.1\r\nHost: localhost\r\nAuthorization: Bearer " + API_KEY.encode() + b"\r\n\r\n"
+    chunked = b"%x\r\n%s\r\n0\r\n\r\n" % (len(smuggled), smuggled)
+    head = b"POST /resumes HTTP/1.1\r\nHost: localhost\r\nAuthorization: Bearer " + API_KEY.encode() + b"\r\nTransfer-Encoding: chunked\r\n"
+    response = await raw_request(port, head + b"\r\n" + chunked)
+    checks.append(("501 for Transfer-Encoding, connection closed", response.startswith(b"HTTP/1.1 501 ") and response.count(b"HTTP/1.1 ") == 1))
+    response = await raw_request(port, head + b"Content-Length: 0\r\n\r\n" + smuggled)
+    checks.append(("400 for Transfer-Encoding with Content-Length, connection closed",
+                   response.startswith(b"HTTP/1.1 400 ") and response.count(b"HTTP/1.1 ") == 1))
+    status, _, body = await http_request(port, "GET", "/health", key=None)
+    health = json.loads(body)
+    print(f"max requests in flight: {health['max_in_flight']}")
+    for name, ok in checks:
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}")
+    return all(ok for _, ok in checks) and not errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=200, help="connections open at the same time")
+    parser.add_argument("--latency", type=float, default=1.0, help="mock model latency (seconds)")
+    args = parser.parse_args()
+
+    import mongomock
+
+    server, base_url = start_mock_openai(latency=args.latency)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    db = mongomock.MongoClient()["resume_generator_bench"]
+    collection = db[rg.COLLECTION_NAME]
+    history = db[rg.HISTORY_COLLECTION]
+    collection.insert_one({"email": API_EMAIL, "password": "x", "generation_count": 0})
+    _, templates_dir = rg.list_templates()
+    api, port = start_api(collection, history, templates_dir, generation_limit=args.requests)
+    try:
+        ok = asyncio.run(run(args, port))
+    finally:
+        server.shutdown()
+        api.close()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Benchmark: cold-start import time of the app's modules, measured with python -X importtime.
+
+Each module is imported in a fresh interpreter --repeat times (after one discarded run that
+writes the .pyc files) and the cumulative import time Python reports for it is summarized.
+The script also checks which heavy dependencies every import pulled in: the rendering path
+(resume_generator, docx_writer, render_worker, resume_export), the batch CLI and the job
+workers must load neither streamlit, openai nor pymongo, which are imported on first use.
+
+Every run is written to benchmarks/results/ as JSON. The script exits with status 1 when a
+module imports a dependency it should not, when --compare finds an import that got slower
+than the threshold, or when a module takes longer than --max-ms.
+
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --compare benchmarks/results/import-time-baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from run_benchmarks import RESULTS_DIR, find_regressions, summarize  # noqa: E402
+
+# Module -> dependencies its import must not load
+TARGETS = {
+    "resume_generator": ("streamlit", "openai", "pymongo"),
+    "docx_writer": ("streamlit", "openai", "pymongo"),
+    "render_worker": ("streamlit", "openai", "pymongo"),
+    "resume_export": ("streamlit", "openai", "pymongo"),
+    "batch_generate": ("streamlit", "openai", "pymongo"),
+    "api_server": ("streamlit", "openai"),
+    "job_queue": ("streamlit", "openai", "pymongo"),
+}
+
+# "import time: self [us] | cumulative | imported package"
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+# Function to import one module in a new interpreter; returns (cumulative seconds, modules imported)
+def import_once(module):
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "benchmark"))
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=ROOT, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    cumulative = None
+    imported = set()
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        imported.add(match.group(4))
+        if match.group(4) == module and not match.group(3):
+            cumulative = int(match.group(2)) / 1_000_000
+    return cumulative, imported
+
+
+# Function to list the forbidden dependencies (or their submodules) among the imported modules
+def forbidden_imports(imported, forbidden):
+    return sorted(name for name in forbidden if any(m == name or m.startswith(name + ".") for m in imported))
+
+
+def bench_imports(args):
+    results = {}
+    violations = []
+    for module in args.modules:
+        import_once(module)
+        durations = []
+        for _ in range(args.repeat):
+            duration, imported = import_once(module)
+            durations.append(duration)
+        results[f"import/{module}"] = summarize(durations)
+        loaded = forbidden_imports(imported, TARGETS[module])
+        if loaded:
+            violations.append(f"{module} imports {', '.join(loaded)}")
+        results[f"import/{module}"]["heavy_imports"] = loaded
+    return results, violations
+
+
+# Function to record where and how the results were produced
+def run_metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": {key: value for key, value in vars(args).items() if key not in ("compare", "output")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument("--repeat", type=int, default=10, help="fresh interpreters per module")
+    parser.add_argument("--output", help="where to write the JSON results (default: benchmarks/results/import-time-<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative change counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=10, help="smaller slowdowns are ignored as noise")
+    parser.add_argument("--max-ms", type=float, help="fail when any module's median import takes longer")
+    args = parser.parse_args()
+
+    results, problems = bench_imports(args)
+    print(f"{'module':<20} {'p50 (ms)':>9} {'min (ms)':>9} {'p95 (ms)':>9}  heavy imports")
+    for name, metrics in results.items():
+        print(f"{name.split('/', 1)[1]:<20} {metrics['p50_ms']:>9.1f} {metrics['min_ms']:>9.1f} {metrics['p95_ms']:>9.1f}  "
+              f"{', '.join(metrics['heavy_imports']) or '-'}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"import-time-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump({"metadata": run_metadata(args), "results": results}, file, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.max_ms is not None:
+        problems += [f"{name} p50_ms: {metrics['p50_ms']:.1f} > {args.max_ms:.1f}"
+                     for name, metrics in results.items() if metrics["p50_ms"] > args.max_ms]
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        problems += find_regressions(baseline, results, args.threshold, args.min_delta_ms)
+    if problems:
+        print(f"\n{len(problems)} problem(s):")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    print("\nNo regressions." if args.compare else "\nNo heavy imports on the rendering path.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
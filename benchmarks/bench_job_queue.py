@@ -0,0 +1,171 @@
+"""Benchmark: the durable generation queue (job_queue) under a burst, a dead worker and failing model calls.
+
+Runs job_queue.JobWorker instances in this process against benchmarks/mock_openai.py and
+mongomock (or a local mongod with --mongo-uri), in three phases:
+  - burst: --jobs generations are enqueued at once and drained by --workers workers running
+    --concurrency jobs each; prints the enqueue rate, drain throughput and the time from
+    enqueue to result
+  - dead worker: a job is claimed by a worker that never heartbeats; another worker must take
+    it over once its lease expires
+  - failures: half of the model calls fail; jobs are retried and the ones that run out of
+    attempts give the credit back
+Afterwards it checks that every finished job has exactly one history entry, under the job's
+id, that every account was charged once per finished job, and that enqueuing the same
+inputs twice reuses the active job. mongomock is not thread-safe, so two workers now and then
+claim the same job there (counted as a lost lease); MongoDB claims are atomic.
+
+Run with: python benchmarks/bench_job_queue.py [--jobs 200] [--workers 4] [--concurrency 8]
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+# The app's own rate limit would otherwise be what this measures
+os.environ.setdefault("OPENAI_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("OPENAI_MAX_CONCURRENCY", "1000")
+os.environ.setdefault("OPENAI_BURST", "1000")
+os.environ.setdefault("RESPONSE_CACHE_BACKEND", "memory")
+# Failed model calls go straight back to the queue, which does the retrying here
+os.environ.setdefault("OPENAI_MAX_RETRIES", "0")
+os.environ.setdefault("JOB_RETRY_DELAY", "0.1")
+os.environ.setdefault("JOB_IDLE_POLL_SECONDS", "0.05")
+
+import job_queue  # noqa: E402
+import resume_generator as rg  # noqa: E402
+from mock_openai import start_mock_openai  # noqa: E402
+
+BENCH_DB_NAME = "resume_generator_bench"
+LIMIT = 1_000_000
+
+
+def connect(uri):
+    if uri:
+        from pymongo import MongoClient
+        client = MongoClient(uri)
+        client.drop_database(BENCH_DB_NAME)
+        return client
+    import mongomock
+    return mongomock.MongoClient()
+
+
+def generation_args(email, i):
+    return (f"Candidata {i}", email, "+258 84 000 0000", "Tecnologia", "Desenvolvedor",
+            f"- Analista na ABC (01/2020 - 12/2023): dashboards {i}", "- Bacharel na UEM (2019)",
+            ["Python", "SQL"], ["Português", "Inglês"], "")
+
+
+def enqueue(jobs, collection, email, i, template_name):
+    args = generation_args(email, i)
+    job, _ = job_queue.enqueue_job(jobs, collection, args, rg.resume_cache_key(*args), template_name, limit=LIMIT)
+    return job
+
+
+# Function to wait until none of the given jobs is queued or running; returns False on timeout
+def wait_finished(jobs, job_ids, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if not jobs.count_documents({"_id": {"$in": job_ids}, "status": {"$in": list(job_queue.ACTIVE_STATUSES)}}):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=8, help="jobs each worker runs at once")
+    parser.add_argument("--latency", type=float, default=0.5, help="mock model latency (seconds)")
+    parser.add_argument("--lease", type=float, default=2.0, help="lease of the dead worker's job (seconds)")
+    parser.add_argument("--mongo-uri", help="local mongod to use instead of mongomock")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_openai(latency=args.latency, jitter=args.latency / 5)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    client = connect(args.mongo_uri)
+    db = client[BENCH_DB_NAME]
+    collection, history, jobs = db[rg.COLLECTION_NAME], db[rg.HISTORY_COLLECTION], db[rg.JOBS_COLLECTION]
+    jobs.create_index("active_key", unique=True, sparse=True)
+    users = [f"fila{i}@example.com" for i in range(10)]
+    collection.insert_many([{"email": email, "password": "x", "generation_count": 0} for email in users])
+    templates, _ = rg.list_templates()
+    checks = []
+
+    workers = [job_queue.JobWorker(jobs, collection, history, worker_id=f"worker-{i}", concurrency=args.concurrency,
+                                   lease_seconds=max(args.lease, 1) * 5, heartbeat_seconds=0.5)
+               for i in range(args.workers)]
+
+    # Burst: everything is queued before any worker starts
+    start = time.perf_counter()
+    burst = [enqueue(jobs, collection, users[i % 8], i, templates[i % len(templates)]) for i in range(args.jobs)]
+    enqueue_time = time.perf_counter() - start
+    print(f"enqueued {args.jobs} jobs in {enqueue_time:.2f}s ({args.jobs / enqueue_time:.0f}/s)")
+    duplicate = enqueue(jobs, collection, users[0], 0, templates[0])
+    checks.append(("same inputs reuse the active job", duplicate["_id"] == burst[0]["_id"]))
+
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    burst_ids = [job["_id"] for job in burst]
+    drained = wait_finished(jobs, burst_ids, timeout=60 + args.jobs * args.latency)
+    elapsed = time.perf_counter() - start
+    done = list(jobs.find({"_id": {"$in": burst_ids}, "status": job_queue.DONE}))
+    waits = sorted((job["finished_at"] - job["created_at"]).total_seconds() for job in done)
+    print(f"{len(done)} jobs done in {elapsed:.2f}s ({len(done) / elapsed:.1f}/s) with {args.workers} workers x "
+          f"{args.concurrency} (ideal {args.jobs * args.latency / (args.workers * args.concurrency):.2f}s)")
+    if waits:
+        print(f"enqueue to result: mean {statistics.fmean(waits):.2f}s p95 {waits[math.ceil(0.95 * len(waits)) - 1]:.2f}s")
+    checks.append(("burst drained, every job done", drained and len(done) == args.jobs))
+
+    # Dead worker: its lease runs out and a live worker takes the job over
+    abandoned = enqueue(jobs, collection, users[8], 0, templates[0])
+    claimed = None
+    while claimed is None or claimed["_id"] != abandoned["_id"]:
+        claimed = job_queue.claim_job(jobs, "dead-worker", lease_seconds=args.lease)
+    start = time.perf_counter()
+    recovered = wait_finished(jobs, [abandoned["_id"]], timeout=args.lease * 5 + 10)
+    recovered_job = jobs.find_one({"_id": abandoned["_id"]})
+    print(f"dead worker's job finished {time.perf_counter() - start:.2f}s after the claim (lease {args.lease}s), "
+          f"attempts {recovered_job['attempts']}, worker {recovered_job.get('worker')}")
+    checks.append(("dead worker's job taken over after its lease",
+                   recovered and recovered_job["status"] == job_queue.DONE and recovered_job["attempts"] == 2))
+
+    # Failures: half of the model calls fail; the queue retries up to JOB_MAX_ATTEMPTS times
+    server.error_rate = 0.5
+    failing = [enqueue(jobs, collection, users[9], i, templates[0]) for i in range(40)]
+    failing_ids = [job["_id"] for job in failing]
+    retried = wait_finished(jobs, failing_ids, timeout=60)
+    server.error_rate = 0.0
+    statuses = [job["status"] for job in jobs.find({"_id": {"$in": failing_ids}})]
+    print(f"with 50% failing model calls: {statuses.count(job_queue.DONE)} done, {statuses.count(job_queue.FAILED)} failed "
+          f"after {job_queue.JOB_MAX_ATTEMPTS} attempts")
+    checks.append(("failing jobs retried, then done or failed", retried and set(statuses) <= {job_queue.DONE, job_queue.FAILED}))
+
+    for worker in workers:
+        worker.stop()
+    server.shutdown()
+
+    all_done = list(jobs.find({"status": job_queue.DONE}, projection={"_id": 1, "user": 1}))
+    entries = list(history.find({}, projection={"_id": 1, "user": 1}))
+    checks.append(("one history entry per finished job, under the job's id",
+                   sorted(job["_id"] for job in all_done) == sorted(entry["_id"] for entry in entries)))
+    charged = {user["email"]: user["generation_count"] for user in collection.find()}
+    expected = {email: sum(1 for job in all_done if job["user"] == email) for email in users}
+    checks.append(("each account charged once per finished job", charged == expected))
+    checks.append(("no job left running", jobs.count_documents({"status": {"$in": list(job_queue.ACTIVE_STATUSES)}}) == 0))
+    stats = [worker.stats() for worker in workers]
+    print(f"workers: {sum(s['completed'] for s in stats)} completed, {sum(s['failed'] for s in stats)} failed attempts, "
+          f"{sum(s['lost'] for s in stats)} lost leases")
+
+    for name, ok in checks:
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}")
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Benchmark: login lookup before and after the email index and single-query login.
+
+Seeds a users collection, then times the old login path (check_user_exists + authenticate_user:
+two full-document find_one calls on an unindexed email field) against the new one (unique
+email index + one find_one with a projection).
+
+Run against a local mongod (recommended, uses a throwaway database that is dropped at the end):
+    python benchmarks/bench_login.py --mongo-uri mongodb://localhost:27017 --users 1000000
+or in-process with mongomock (pip install mongomock). mongomock always scans the collection,
+so there it only shows the saved round-trip and the smaller documents, not the index:
+    python benchmarks/bench_login.py --users 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from resume_generator import find_user, hash_password, verify_password  # noqa: E402
+
+BENCH_DB_NAME = "resume_generator_login_bench"
+
+
+def connect(uri):
+    if uri:
+        from pymongo import MongoClient
+        client = MongoClient(uri)
+        return client, client[BENCH_DB_NAME]
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("Pass --mongo-uri or install mongomock.")
+    client = mongomock.MongoClient()
+    return client, client[BENCH_DB_NAME]
+
+
+def seed(collection, count, batch=10000):
+    # One real hash shared by every user: seeding a million PBKDF2 hashes would take hours
+    password_hash = hash_password("senha-de-teste")
+    start = time.perf_counter()
+    for offset in range(0, count, batch):
+        collection.insert_many([
+            {"email": f"user{i}@example.com", "password": password_hash, "generation_count": i % 3,
+             "name": f"Usuário {i}", "history_note": "x" * 200}
+            for i in range(offset, min(offset + batch, count))
+        ])
+    return time.perf_counter() - start
+
+
+# The login path before this change
+def old_login(email, password, collection):
+    if collection.find_one({"email": email}) is not None:
+        return collection.find_one({"email": email, "password": password})
+    return None
+
+
+def new_login(email, collection):
+    return find_user(email, collection)
+
+
+def measure(label, fn, emails):
+    samples = []
+    for email in emails:
+        start = time.perf_counter()
+        fn(email)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95 = samples[int(0.95 * (len(samples) - 1))]
+    print(f"{label:<32} p50={statistics.median(samples):9.3f} ms  p95={p95:9.3f} ms")
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-uri", help="local mongod to use instead of mongomock")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    client, db = connect(args.mongo_uri)
+    collection = db["users"]
+    collection.drop()
+    try:
+        print(f"Seeding {args.users} users... ", end="", flush=True)
+        print(f"{seed(collection, args.users):.1f}s")
+        emails = [f"user{random.randrange(args.users)}@example.com" for _ in range(args.lookups)]
+        stored = collection.find_one({"email": emails[0]})["password"]
+
+        before = measure("before (no index, 2 queries)", lambda email: old_login(email, stored, collection), emails)
+        start = time.perf_counter()
+        collection.create_index("email", unique=True, name="email_unique")
+        print(f"{'create unique email index':<32} {(time.perf_counter() - start):.1f}s")
+        after = measure("after (index, 1 query)", lambda email: new_login(email, collection), emails)
+        print(f"{'speedup':<32} {before / after:.1f}x")
+
+        start = time.perf_counter()
+        verify_password("senha-de-teste", stored)
+        print(f"{'password hash check (CPU)':<32} {(time.perf_counter() - start) * 1000:9.1f} ms")
+    finally:
+        if args.mongo_uri:
+            client.drop_database(BENCH_DB_NAME)
+
+
+if __name__ == "__main__":
+    main()
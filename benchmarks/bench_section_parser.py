@@ -0,0 +1,98 @@
+"""Micro-benchmark: single-pass parse_resume vs the old split-based section extraction.
+
+Run with: python benchmarks/bench_section_parser.py [--experiences 200] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from resume_generator import clean_markdown, parse_resume  # noqa: E402
+
+SECTION_KEYS = ["Perfil", "Experiência Profissional", "Educação", "Habilidades", "Idiomas", "Atividades e Interesses"]
+
+
+# The split chains used by the renderers before parse_resume existed
+def split_based_sections(resume_content):
+    sections = {}
+    for content_key in SECTION_KEYS:
+        content = ""
+        if content_key == "Perfil":
+            if "Experiência Profissional" in resume_content:
+                content = resume_content.split("Experiência Profissional")[0].strip()
+            else:
+                content = resume_content
+        elif content_key == "Experiência Profissional":
+            if content_key in resume_content and "Educação" in resume_content:
+                content = resume_content.split(content_key)[1].split("Educação")[0].strip()
+        elif content_key == "Educação":
+            if content_key in resume_content and "Habilidades" in resume_content:
+                content = resume_content.split(content_key)[1].split("Habilidades")[0].strip()
+        elif content_key == "Habilidades":
+            if content_key in resume_content:
+                if "Idiomas" in resume_content:
+                    content = resume_content.split(content_key)[1].split("Idiomas")[0].strip()
+                else:
+                    content = resume_content.split(content_key)[1].strip()
+        elif content_key == "Idiomas":
+            if content_key in resume_content:
+                if "Atividades e Interesses" in resume_content:
+                    content = resume_content.split(content_key)[1].split("Atividades e Interesses")[0].strip()
+                else:
+                    content = resume_content.split(content_key)[1].strip()
+        elif content_key == "Atividades e Interesses":
+            if content_key in resume_content:
+                content = resume_content.split(content_key)[1].strip()
+        sections[content_key] = content
+
+    # The renderers then split each section again into entries and lines
+    items = []
+    for entry in sections["Experiência Profissional"].split("\n\n"):
+        lines = entry.strip().split("\n")
+        title_line = clean_markdown(lines[0].strip())
+        if " | " in title_line:
+            items.append(title_line.split(" | "))
+        for i in range(1, len(lines)):
+            line = clean_markdown(lines[i].strip())
+            items.append(line[1:].strip() if line.startswith("-") else line)
+    for entry in sections["Educação"].split("\n\n"):
+        items.extend(clean_markdown(line) for line in entry.strip().split("\n"))
+    for key in ("Habilidades", "Idiomas"):
+        items.extend(clean_markdown(item.strip()) for item in sections[key].split(","))
+    return sections, items
+
+
+# Function to build a synthetic model response of the requested size
+def synthetic_response(experiences, bullets=4):
+    parts = ["Perfil", "Analista com experiência em dados e automação de processos. " * 3, "", "Experiência Profissional"]
+    for i in range(experiences):
+        parts.append(f"Analista {i} | Empresa {i} | Janeiro 20{i % 100:02d} - Dezembro 20{i % 100:02d}")
+        for j in range(bullets):
+            parts.append(f"- Aumentou a eficiência da equipa {j} em {j * 5}% com novos processos")
+        parts.append("")
+    parts += ["Educação", "Bacharel em Economia | Jul 2019 | UEM, Maputo, Maputo", ""]
+    parts += ["Habilidades", ", ".join(f"Habilidade {i}" for i in range(50)), ""]
+    parts += ["Idiomas", "Português, Inglês", "", "Atividades e Interesses", "Teatro, Artes, Leitura"]
+    return "\n".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--experiences", type=int, nargs="+", default=[5, 50, 500])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'experiences':>12} {'size (KB)':>10} {'split (ms)':>11} {'parse (ms)':>11} {'speedup':>8}")
+    for count in args.experiences:
+        text = synthetic_response(count)
+        split_time = min(timeit.repeat(lambda: split_based_sections(text), number=1, repeat=args.repeat))
+        parse_time = min(timeit.repeat(lambda: parse_resume(text), number=1, repeat=args.repeat))
+        print(f"{count:>12} {len(text.encode()) / 1024:>10.1f} {split_time * 1000:>11.3f} "
+              f"{parse_time * 1000:>11.3f} {split_time / parse_time:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
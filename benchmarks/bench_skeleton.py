@@ -0,0 +1,112 @@
+"""Benchmark: rendering by cloning a prebuilt skeleton vs building every document from scratch.
+
+The old path loaded a new Document, copied the template styles into it and added the header,
+contact line and section headings paragraph by paragraph for every resume. The skeleton path
+builds those once per template and clones the result. For each template and resume size this
+prints the best render time, the peak Python memory of one render and the memory blocks it
+leaves allocated (the returned document), and checks that both paths produce the same
+document.xml and styles.xml. tracemalloc only sees Python's allocator; the XML trees live in
+libxml2 memory and are not counted.
+
+Run with: python benchmarks/bench_skeleton.py [--experiences 2 10 50] [--repeat 20]
+"""
+import argparse
+import io
+import os
+import sys
+import timeit
+import tracemalloc
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from docx import Document  # noqa: E402
+from docx.shared import Pt  # noqa: E402
+
+from bench_section_parser import synthetic_response  # noqa: E402
+from resume_generator import (  # noqa: E402
+    SECTION_RENDERERS,
+    apply_template_styles,
+    get_template_plan,
+    list_templates,
+    parse_resume,
+    render_resume,
+)
+
+
+# The render path before the skeleton
+def legacy_render_resume(plan, resume, name, email, phone, linkedin):
+    doc = Document()
+    if plan.style_table is not None:
+        doc = apply_template_styles(doc, plan.style_table)
+
+    header = plan.header.add_to(doc)
+    header_run = header.add_run(name)
+    header_run.bold = True
+    header_run.font.size = Pt(16)
+
+    contact = plan.contact.add_to(doc)
+    contact.add_run(f"{phone} | {email}")
+    if linkedin:
+        contact.add_run(f" | {linkedin}")
+
+    for section in plan.sections:
+        section_header = section.heading.add_to(doc)
+        section_run = section_header.add_run(section.title)
+        section_run.bold = True
+        section_run.font.all_caps = True
+        SECTION_RENDERERS[section.key](doc, section.body, resume)
+
+    return doc
+
+
+# Function to read the parts that carry the content and styles of a saved document
+def document_parts(doc):
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    with zipfile.ZipFile(buffer) as archive:
+        return archive.read("word/document.xml"), archive.read("word/styles.xml")
+
+
+# Function to measure the memory of one call: (peak KiB, blocks still allocated when it returns)
+def allocations(fn):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    fn()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return peak / 1024, blocks
+
+
+def best_ms(fn, repeat):
+    return min(timeit.repeat(fn, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--experiences", type=int, nargs="+", default=[2, 10, 50])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    templates, templates_dir = list_templates()
+    contact = ("Ana Bench", "ana@example.com", "+258 84 000 0000", "linkedin.com/in/ana")
+    print(f"{'template':<18} {'exp':>4} {'old (ms)':>9} {'new (ms)':>9} {'old peak KiB':>13} {'new peak KiB':>13} "
+          f"{'old kept':>9} {'new kept':>9}  same output")
+    for template_name in templates:
+        plan = get_template_plan(template_name, templates_dir)
+        for experiences in args.experiences:
+            resume = parse_resume(synthetic_response(experiences))
+            old = lambda: legacy_render_resume(plan, resume, *contact)
+            new = lambda: render_resume(plan, resume, *contact)
+            same = document_parts(old()) == document_parts(new()) == document_parts(new())
+            old_peak, old_blocks = allocations(old)
+            new_peak, new_blocks = allocations(new)
+            print(f"{template_name:<18} {experiences:>4} {best_ms(old, args.repeat):>9.2f} {best_ms(new, args.repeat):>9.2f} "
+                  f"{old_peak:>13.0f} {new_peak:>13.0f} {old_blocks:>9} {new_blocks:>9}  {'yes' if same else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Benchmark: precomputed style table vs the old apply_template_styles.
+
+Builds synthetic templates with hundreds of paragraph styles and long documents, then times:
+  - style transfer into a new document (old: add_style per missing name, only empty styles;
+    new: one bulk copy of the precomputed styles part, with the real definitions)
+  - rendering a long resume, where every paragraph style was looked up by name
+
+Run with: python benchmarks/bench_template_styles.py [--styles 50 200 800] [--paragraphs 500] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from docx import Document  # noqa: E402
+from docx.enum.style import WD_STYLE_TYPE  # noqa: E402
+from docx.shared import Pt  # noqa: E402
+
+from bench_section_parser import synthetic_response  # noqa: E402
+from bench_skeleton import legacy_render_resume  # noqa: E402
+from resume_generator import (  # noqa: E402
+    apply_template_styles,
+    build_style_table,
+    compile_template_plan,
+    parse_resume,
+    render_resume,
+)
+
+
+# The implementation before the style table
+def legacy_apply_template_styles(doc, template_doc):
+    for style in template_doc.styles:
+        if style.name not in doc.styles:
+            doc.styles.add_style(style.name, style.type)
+    for i, paragraph in enumerate(doc.paragraphs):
+        if i < len(template_doc.paragraphs):
+            template_paragraph = template_doc.paragraphs[i]
+            paragraph.style = template_paragraph.style
+            paragraph_format = paragraph.paragraph_format
+            template_format = template_paragraph.paragraph_format
+            paragraph_format.alignment = template_format.alignment
+            if template_format.line_spacing:
+                paragraph_format.line_spacing = template_format.line_spacing
+            if template_format.space_before:
+                paragraph_format.space_before = template_format.space_before
+            if template_format.space_after:
+                paragraph_format.space_after = template_format.space_after
+    return doc
+
+
+# Function to build a template with the given number of custom styles and paragraphs
+def synthetic_template(styles, paragraphs):
+    doc = Document()
+    names = []
+    for i in range(styles):
+        style = doc.styles.add_style(f"Estilo {i}", WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = doc.styles["Normal"]
+        style.font.size = Pt(9 + i % 6)
+        style.paragraph_format.space_after = Pt(i % 12)
+        names.append(style.name)
+    for i in range(paragraphs):
+        doc.add_paragraph(f"Parágrafo {i} do template", style=names[i % styles])
+    path = os.path.join(tempfile.mkdtemp(), f"template-{styles}.docx")
+    doc.save(path)
+    return Document(path)
+
+
+# The render path before the style table: styles copied from the template object, styles set by name
+def legacy_render(plan, template_doc, resume):
+    for spec in [plan.header, plan.contact] + [part for section in plan.sections for part in (section.heading, section.body)]:
+        spec.style_ids = None
+    style_table, plan.style_table = plan.style_table, None
+    try:
+        doc = legacy_render_resume(plan, resume, "Ana", "ana@example.com", "+258", "")
+        return legacy_apply_template_styles(doc, template_doc)
+    finally:
+        plan.style_table = style_table
+        plan.bind_style_ids(style_table.style_ids)
+
+
+def best_ms(fn, repeat):
+    return min(timeit.repeat(fn, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--styles", type=int, nargs="+", default=[50, 200, 800])
+    parser.add_argument("--paragraphs", type=int, default=500, help="paragraphs in the template")
+    parser.add_argument("--experiences", type=int, default=100, help="experiences in the rendered resume")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    resume = parse_resume(synthetic_response(args.experiences))
+    print(f"{'styles':>7} {'table (ms)':>11} {'transfer old':>13} {'transfer new':>13} "
+          f"{'render old':>11} {'render new':>11}")
+    for styles in args.styles:
+        template_doc = synthetic_template(styles, args.paragraphs)
+        table_time = best_ms(lambda: build_style_table(template_doc), args.repeat)
+        table = build_style_table(template_doc)
+        plan = compile_template_plan(template_doc, f"synthetic-{styles}")
+
+        transfer_old = best_ms(lambda: legacy_apply_template_styles(Document(), template_doc), args.repeat)
+        transfer_new = best_ms(lambda: apply_template_styles(Document(), table), args.repeat)
+        render_old = best_ms(lambda: legacy_render(plan, template_doc, resume), args.repeat)
+        render_new = best_ms(lambda: render_resume(plan, resume, "Ana", "ana@example.com", "+258", ""), args.repeat)
+        print(f"{styles:>7} {table_time:>11.1f} {transfer_old:>13.1f} {transfer_new:>13.1f} "
+              f"{render_old:>11.1f} {render_new:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Local stand-in for the OpenAI chat completions API, used by the benchmarks.
+
+Answers POST /v1/chat/completions with a canned resume (or a synthetic one of the requested
+size, or a JSON resume when response_format is set) after a configurable delay, with or
+without streaming, so generation can be measured without network calls or API costs.
+
+Run on its own and point the app at it:
+    python benchmarks/mock_openai.py --port 8765 --latency 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock streamlit run resume_generator.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_section_parser import synthetic_response
+
+CANNED_RESPONSE = """Perfil
+Analista de dados com experiência em dashboards interativos e automação de relatórios.
+
+Experiência Profissional
+Analista de Dados | ABC Enterprises | Novembro 2022 - Abril 2024
+- Desenvolveu e manteve dashboards interativos usando Tableau
+- Realizou processos ETL usando Python e SQL
+
+Desenvolvedor | XYZ | Janeiro 2020 - Outubro 2022
+- Automatizou pipelines de relatórios
+
+Educação
+Bacharel em Ciência da Computação | Julho 2019 | USTM, Maputo, Maputo
+
+Habilidades
+Contabilidade, PDV (Ponto de Venda), Comunicação
+
+Idiomas
+Português, Inglês
+
+Atividades e Interesses
+Leitura, Escrita, Programação, Viagens"""
+
+# Answer sent when the request asks for structured output (response_format)
+CANNED_JSON_RESPONSE = json.dumps({
+    "profile": "Analista de dados com experiência em dashboards interativos e automação de relatórios.",
+    "experiences": [
+        {"title": "Analista de Dados", "company": "ABC Enterprises", "dates": "Novembro 2022 - Abril 2024",
+         "bullets": ["Desenvolveu e manteve dashboards interativos usando Tableau", "Realizou processos ETL usando Python e SQL"]},
+        {"title": "Desenvolvedor", "company": "XYZ", "dates": "Janeiro 2020 - Outubro 2022",
+         "bullets": ["Automatizou pipelines de relatórios"]},
+    ],
+    "education": [{"degree": "Bacharel em Ciência da Computação", "date": "Julho 2019", "institution": "USTM, Maputo, Maputo"}],
+    "skills": ["Contabilidade", "PDV (Ponto de Venda)", "Comunicação"],
+    "languages": ["Português", "Inglês"],
+    "interests": ["Leitura", "Escrita", "Programação", "Viagens"],
+}, ensure_ascii=False)
+
+
+# Function to estimate token counts the way the usage field would report them
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+# Handler reading its settings (response_text, latency, jitter, chunk_delay, error_rate) from the server
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "MockOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        server.request_times.append(time.monotonic())
+        time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+        if random.random() < server.error_rate:
+            self._send_json(500, {"error": {"message": "mock server error", "type": "server_error"}})
+            return
+
+        text = CANNED_JSON_RESPONSE if request.get("response_format") else server.response_text
+        prompt = "".join(message.get("content", "") for message in request.get("messages", []))
+        usage = {
+            "prompt_tokens": estimate_tokens(prompt),
+            "completion_tokens": estimate_tokens(text),
+            "total_tokens": estimate_tokens(prompt) + estimate_tokens(text),
+        }
+        model = request.get("model", "mock")
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        lines = text.splitlines(keepends=True)
+        for line in lines:
+            chunk = {
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {"content": line}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            if server.chunk_delay:
+                time.sleep(server.chunk_delay)
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunk = {
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [], "usage": usage,
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+# Threaded server with a listen backlog large enough for 100+ simultaneous clients
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+# Function to start the mock server on a background thread; returns (server, base_url)
+def start_mock_openai(host="127.0.0.1", port=0, latency=0.5, jitter=0.0, chunk_delay=0.0, experiences=None):
+    server = MockOpenAIServer((host, port), MockOpenAIHandler)
+    server.latency = latency
+    server.jitter = jitter
+    server.chunk_delay = chunk_delay
+    # Share of requests answered with a 500 error; benchmarks change it while the server runs
+    server.error_rate = 0.0
+    # Arrival time (time.monotonic) of every completion request, for rate checks
+    server.request_times = []
+    server.response_text = synthetic_response(experiences) if experiences else CANNED_RESPONSE
+    thread = threading.Thread(target=server.serve_forever, name="mock-openai", daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before the response starts")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +/- seconds added to the latency")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed lines")
+    parser.add_argument("--experiences", type=int, help="answer with a synthetic resume of this many experiences")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_openai(args.host, args.port, args.latency, args.jitter, args.chunk_delay, args.experiences)
+    print(f"Mock OpenAI listening on {base_url} (latency {args.latency}s)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
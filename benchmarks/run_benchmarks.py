@@ -0,0 +1,266 @@
+"""Benchmark suite: section parsing, .docx rendering per template and end-to-end generation.
+
+The end-to-end runs repeat what main() does for one generation (quota reservation, response
+cache lookup, model call, parsing, render in the pool, cache write) from 1, 10 and 100
+concurrent users, against benchmarks/mock_openai.py and mongomock (or a local mongod).
+Login is left out; benchmarks/bench_login.py covers it.
+
+Every run is written to benchmarks/results/ as JSON. Pass --compare with an earlier result
+to flag regressions; the script exits with status 1 when any metric got worse than the
+threshold.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --only parse render --compare benchmarks/results/baseline.json
+    python benchmarks/run_benchmarks.py --users 1 10 100 --latency 0.5 --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+# The app's own rate limit would otherwise be what the end-to-end runs measure
+os.environ.setdefault("OPENAI_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("OPENAI_MAX_CONCURRENCY", "100")
+os.environ.setdefault("OPENAI_BURST", "100")
+os.environ.setdefault("RESPONSE_CACHE_BACKEND", "memory")
+
+import render_worker  # noqa: E402
+import resume_generator as rg  # noqa: E402
+from bench_section_parser import synthetic_response  # noqa: E402
+from mock_openai import start_mock_openai  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+BENCH_DB_NAME = "resume_generator_bench"
+
+
+# Function to summarize a list of durations (seconds) in milliseconds
+def summarize(durations):
+    ordered = sorted(durations)
+    return {
+        "runs": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[math.ceil(0.95 * len(ordered)) - 1] * 1000,
+        "min_ms": ordered[0] * 1000,
+    }
+
+
+# Function to time fn() repeat times, after one warm-up call
+def time_calls(fn, repeat):
+    fn()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
+
+
+def bench_parse(args):
+    results = {}
+    for experiences in args.parse_sizes:
+        text = synthetic_response(experiences)
+        results[f"parse/{experiences}_experiences"] = time_calls(lambda: rg.parse_resume(text), args.repeat)
+    return results
+
+
+def bench_render(args):
+    results = {}
+    templates, templates_dir = rg.list_templates()
+    resume = rg.parse_resume(synthetic_response(args.render_experiences))
+    for template_name in templates:
+        results[f"render/{template_name}"] = time_calls(
+            lambda: rg.create_word_doc(resume, "Ana Bench", "ana@example.com", "+258 84 000 0000", "", template_name, templates_dir),
+            args.repeat,
+        )
+    return results
+
+
+def connect(uri):
+    if uri:
+        from pymongo import MongoClient
+        client = MongoClient(uri)
+        return client, client[BENCH_DB_NAME]
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("Pass --mongo-uri or install mongomock.")
+    client = mongomock.MongoClient()
+    return client, client[BENCH_DB_NAME]
+
+
+# Function to run one generation the way main() does, returning its duration
+def generate_once(collection, email, request_index, template_name, templates_dir, args):
+    start = time.perf_counter()
+    # Vary the input so every request misses the response cache and calls the model
+    generation_args = (
+        f"Usuário {email} {request_index}", email, "+258 84 000 0000", "Tecnologia", "Desenvolvedor",
+        "- Analista na ABC (01/2020 - 12/2023): dashboards", "- Bacharel na UEM (2019)",
+        ["Python", "SQL"], ["Português", "Inglês"], "",
+    )
+    response_cache = rg.get_response_cache()
+    cache_key = rg.resume_cache_key(*generation_args)
+    if response_cache.get(cache_key) is not None:
+        raise RuntimeError("unexpected response cache hit")
+    if rg.reserve_generation(email, collection, limit=args.requests_per_user) is None:
+        raise RuntimeError("generation limit reached")
+    if args.stream:
+        resume_content = "".join(rg.generate_resume_stream(*generation_args))
+    else:
+        resume_content = rg.generate_resume(*generation_args)
+    resume = rg.parse_resume(resume_content)
+    response_cache.set(cache_key, resume_content)
+    doc_bytes = render_worker.render_docx(resume, generation_args[0], email, generation_args[2], "", template_name, templates_dir)
+    if not doc_bytes:
+        raise RuntimeError("empty document")
+    return time.perf_counter() - start
+
+
+def bench_end_to_end(args):
+    results = {}
+    server, base_url = start_mock_openai(latency=args.latency, jitter=args.jitter)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    client, db = connect(args.mongo_uri)
+    collection = db[rg.COLLECTION_NAME]
+    templates, templates_dir = rg.list_templates()
+    try:
+        # Start the render workers and open the API connections before timing anything
+        if render_worker.RENDER_WORKERS > 0:
+            render_worker.get_render_pool(templates_dir)
+        collection.insert_one({"email": "bench-warmup@example.com", "password": "x", "generation_count": 0})
+        generate_once(collection, "bench-warmup@example.com", 0, templates[0], templates_dir, args)
+        collection.delete_one({"email": "bench-warmup@example.com"})
+        for users in args.users:
+            emails = [f"bench-{users}-{i}@example.com" for i in range(users)]
+            collection.delete_many({"email": {"$in": emails}})
+            collection.insert_many([{"email": email, "password": "x", "generation_count": 0} for email in emails])
+            jobs = [
+                (emails[i], n, templates[(i + n) % len(templates)])
+                for n in range(args.requests_per_user) for i in range(users)
+            ]
+            durations, errors = [], 0
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=users) as pool:
+                futures = [pool.submit(generate_once, collection, email, n, template, templates_dir, args) for email, n, template in jobs]
+                for future in futures:
+                    try:
+                        durations.append(future.result())
+                    except Exception as e:
+                        errors += 1
+                        print(f"  generation failed: {e}")
+            elapsed = time.perf_counter() - start
+            result = summarize(durations) if durations else {"runs": 0}
+            result["errors"] = errors
+            result["throughput_per_s"] = len(durations) / elapsed
+            results[f"e2e/{users}_users"] = result
+            collection.delete_many({"email": {"$in": emails}})
+    finally:
+        server.shutdown()
+        if args.mongo_uri:
+            client.drop_database(BENCH_DB_NAME)
+    return results
+
+
+# Function to record where and how the results were produced
+def run_metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "render_workers": render_worker.RENDER_WORKERS,
+        "args": {key: value for key, value in vars(args).items() if key not in ("compare", "output")},
+    }
+
+
+# Function to list the metrics that got worse than the threshold since the baseline
+def find_regressions(baseline, current, threshold, min_delta_ms):
+    regressions = []
+    for name, metrics in current.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for key in ("mean_ms", "p95_ms"):
+            # Sub-millisecond timings move by more than the threshold from noise alone
+            if (before.get(key) and metrics.get(key) is not None and metrics[key] > before[key] * (1 + threshold)
+                    and metrics[key] - before[key] > min_delta_ms):
+                regressions.append(f"{name} {key}: {before[key]:.2f} -> {metrics[key]:.2f}")
+        key = "throughput_per_s"
+        if before.get(key) and metrics.get(key) is not None and metrics[key] < before[key] * (1 - threshold):
+            regressions.append(f"{name} {key}: {before[key]:.2f} -> {metrics[key]:.2f}")
+        if metrics.get("errors", 0) > before.get("errors", 0):
+            regressions.append(f"{name} errors: {before.get('errors', 0)} -> {metrics['errors']}")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'benchmark':<32} {'runs':>5} {'mean (ms)':>10} {'p95 (ms)':>10} {'per s':>8}")
+    for name, metrics in results.items():
+        throughput = metrics.get("throughput_per_s")
+        print(f"{name:<32} {metrics.get('runs', 0):>5} {metrics.get('mean_ms', 0):>10.2f} {metrics.get('p95_ms', 0):>10.2f} "
+              f"{f'{throughput:.1f}' if throughput is not None else '-':>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=["parse", "render", "e2e"], default=["parse", "render", "e2e"])
+    parser.add_argument("--repeat", type=int, default=30, help="timed calls per parse/render benchmark")
+    parser.add_argument("--parse-sizes", type=int, nargs="+", default=[2, 10, 100], help="experiences in the parsed responses")
+    parser.add_argument("--render-experiences", type=int, default=5, help="experiences in the rendered resume")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 10, 100], help="concurrent users in the end-to-end runs")
+    parser.add_argument("--requests-per-user", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.5, help="mock model latency (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="random +/- seconds added to the mock latency")
+    parser.add_argument("--stream", action="store_true", help="use the streaming generation path")
+    parser.add_argument("--mongo-uri", help="local mongod to use instead of mongomock")
+    parser.add_argument("--output", help="where to write the JSON results (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="smaller slowdowns are ignored as noise")
+    args = parser.parse_args()
+
+    results = {}
+    if "parse" in args.only:
+        results.update(bench_parse(args))
+    if "render" in args.only:
+        results.update(bench_render(args))
+    if "e2e" in args.only:
+        results.update(bench_end_to_end(args))
+    print_results(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump({"metadata": run_metadata(args), "results": results}, file, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        regressions = find_regressions(baseline, results, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%} against {args.compare}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.compare}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Stress check: many concurrent create_word_doc calls, each output must belong to its requester.
+
+Every request renders a resume with a unique name, email and profile line from a pool of
+threads, then parses the returned bytes back and checks that they carry that request's data
+and nobody else's.
+
+Run with: python benchmarks/stress_concurrent_render.py [--requests 500] [--threads 32]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from docx import Document  # noqa: E402
+
+from resume_generator import create_word_doc, list_templates  # noqa: E402
+
+RESUME_TEMPLATE = """Perfil
+Profissional número {i} com código de verificação {token}.
+
+Experiência Profissional
+Analista | Empresa {i} | Janeiro 2020 - Dezembro 2022
+- Entregou o projeto {token}
+
+Educação
+Bacharel em Economia | Jul 2019 | UEM, Maputo, Maputo
+
+Habilidades
+Python, SQL, Excel
+
+Idiomas
+Português, Inglês
+
+Atividades e Interesses
+Teatro, Artes
+"""
+
+
+def render(i, template_name, templates_dir):
+    token = f"token-{i:06d}"
+    name = f"Candidato {i:06d}"
+    email = f"candidato{i:06d}@example.com"
+    doc_bytes = create_word_doc(RESUME_TEMPLATE.format(i=i, token=token), name, email, "840000000", "",
+                                template_name, templates_dir)
+    text = "\n".join(paragraph.text for paragraph in Document(io.BytesIO(doc_bytes)).paragraphs)
+    return i, token, name, email, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    templates, templates_dir = list_templates()
+    start = time.perf_counter()
+    mismatches = 0
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        futures = [pool.submit(render, i, templates[i % len(templates)], templates_dir) for i in range(args.requests)]
+        for future in futures:
+            i, token, name, email, text = future.result()
+            # The output must carry this request's data and no token from another request
+            foreign = text.count("token-") - text.count(token)
+            if name not in text or email not in text or token not in text or foreign:
+                mismatches += 1
+                print(f"Request {i}: returned document does not belong to this request")
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.requests} renders on {args.threads} threads: {elapsed:.2f}s "
+          f"({args.requests / elapsed:.1f}/s), {mismatches} mismatched documents")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
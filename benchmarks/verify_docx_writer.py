@@ -0,0 +1,176 @@
+"""Check that the streaming .docx writer produces the same documents as python-docx, and compare their cost.
+
+For every template (plus the plan used when a template is missing) and a range of resumes,
+both writers render the same content and the script checks that:
+  - the two files have the same zip members, and every member other than word/document.xml is
+    byte for byte the same
+  - word/document.xml is the same XML (exclusive C14N)
+  - python-docx reads both back to the same paragraphs: style, alignment, spacing, text and the
+    bold / size / all caps of every run
+Then it prints the best time per render and the peak Python memory of one render for growing
+resumes; the streaming writer renders into a sink that drops the output, so its peak is the
+working memory of the render itself (mostly the zlib window). tracemalloc does not see the
+libxml2 memory of the python-docx tree, so that column understates its real growth.
+
+Exits with status 1 when any document differs.
+
+Run with: python benchmarks/verify_docx_writer.py [--sizes 1 10 100 1000] [--repeat 5]
+"""
+import argparse
+import io
+import os
+import sys
+import timeit
+import tracemalloc
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from docx import Document  # noqa: E402
+from lxml import etree  # noqa: E402
+
+import docx_writer  # noqa: E402
+from bench_section_parser import synthetic_response  # noqa: E402
+from resume_generator import (  # noqa: E402
+    Education,
+    Experience,
+    ParsedResume,
+    get_default_template_plan,
+    get_template_plan,
+    list_templates,
+    parse_resume,
+    render_resume,
+)
+
+CONTACTS = [
+    ("Ana Bench", "ana@example.com", "+258 84 000 0000", "linkedin.com/in/ana"),
+    ("João & Maria <Lda>", "joao@example.com", "", ""),
+]
+
+
+# Output stream that only counts what is written
+class NullSink:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+# Resumes that exercise every renderer, including empty sections and characters XML must escape
+def sample_resumes():
+    yield "empty", ParsedResume()
+    yield "escaping", ParsedResume(
+        profile=["Perfil com <tags>, \"aspas\" & símbolos", "  espaços  nas pontas  "],
+        experiences=[Experience("Analista", "A&B", "2020 - 2024", bullets=["ETL <rápido>"], details=["Detalhe"]),
+                     Experience("Sem empresa")],
+        education=[Education("Bacharel", "2019", "UEM", details=["Menção honrosa"])],
+        skills=["C++", "R&D"],
+        languages=["Português"],
+        interests=["Xadrez", "Música"],
+    )
+    for experiences in (1, 5, 50):
+        yield f"{experiences}_experiences", parse_resume(synthetic_response(experiences))
+
+
+def python_docx_bytes(plan, resume, contact):
+    buffer = io.BytesIO()
+    render_resume(plan, resume, *contact).save(buffer)
+    return buffer.getvalue()
+
+
+def streaming_bytes(plan, resume, contact):
+    buffer = io.BytesIO()
+    docx_writer.write_docx(buffer, plan, resume, *contact)
+    return buffer.getvalue()
+
+
+def canonical_xml(data):
+    return etree.tostring(etree.fromstring(data), method="c14n", exclusive=True)
+
+
+# Function to describe a document the way python-docx reads it back
+def read_back(data):
+    doc = Document(io.BytesIO(data))
+    paragraphs = []
+    for paragraph in doc.paragraphs:
+        paragraph_format = paragraph.paragraph_format
+        paragraphs.append((
+            paragraph.style.name, paragraph_format.alignment, paragraph_format.line_spacing,
+            paragraph_format.space_before, paragraph_format.space_after, paragraph.text,
+            [(run.text, run.bold, run.font.size, run.font.all_caps) for run in paragraph.runs],
+        ))
+    return paragraphs, [style.name for style in doc.styles]
+
+
+# Function to list the differences between the two outputs
+def compare(expected, actual):
+    problems = []
+    with zipfile.ZipFile(io.BytesIO(expected)) as left, zipfile.ZipFile(io.BytesIO(actual)) as right:
+        if right.testzip() is not None:
+            problems.append("corrupt zip member")
+        if left.namelist() != right.namelist():
+            problems.append(f"members {left.namelist()} != {right.namelist()}")
+            return problems
+        for name in left.namelist():
+            if name == docx_writer.DOCUMENT_PART:
+                if canonical_xml(left.read(name)) != canonical_xml(right.read(name)):
+                    problems.append(f"{name} XML differs")
+            elif left.read(name) != right.read(name):
+                problems.append(f"{name} bytes differ")
+    if read_back(expected) != read_back(actual):
+        problems.append("python-docx reads different paragraphs or styles")
+    return problems
+
+
+# Function to measure the peak Python memory of one call, in KiB
+def peak_kib(fn):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def best_ms(fn, repeat):
+    return min(timeit.repeat(fn, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000], help="experiences in the timed resumes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    templates, templates_dir = list_templates()
+    plans = [(name, get_template_plan(name, templates_dir)) for name in templates]
+    plans.append(("(default)", get_default_template_plan()))
+
+    failures = 0
+    checks = 0
+    for plan_name, plan in plans:
+        for resume_name, resume in sample_resumes():
+            for contact in CONTACTS:
+                checks += 1
+                problems = compare(python_docx_bytes(plan, resume, contact), streaming_bytes(plan, resume, contact))
+                if problems:
+                    failures += 1
+                    print(f"DIFFERENT {plan_name} {resume_name} {contact[0]!r}: {'; '.join(problems)}")
+    print(f"{checks - failures}/{checks} documents identical\n")
+
+    print(f"{'template':<16} {'exp':>5} {'python-docx ms':>15} {'stream ms':>10} {'python-docx KiB':>16} {'stream KiB':>11}")
+    for plan_name, plan in plans:
+        for experiences in args.sizes:
+            resume = parse_resume(synthetic_response(experiences))
+            contact = CONTACTS[0]
+            old = lambda: python_docx_bytes(plan, resume, contact)
+            new = lambda: docx_writer.write_docx(NullSink(), plan, resume, *contact)
+            print(f"{plan_name:<16} {experiences:>5} {best_ms(old, args.repeat):>15.2f} {best_ms(new, args.repeat):>10.2f} "
+                  f"{peak_kib(old):>16.0f} {peak_kib(new):>11.0f}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Check that the job workers of one pool stay within the account's OpenAI rate limit together.
+
+Runs two job_queue.JobWorker instances, each with the OpenAI client a worker process of a
+two-process pool builds (job_queue.worker_service(2)), against benchmarks/mock_openai.py and
+mongomock. It queues --jobs generations, counts the completion requests the mock received,
+and checks that their rate never exceeds OPENAI_REQUESTS_PER_MINUTE: over any window, at most
+OPENAI_BURST requests plus the rate times the window length. Before the limits were split,
+each worker applied the full limit, so two workers sent twice the rate.
+
+Exits with status 1 when the limit is exceeded.
+
+Run with: python benchmarks/verify_job_rate_limit.py [--rpm 240] [--burst 4] [--jobs 40]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("RESPONSE_CACHE_BACKEND", "none")
+os.environ.setdefault("OPENAI_MAX_CONCURRENCY", "8")
+os.environ.setdefault("JOB_IDLE_POLL_SECONDS", "0.05")
+
+
+# Function to find the largest number of requests sent in excess of the rate, over any window
+def worst_excess(times, rate_per_second):
+    excess = 0.0
+    for i, start in enumerate(times):
+        for j in range(i, len(times)):
+            allowed = (times[j] - start) * rate_per_second
+            excess = max(excess, (j - i + 1) - allowed)
+    return excess
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rpm", type=int, default=240, help="OPENAI_REQUESTS_PER_MINUTE of the account")
+    parser.add_argument("--burst", type=int, default=4, help="OPENAI_BURST of the account")
+    parser.add_argument("--jobs", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=2, help="worker processes the limits are split between")
+    args = parser.parse_args()
+    # The limits are read when resume_generator is imported
+    os.environ["OPENAI_REQUESTS_PER_MINUTE"] = str(args.rpm)
+    os.environ["OPENAI_BURST"] = str(args.burst)
+
+    import mongomock
+    import job_queue
+    import resume_generator as rg
+    from mock_openai import start_mock_openai
+
+    server, base_url = start_mock_openai(latency=0.02)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    db = mongomock.MongoClient()["resume_generator_rate"]
+    collection, history, jobs = db[rg.COLLECTION_NAME], db[rg.HISTORY_COLLECTION], db[rg.JOBS_COLLECTION]
+    collection.insert_one({"email": "taxa@example.com", "password": "x", "generation_count": 0})
+    templates, _ = rg.list_templates()
+    for i in range(args.jobs):
+        generation_args = (f"Candidata {i}", "taxa@example.com", "+258", "Tecnologia", "Desenvolvedor",
+                           f"- Analista na ABC (2020 - 2023): projeto {i}", "- Bacharel na UEM (2019)", ["Python"], ["Português"], "")
+        job_queue.enqueue_job(jobs, collection, generation_args, rg.resume_cache_key(*generation_args), templates[0], limit=args.jobs)
+
+    workers = [job_queue.JobWorker(jobs, collection, history, worker_id=f"worker-{i}", concurrency=4,
+                                   service=job_queue.worker_service(args.workers))
+               for i in range(args.workers)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    deadline = start + 30 + args.jobs * 60 / args.rpm * 2
+    while jobs.count_documents({"status": {"$in": list(job_queue.ACTIVE_STATUSES)}}) and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    for worker in workers:
+        worker.stop()
+    server.shutdown()
+
+    times = sorted(server.request_times)
+    rate = args.rpm / 60
+    excess = worst_excess(times, rate)
+    observed = (len(times) - 1) / (times[-1] - times[0]) * 60 if len(times) > 1 else 0.0
+    print(f"{len(times)} requests from {args.workers} workers in {elapsed:.1f}s: {observed:.0f}/min "
+          f"(limit {args.rpm}/min, burst {args.burst}); largest excess over any window {excess:.1f} requests")
+    checks = [
+        ("every job done", jobs.count_documents({"status": job_queue.DONE}) == args.jobs),
+        # One request of slack for timer resolution at the window edges
+        ("requests within the rate limit plus the burst", excess <= args.burst + 1),
+    ]
+    for name, ok in checks:
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}")
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
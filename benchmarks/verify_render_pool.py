@@ -0,0 +1,84 @@
+"""Check that the render pool recovers when one of its worker processes dies.
+
+Starts a RenderPool, renders once, then kills a worker process (SIGKILL, as the OOM killer
+would) twice: once while the pool is idle and once while renders are in flight. Every render
+after a kill must still return a document, and the pool must have started new workers rather
+than answer BrokenProcessPool from then on.
+
+Exits with status 1 when a render fails.
+
+Run with: python benchmarks/verify_render_pool.py [--workers 2] [--renders 16]
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import render_worker  # noqa: E402
+from bench_section_parser import synthetic_response  # noqa: E402
+from resume_generator import list_templates, parse_resume  # noqa: E402
+
+
+# Function to kill one live worker process of the pool
+def kill_worker(pool):
+    # ProcessPoolExecutor keeps its processes by pid; wait until the warm-up has started them
+    deadline = time.perf_counter() + 30
+    while not pool.executor._processes and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    pid = next(iter(pool.executor._processes))
+    os.kill(pid, signal.SIGKILL)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--renders", type=int, default=16, help="renders in flight during the second kill")
+    args = parser.parse_args()
+
+    templates, templates_dir = list_templates()
+    resume = parse_resume(synthetic_response(20))
+    pool = render_worker.RenderPool(templates_dir, workers=args.workers, max_pending=args.renders)
+
+    # Function to render one resume through the pool; returns the document size or the error
+    def render(i=0):
+        try:
+            return len(pool.render(resume, f"Ana {i}", "ana@example.com", "+258", "", templates[i % len(templates)], templates_dir))
+        except Exception as e:
+            return e
+
+    checks = [("render before any kill", isinstance(render(), int))]
+
+    pid = kill_worker(pool)
+    # Give the executor's manager thread time to notice the dead process
+    time.sleep(0.5)
+    result = render()
+    print(f"killed idle worker {pid}: next render {'ok' if isinstance(result, int) else repr(result)}")
+    checks.append(("render after killing an idle worker", isinstance(result, int)))
+
+    with ThreadPoolExecutor(max_workers=args.renders) as threads:
+        futures = [threads.submit(render, i) for i in range(args.renders)]
+        time.sleep(0.2)
+        pid = kill_worker(pool)
+        results = [future.result() for future in futures]
+    failed = [result for result in results if not isinstance(result, int)]
+    print(f"killed busy worker {pid}: {len(results) - len(failed)}/{len(results)} renders ok")
+    checks.append(("renders in flight during a kill", not failed))
+    checks.append(("render after both kills", isinstance(render(), int)))
+
+    stats = pool.stats()
+    print(f"pool restarts: {stats['restarts']}, completed {stats['completed']}, failed {stats['failed']}")
+    pool.shutdown()
+
+    for name, ok in checks:
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}")
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
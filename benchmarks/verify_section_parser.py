@@ -0,0 +1,124 @@
+"""Check that parse_resume only starts a section on a real header line.
+
+Each case is a model answer with the sections the parser must find. They cover:
+  - header words inside body text ("Experiência em gestão de equipes" in the profile,
+    "Formação Técnica | 2019" as an education entry), which must stay body text
+  - numbered headers ("1. Perfil", "2) Experiência Profissional")
+  - markdown headers and content on the header line ("**Idiomas:** Português, Inglês")
+
+Exits with status 1 when any case is parsed differently.
+
+Run with: python benchmarks/verify_section_parser.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from resume_generator import parse_resume  # noqa: E402
+
+# (name, model answer, expected fields of the parsed resume)
+CASES = [
+    (
+        "header word at the start of a profile line",
+        "Perfil\n"
+        "Gestor de projetos com foco em resultados.\n"
+        "Experiência em gestão de equipes de até 20 pessoas.\n"
+        "\n"
+        "Experiência Profissional\n"
+        "Gerente | ABC | jan 2020 - dez 2023\n"
+        "- Coordenou 3 equipes\n",
+        {
+            "profile": ["Gestor de projetos com foco em resultados.", "Experiência em gestão de equipes de até 20 pessoas."],
+            "experiences": [("Gerente", "ABC", "jan 2020 - dez 2023", ["Coordenou 3 equipes"])],
+        },
+    ),
+    (
+        "header word at the start of an education entry",
+        "Educação\n"
+        "Licenciatura em Informática | dez 2022 | UEM, Maputo, Maputo\n"
+        "\n"
+        "Formação Técnica | 2019\n"
+        "\n"
+        "Habilidades\n"
+        "Python, SQL\n",
+        {
+            "education": [("Licenciatura em Informática", "dez 2022", "UEM, Maputo, Maputo"), ("Formação Técnica", "2019", "")],
+            "skills": ["Python", "SQL"],
+        },
+    ),
+    (
+        "numbered headers",
+        "1. Perfil\n"
+        "Analista de dados.\n"
+        "\n"
+        "2. Experiência Profissional\n"
+        "Analista | XYZ | mar 2021 - atual\n"
+        "- Criou dashboards\n"
+        "\n"
+        "3. Educação\n"
+        "Bacharel em Economia | jul 2019 | UEM, Maputo, Maputo\n"
+        "\n"
+        "4) Habilidades\n"
+        "Excel, Power BI\n"
+        "\n"
+        "5. Idiomas\n"
+        "Português, Inglês\n"
+        "\n"
+        "6. Atividades e Interesses\n"
+        "Teatro, Leitura\n",
+        {
+            "profile": ["Analista de dados."],
+            "experiences": [("Analista", "XYZ", "mar 2021 - atual", ["Criou dashboards"])],
+            "education": [("Bacharel em Economia", "jul 2019", "UEM, Maputo, Maputo")],
+            "skills": ["Excel", "Power BI"],
+            "languages": ["Português", "Inglês"],
+            "interests": ["Teatro", "Leitura"],
+        },
+    ),
+    (
+        "markdown headers with content on the header line",
+        "## PERFIL PROFISSIONAL\n"
+        "Desenvolvedor backend.\n"
+        "\n"
+        "**Idiomas:** Português, Inglês\n"
+        "**Atividades e Interesses**: Xadrez\n",
+        {
+            "profile": ["Desenvolvedor backend."],
+            "languages": ["Português", "Inglês"],
+            "interests": ["Xadrez"],
+        },
+    ),
+]
+
+
+# Function to read the fields a case checks from a parsed resume
+def parsed_fields(resume, fields):
+    values = {
+        "profile": resume.profile,
+        "experiences": [(e.title, e.company, e.dates, e.bullets) for e in resume.experiences],
+        "education": [(e.degree, e.date, e.institution) for e in resume.education],
+        "skills": resume.skills,
+        "languages": resume.languages,
+        "interests": resume.interests,
+    }
+    return {field: values[field] for field in fields}
+
+
+def main():
+    failures = 0
+    for name, content, expected in CASES:
+        got = parsed_fields(parse_resume(content), expected)
+        ok = got == expected
+        failures += not ok
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}")
+        if not ok:
+            for field in expected:
+                if got[field] != expected[field]:
+                    print(f"       {field}: expected {expected[field]!r}, got {got[field]!r}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
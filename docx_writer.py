@@ -0,0 +1,275 @@
+"""Streaming .docx writer for batch and high-concurrency rendering.
+
+python-docx keeps the whole document tree in memory and re-serializes and re-compresses every
+part of the package on each save. This writer prepares a package image once per template plan,
+from the plan's skeleton: every zip member except word/document.xml is kept as its raw local
+record (header and compressed data) and copied byte for byte into each output. The document
+part is written paragraph by paragraph into a deflate stream, so only one paragraph is held in
+memory at a time.
+
+The paragraphs are built with the same ParagraphSpec and SECTION_RENDERERS code as the
+python-docx path, so both writers produce the same document; benchmarks/verify_docx_writer.py
+checks it.
+"""
+import copy
+import io
+import re
+import struct
+import threading
+import zipfile
+import zlib
+from dataclasses import dataclass
+
+from docx.oxml import OxmlElement
+from docx.text.paragraph import Paragraph
+from lxml import etree
+
+import resume_generator as rg
+
+DOCUMENT_PART = "word/document.xml"
+
+# ZIP record layouts (little endian, no ZIP64: a resume never comes near 4 GiB)
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+DATA_DESCRIPTOR = struct.Struct("<4s3L")
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+CENTRAL_HEADER_SIGNATURE = b"PK\x01\x02"
+END_RECORD_SIGNATURE = b"PK\x05\x06"
+DATA_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+# General purpose flag: sizes and CRC follow the data in a data descriptor
+FLAG_DATA_DESCRIPTOR = 0x08
+
+# Start tag namespace declarations, e.g. ' xmlns:w="..."'
+NAMESPACE_DECLARATION_RE = re.compile(rb' xmlns:(\w+)="([^"]*)"')
+
+
+# One zip member of the package image: its entry and the raw bytes of its local record
+@dataclass
+class PackageMember:
+    info: zipfile.ZipInfo
+    record: bytes = None
+
+
+# Everything a render needs besides the resume, prepared once per template plan
+@dataclass
+class PackageImage:
+    members: list
+    document_prefix: bytes  # XML declaration, <w:document ...> and <w:body>
+    document_suffix: bytes  # <w:sectPr> and the closing tags
+    header: object  # header paragraph of the skeleton, with an empty run for the name
+    contact: object  # contact paragraph of the skeleton, without runs
+    headings: list  # serialized section headings, in plan order
+    namespaces: dict  # prefix -> URI declared on <w:document>
+    styles_part: object  # part of the skeleton, used to look styles up by name
+
+
+_build_lock = threading.Lock()
+
+
+# Function to serialize one body element without the namespace declarations of the document root
+def serialize_block(element, namespaces):
+    data = etree.tostring(element, encoding="UTF-8", xml_declaration=False)
+    end = data.index(b">")
+    start_tag = NAMESPACE_DECLARATION_RE.sub(
+        lambda match: b"" if namespaces.get(match.group(1).decode()) == match.group(2).decode() else match.group(0),
+        data[:end],
+    )
+    return start_tag + data[end:]
+
+
+# Function to copy a body element of the skeleton as a standalone element
+def detach_block(element):
+    block = copy.deepcopy(element)
+    etree.cleanup_namespaces(block)
+    return block
+
+
+# Function to read the raw local record (header and compressed data) of a zip member
+def read_local_record(data, info):
+    header = LOCAL_HEADER.unpack_from(data, info.header_offset)
+    if header[0] != LOCAL_HEADER_SIGNATURE or header[3] & FLAG_DATA_DESCRIPTOR:
+        # python-docx saves through zipfile into a seekable buffer, which never writes descriptors
+        raise ValueError(f"Registro zip inesperado: {info.filename}")
+    name_length, extra_length = header[-2], header[-1]
+    end = info.header_offset + LOCAL_HEADER.size + name_length + extra_length + info.compress_size
+    return data[info.header_offset:end]
+
+
+# Function to prepare the package image of a template plan from its skeleton
+def build_package_image(plan):
+    skeleton = plan.get_skeleton()
+    # Saving a clone keeps the shared skeleton untouched
+    doc = rg.clone_document(skeleton)
+    body = doc.element.body
+    header_p, contact_p, *heading_ps = body.findall(rg.qn("w:p"))
+    namespaces = {prefix: uri for prefix, uri in doc.element.nsmap.items() if prefix}
+
+    header = detach_block(header_p)
+    contact = detach_block(contact_p)
+    headings = [serialize_block(detach_block(heading), namespaces) for heading in heading_ps]
+
+    # The document part without its paragraphs gives the bytes around them
+    for paragraph in [header_p, contact_p, *heading_ps]:
+        body.remove(paragraph)
+    document_xml = etree.tostring(doc.element, encoding="UTF-8", standalone=True)
+    sect_pr_start = document_xml.index(b"<w:sectPr")
+    document_prefix, document_suffix = document_xml[:sect_pr_start], document_xml[sect_pr_start:]
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    data = buffer.getvalue()
+    members = []
+    with zipfile.ZipFile(buffer) as archive:
+        for info in archive.infolist():
+            if info.filename == DOCUMENT_PART:
+                members.append(PackageMember(info))
+            else:
+                members.append(PackageMember(info, read_local_record(data, info)))
+
+    return PackageImage(
+        members=members,
+        document_prefix=document_prefix,
+        document_suffix=document_suffix,
+        header=header,
+        contact=contact,
+        headings=headings,
+        namespaces=namespaces,
+        styles_part=skeleton.part,
+    )
+
+
+# Function to get the package image of a plan, built on first use
+def get_package_image(plan):
+    if plan.package_image is None:
+        with _build_lock:
+            if plan.package_image is None:
+                plan.package_image = build_package_image(plan)
+    return plan.package_image
+
+
+# Output stream that compresses and checksums what is written, for one zip member
+class DeflateWriter:
+    def __init__(self, out, level=6):
+        self.out = out
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        self.crc = 0
+        self.size = 0
+        self.compress_size = 0
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        chunk = self.compressor.compress(data)
+        if chunk:
+            self.out.write(chunk)
+            self.compress_size += len(chunk)
+
+    def close(self):
+        chunk = self.compressor.flush()
+        self.out.write(chunk)
+        self.compress_size += len(chunk)
+
+
+# Stand-in for the Document the section renderers write into, serializing each paragraph once the next one starts
+class StreamingBody:
+    def __init__(self, writer, image):
+        self.writer = writer
+        self.image = image
+        self.pending = None
+
+    @property
+    def part(self):
+        # Paragraph.style looks style names up through the part
+        return self.image.styles_part
+
+    def flush(self):
+        if self.pending is not None:
+            self.writer.write(serialize_block(self.pending, self.image.namespaces))
+            self.pending = None
+
+    def write(self, data):
+        self.flush()
+        self.writer.write(data)
+
+    def add_paragraph(self, text=None, style=None):
+        # Callers keep formatting the returned paragraph (runs, bold), so it is written later
+        self.flush()
+        self.pending = OxmlElement("w:p")
+        paragraph = Paragraph(self.pending, self)
+        if text:
+            paragraph.add_run(text)
+        if style is not None:
+            paragraph.style = style
+        return paragraph
+
+
+# Function to convert a ZipInfo timestamp to the MS-DOS time and date fields
+def dos_datetime(date_time):
+    year, month, day, hour, minute, second = date_time
+    return hour << 11 | minute << 5 | second // 2, (year - 1980) << 9 | month << 5 | day
+
+
+# Function to write a rendered resume as a .docx into a binary stream
+def write_docx(out, plan, resume, name, email, phone, linkedin):
+    image = get_package_image(plan)
+    entries = []
+    offset = 0
+    for member in image.members:
+        info = member.info
+        if member.record is not None:
+            out.write(member.record)
+            entries.append((info, info.flag_bits, info.CRC, info.compress_size, info.file_size, offset))
+            offset += len(member.record)
+            continue
+
+        # The document part: local header without sizes, streamed data, then a data descriptor
+        flags = info.flag_bits | FLAG_DATA_DESCRIPTOR
+        name_bytes = info.filename.encode("ascii")
+        dos_time, dos_date = dos_datetime(info.date_time)
+        out.write(LOCAL_HEADER.pack(LOCAL_HEADER_SIGNATURE, info.extract_version, 0, flags, zipfile.ZIP_DEFLATED,
+                                    dos_time, dos_date, 0, 0, 0, len(name_bytes), 0))
+        out.write(name_bytes)
+        writer = DeflateWriter(out)
+        write_document(writer, image, plan, resume, name, email, phone, linkedin)
+        writer.close()
+        out.write(DATA_DESCRIPTOR.pack(DATA_DESCRIPTOR_SIGNATURE, writer.crc, writer.compress_size, writer.size))
+        entries.append((info, flags, writer.crc, writer.compress_size, writer.size, offset))
+        offset += LOCAL_HEADER.size + len(name_bytes) + writer.compress_size + DATA_DESCRIPTOR.size
+
+    central_directory_offset = offset
+    for info, flags, crc, compress_size, file_size, header_offset in entries:
+        name_bytes = info.filename.encode("ascii")
+        method = zipfile.ZIP_DEFLATED if info.filename == DOCUMENT_PART else info.compress_type
+        dos_time, dos_date = dos_datetime(info.date_time)
+        record = CENTRAL_HEADER.pack(CENTRAL_HEADER_SIGNATURE, info.create_version, info.create_system,
+                                     info.extract_version, 0, flags, method, dos_time, dos_date, crc,
+                                     compress_size, file_size, len(name_bytes), 0, 0, 0, info.internal_attr,
+                                     info.external_attr, header_offset)
+        out.write(record)
+        out.write(name_bytes)
+        offset += len(record) + len(name_bytes)
+    out.write(END_RECORD.pack(END_RECORD_SIGNATURE, 0, 0, len(entries), len(entries),
+                              offset - central_directory_offset, central_directory_offset, 0))
+
+
+# Function to write word/document.xml: the skeleton's fixed paragraphs with the resume content between them
+def write_document(writer, image, plan, resume, name, email, phone, linkedin):
+    writer.write(image.document_prefix)
+    body = StreamingBody(writer, image)
+
+    header = copy.deepcopy(image.header)
+    header.findall(rg.qn("w:r"))[0].text = name
+    body.write(serialize_block(header, image.namespaces))
+
+    contact = Paragraph(copy.deepcopy(image.contact), body)
+    contact.add_run(f"{phone} | {email}")
+    if linkedin:
+        contact.add_run(f" | {linkedin}")
+    body.write(serialize_block(contact._p, image.namespaces))
+
+    for section, heading in zip(plan.sections, image.headings):
+        body.write(heading)
+        rg.SECTION_RENDERERS[section.key](body, section.body, resume)
+
+    body.write(image.document_suffix)
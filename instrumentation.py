@@ -0,0 +1,246 @@
+"""Lightweight tracing of the generation hot path, exported in Prometheus text format.
+
+Stages are timed with `stage("name")` blocks or the `traced("name")` decorator. Nothing is
+recorded unless METRICS_ENABLED=1 or a per-request trace is active (start_trace), so the
+disabled path costs one flag check per stage.
+"""
+import contextvars
+import functools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Histogram buckets for stage durations, in seconds
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Trace of the request currently being handled on this thread (None when not tracing)
+_current_trace = contextvars.ContextVar("resume_trace", default=None)
+
+
+# Duration histogram of one stage
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+
+# Process-wide store of stage histograms, counters and gauge collectors
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.collectors = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def register_collector(self, prefix, collect):
+        """collect() returns a dict of numeric values, exported as gauges named resume_<prefix>_<key>"""
+        with self._lock:
+            self.collectors[prefix] = collect
+
+    def render_prometheus(self):
+        lines = [
+            "# HELP resume_stage_duration_seconds Duration of each resume generation stage.",
+            "# TYPE resume_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            stages = {stage: (list(h.buckets), h.count, h.sum) for stage, h in self.stages.items()}
+            counters = dict(self.counters)
+            collectors = dict(self.collectors)
+
+        for stage, (buckets, count, total) in sorted(stages.items()):
+            # Buckets are already cumulative: observe() counts a value in every bucket it fits
+            for bound, bucket in zip(DURATION_BUCKETS, buckets):
+                lines.append(f'resume_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {bucket}')
+            lines.append(f'resume_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'resume_stage_duration_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'resume_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+
+        names = sorted({name for name, _ in counters})
+        for name in names:
+            lines.append(f"# TYPE resume_{name}_total counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                    lines.append(f"resume_{name}_total{{{label_text}}} {value}" if label_text else f"resume_{name}_total {value}")
+
+        for prefix, collect in sorted(collectors.items()):
+            try:
+                values = collect()
+            except Exception as e:
+                lines.append(f"# collector {prefix} failed: {e}")
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE resume_{prefix}_{key} gauge")
+                lines.append(f"resume_{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# Stage timings and counters of a single request, shown to admins in the UI
+class Trace:
+    def __init__(self):
+        self.stages = []
+        self.counts = []
+
+    def totals(self):
+        """Seconds per stage, summed over repeated stages"""
+        totals = {}
+        for stage, seconds in self.stages:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+    def rows(self):
+        rows = [{"etapa": stage, "valor": f"{seconds * 1000:.1f} ms"} for stage, seconds in self.stages]
+        for name, value, labels in self.counts:
+            label_text = ",".join(str(label) for label in labels.values())
+            rows.append({"etapa": f"{name}[{label_text}]" if label_text else name, "valor": str(value)})
+        return rows
+
+
+# Function to start tracing the current request; stages run on this thread are added to it
+def start_trace():
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+
+# Function to stop tracing the current request
+def end_trace():
+    _current_trace.set(None)
+
+
+def _record(name, seconds):
+    if METRICS_ENABLED:
+        registry.observe(name, seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.stages.append((name, seconds))
+
+
+# Timer for one stage
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# Shared do-nothing context manager returned when nothing is being recorded
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+# Function to time a block: `with stage("docx_save"): ...`
+def stage(name):
+    if METRICS_ENABLED or _current_trace.get() is not None:
+        return _Stage(name)
+    return _NOOP_STAGE
+
+
+# Decorator to time every call of a function as a stage
+def traced(name):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not METRICS_ENABLED and _current_trace.get() is None:
+                return fn(*args, **kwargs)
+            with _Stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Function to add to a counter, e.g. tokens or payload bytes
+def count(name, value=1, **labels):
+    if METRICS_ENABLED:
+        registry.count(name, value, labels)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.counts.append((name, value, labels))
+
+
+# Function to add a trace recorded in another process (e.g. a render worker) to this process's metrics
+def record_trace(trace):
+    if METRICS_ENABLED and trace is not None:
+        for name, seconds in trace.stages:
+            registry.observe(name, seconds)
+        for name, value, labels in trace.counts:
+            registry.count(name, value, labels)
+
+
+# Function to append a trace recorded in another process to the request being traced here
+def extend_trace(trace):
+    current = _current_trace.get()
+    if current is not None and trace is not None:
+        current.stages.extend(trace.stages)
+        current.counts.extend(trace.counts)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Function to serve /metrics from a background thread
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,395 @@
+"""Durable queue of resume generations, stored in MongoDB and processed by workers.
+
+With JOB_QUEUE_ENABLED=1 the "Gerar Currículo" button does not call OpenAI in the Streamlit
+script: it reserves the credit and writes a job to the generation_jobs collection. A worker
+claims the job under a lease that it renews with heartbeats while the model answers, stores
+the result in the history (with the job's _id) and marks the job as done; the page polls the
+job until it finishes, even if the tab was closed and opened again. If the worker dies, the
+lease expires and another worker claims the job; after JOB_MAX_ATTEMPTS attempts the job
+fails and the credit is given back.
+
+The worker processes of a pool share the account's OpenAI limits: each one gets
+1/N of OPENAI_REQUESTS_PER_MINUTE, OPENAI_MAX_CONCURRENCY and OPENAI_BURST. Pools on other
+machines take the full limits again, so lower those settings on each machine to its share.
+
+Usage:
+    python job_queue.py --workers 4 --concurrency 8
+
+The app starts JOB_WORKERS local processes; with JOB_WORKERS=0 it only enqueues, and the
+workers run apart (on other machines if needed) with the command above and the same MONGO_URI.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+
+# The workers also run on their own (python job_queue.py), so .env is loaded before any setting is read
+load_dotenv()
+
+import instrumentation
+from lazy_imports import LazyModule, cache_resource
+import resume_generator as rg
+
+pymongo = LazyModule("pymongo")
+
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "0") == "1"
+# Worker processes started by the app (0: workers run apart, with python job_queue.py)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Jobs each worker process runs at once; they mostly wait on the model
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "8"))
+# A running job whose lease is not renewed for this long is given to another worker (seconds)
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(JOB_LEASE_SECONDS / 3)))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Delay before a failed job is tried again, doubled after each attempt (seconds)
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "5"))
+# How often an idle worker looks for new jobs, and how often the page checks its job (seconds)
+JOB_IDLE_POLL_SECONDS = float(os.getenv("JOB_IDLE_POLL_SECONDS", "0.5"))
+JOB_STATUS_POLL_SECONDS = float(os.getenv("JOB_STATUS_POLL_SECONDS", "1"))
+# How long finished jobs are kept for pickup before MongoDB deletes them (hours)
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "168"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+# Arguments of build_resume_messages, stored by name in the job
+GENERATION_FIELDS = ("name", "email", "phone", "industry", "job_type", "experiences", "educations", "skills", "languages", "linkedin")
+
+
+# Function to read the current time as MongoDB stores it (UTC, milliseconds)
+def utc_now():
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+# Function to reserve a credit and queue a generation, reusing the user's active job for the same inputs
+@instrumentation.traced("job_enqueue")
+def enqueue_job(jobs, collection, generation_args, input_hash, template_name, limit=None):
+    """Return (job, new generation count)
+
+    The job is None when the user has reached the limit; the count is None when an active job
+    for the same inputs already existed, so no credit was reserved.
+    """
+    name, email, phone = generation_args[0], generation_args[1], generation_args[2]
+    # Unset once the job finishes, so a unique index allows one active job per user and input
+    active_key = f"{email}:{input_hash}"
+    existing = jobs.find_one({"active_key": active_key})
+    if existing is not None:
+        return existing, None
+
+    new_count = rg.reserve_generation(email, collection, rg.GENERATION_LIMIT if limit is None else limit)
+    if new_count is None:
+        return None, None
+    now = utc_now()
+    job = {
+        "user": email,
+        "status": QUEUED,
+        "active_key": active_key,
+        "input_hash": input_hash,
+        "args": dict(zip(GENERATION_FIELDS, generation_args)),
+        "template": template_name,
+        # (name, phone, linkedin), as in the history
+        "contact": [name, phone, generation_args[9]],
+        "attempts": 0,
+        "created_at": now,
+        "available_at": now,
+        "picked_up": False,
+    }
+    try:
+        jobs.insert_one(job)
+    except pymongo.errors.DuplicateKeyError:
+        # Another tab queued the same inputs in the meantime
+        rg.refund_generation(email, collection)
+        return jobs.find_one({"active_key": active_key}), None
+    return job, new_count
+
+
+# Function to claim the oldest runnable job: queued and due, or running with an expired lease
+def claim_job(jobs, worker_id, lease_seconds=JOB_LEASE_SECONDS):
+    now = utc_now()
+    return jobs.find_one_and_update(
+        {"$or": [
+            {"status": QUEUED, "available_at": {"$lte": now}},
+            {"status": RUNNING, "lease_expires_at": {"$lte": now}},
+        ]},
+        {
+            "$set": {"status": RUNNING, "worker": worker_id, "started_at": now,
+                     "lease_expires_at": now + timedelta(seconds=lease_seconds)},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("available_at", 1)],
+        return_document=pymongo.ReturnDocument.AFTER,
+    )
+
+
+# Function to extend the lease of a job this worker still holds; returns False when the lease was lost
+def renew_lease(jobs, job_id, worker_id, lease_seconds=JOB_LEASE_SECONDS):
+    now = utc_now()
+    result = jobs.update_one(
+        {"_id": job_id, "status": RUNNING, "worker": worker_id},
+        {"$set": {"lease_expires_at": now + timedelta(seconds=lease_seconds), "heartbeat_at": now}},
+    )
+    return result.matched_count == 1
+
+
+# Function to mark a job as done; returns False when another worker took it over
+def complete_job(jobs, job, worker_id):
+    now = utc_now()
+    result = jobs.update_one(
+        {"_id": job["_id"], "status": RUNNING, "worker": worker_id},
+        {
+            "$set": {"status": DONE, "finished_at": now, "expires_at": now + timedelta(hours=JOB_RETENTION_HOURS)},
+            "$unset": {"active_key": "", "lease_expires_at": "", "error": ""},
+        },
+    )
+    return result.matched_count == 1
+
+
+# Function to put a failed job back in the queue, or fail it for good and give the credit back
+def fail_job(jobs, collection, job, worker_id, error, max_attempts=JOB_MAX_ATTEMPTS):
+    now = utc_now()
+    if job["attempts"] < max_attempts:
+        delay = JOB_RETRY_DELAY * 2 ** (job["attempts"] - 1)
+        jobs.update_one(
+            {"_id": job["_id"], "status": RUNNING, "worker": worker_id},
+            {"$set": {"status": QUEUED, "available_at": now + timedelta(seconds=delay), "error": error},
+             "$unset": {"worker": "", "lease_expires_at": ""}},
+        )
+        return
+    result = jobs.update_one(
+        {"_id": job["_id"], "status": RUNNING, "worker": worker_id},
+        {"$set": {"status": FAILED, "error": error, "finished_at": now,
+                  "expires_at": now + timedelta(hours=JOB_RETENTION_HOURS)},
+         "$unset": {"active_key": "", "lease_expires_at": ""}},
+    )
+    # Only the worker that failed the job refunds, so the credit comes back once
+    if result.matched_count == 1:
+        rg.refund_generation(job["user"], collection)
+
+
+# Function to build the OpenAI client of one of `processes` worker processes, with its share of the limits
+def worker_service(processes):
+    service = rg.GenerationService(
+        max_concurrency=max(1, rg.OPENAI_MAX_CONCURRENCY // processes),
+        requests_per_minute=rg.OPENAI_REQUESTS_PER_MINUTE / processes,
+        burst=max(1, rg.OPENAI_BURST // processes),
+    )
+    instrumentation.registry.register_collector("openai", service.metrics.snapshot)
+    return service
+
+
+# Function to generate the resume of a job and store it in the history under the job's id
+def run_job(job, history, service=None):
+    args = tuple(job["args"][field] for field in GENERATION_FIELDS)
+    trace = instrumentation.start_trace()
+    try:
+        # An earlier attempt may have got the answer before its worker died
+        response_cache = rg.get_response_cache()
+        content = response_cache.get(job["input_hash"])
+        if content is None:
+            if rg.RESUME_OUTPUT_FORMAT == "json":
+                _, content = rg.generate_resume_json(*args, service=service)
+            else:
+                content = rg.generate_resume(*args, service=service)
+            response_cache.set(job["input_hash"], content)
+        entry_id = rg.record_generation(
+            history, job["user"], job["input_hash"], content, job["template"], job["contact"], trace.totals(),
+            entry_id=job["_id"],
+        )
+    finally:
+        instrumentation.end_trace()
+    if entry_id is None:
+        raise RuntimeError("Não foi possível gravar o currículo no histórico.")
+
+
+# Worker that runs jobs on a few threads and renews the leases of the jobs it holds
+class JobWorker:
+    def __init__(self, jobs, collection, history, worker_id=None, concurrency=JOB_CONCURRENCY,
+                 lease_seconds=JOB_LEASE_SECONDS, heartbeat_seconds=JOB_HEARTBEAT_SECONDS, max_attempts=JOB_MAX_ATTEMPTS,
+                 service=None):
+        self.jobs = jobs
+        self.collection = collection
+        self.history = history
+        # OpenAI client of this worker (None: the process-wide one, with the full limits)
+        self.service = service
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_attempts = max_attempts
+        self.stopping = threading.Event()
+        self._heartbeat_stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.held = set()
+        self.completed = 0
+        self.failed = 0
+        self.lost = 0
+        self._threads = []
+
+    def start(self):
+        self._threads = [threading.Thread(target=self.heartbeat_loop, name=f"{self.worker_id}-heartbeat", daemon=True)]
+        self._threads += [threading.Thread(target=self.run_loop, name=f"{self.worker_id}-{i}", daemon=True)
+                          for i in range(self.concurrency)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop claiming jobs and wait for the running ones to finish"""
+        self.stopping.set()
+        for thread in self._threads[1:]:
+            thread.join(timeout)
+        # Leases are renewed until the last running job has finished
+        self._heartbeat_stopping.set()
+        self._threads[0].join(timeout)
+
+    def run_loop(self):
+        while not self.stopping.is_set():
+            try:
+                job = claim_job(self.jobs, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"Erro ao buscar jobs na fila: {e}")
+                job = None
+            if job is None:
+                self.stopping.wait(JOB_IDLE_POLL_SECONDS)
+                continue
+            self.process(job)
+
+    def process(self, job):
+        if job["attempts"] > self.max_attempts:
+            # Claimed again after its workers kept dying
+            fail_job(self.jobs, self.collection, job, self.worker_id, "Tentativas esgotadas.", self.max_attempts)
+            return
+        with self._lock:
+            self.held.add(job["_id"])
+        try:
+            run_job(job, self.history, self.service)
+        except Exception as e:
+            print(f"Erro no job {job['_id']} (tentativa {job['attempts']}): {e}")
+            fail_job(self.jobs, self.collection, job, self.worker_id, str(e), self.max_attempts)
+            with self._lock:
+                self.failed += 1
+            return
+        finally:
+            with self._lock:
+                self.held.discard(job["_id"])
+        finished = complete_job(self.jobs, job, self.worker_id)
+        with self._lock:
+            if finished:
+                self.completed += 1
+            else:
+                # The lease expired and another worker took the job; the history entry is shared
+                self.lost += 1
+
+    def heartbeat_loop(self):
+        while not self._heartbeat_stopping.wait(self.heartbeat_seconds):
+            with self._lock:
+                held = list(self.held)
+            for job_id in held:
+                try:
+                    if not renew_lease(self.jobs, job_id, self.worker_id, self.lease_seconds):
+                        print(f"Concessão do job {job_id} perdida.")
+                except Exception as e:
+                    print(f"Erro ao renovar a concessão do job {job_id}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {"running": len(self.held), "completed": self.completed, "failed": self.failed, "lost": self.lost}
+
+
+# Function run in each of `processes` worker processes: claims jobs until it receives SIGTERM
+def worker_main(concurrency=JOB_CONCURRENCY, processes=1):
+    db = rg.get_mongo_client()[rg.DB_NAME]
+    rg.ensure_mongo_indexes()
+    worker = JobWorker(db[rg.JOBS_COLLECTION], db[rg.COLLECTION_NAME], db[rg.HISTORY_COLLECTION], concurrency=concurrency,
+                       service=worker_service(processes))
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stopping.set())
+    print(f"Worker {worker.worker_id} pronto ({concurrency} jobs por vez).")
+    worker.start()
+    try:
+        while not worker.stopping.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    worker.stop()
+
+
+# Local worker processes started with the app
+class JobWorkerPool:
+    def __init__(self, workers=JOB_WORKERS, concurrency=JOB_CONCURRENCY):
+        # spawn, not fork: forking the multi-threaded Streamlit server is unsafe
+        context = multiprocessing.get_context("spawn")
+        self.processes = [context.Process(target=worker_main, args=(concurrency, workers), name=f"job-worker-{i}", daemon=True)
+                          for i in range(workers)]
+        for process in self.processes:
+            process.start()
+
+    def stats(self):
+        return {"workers": len(self.processes), "alive": sum(process.is_alive() for process in self.processes)}
+
+    def shutdown(self, timeout=None):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(timeout)
+
+
+# Worker pool shared by every session of the process (None when the workers run apart)
+@cache_resource
+def get_job_worker_pool():
+    if JOB_WORKERS <= 0:
+        return None
+    pool = JobWorkerPool()
+    instrumentation.registry.register_collector("job_workers", pool.stats)
+    return pool
+
+
+# Function to read a job's state for the page
+def get_job(jobs, job_id):
+    return jobs.find_one({"_id": job_id}, projection={"args": 0})
+
+
+# Function to find the user's latest job whose result the page has not shown yet (e.g. the tab was closed)
+def find_unseen_job(jobs, email):
+    return jobs.find_one({"user": email, "picked_up": False}, projection={"args": 0}, sort=[("created_at", -1)])
+
+
+# Function to record that the page showed a finished job
+def mark_picked_up(jobs, job_id):
+    jobs.update_one({"_id": job_id}, {"$set": {"picked_up": True}})
+
+
+# Function to count the queued jobs ahead of a job
+def queue_position(jobs, job):
+    return jobs.count_documents({"status": QUEUED, "available_at": {"$lt": job["available_at"]}}) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Workers da fila de gerações de currículo.")
+    parser.add_argument("--workers", type=int, default=max(JOB_WORKERS, 1), help="processos de worker")
+    parser.add_argument("--concurrency", type=int, default=JOB_CONCURRENCY, help="jobs por processo ao mesmo tempo")
+    args = parser.parse_args()
+    if not rg.OPENAI_API_KEY:
+        print("Configure OPENAI_API_KEY antes de iniciar os workers.")
+        return 1
+
+    pool = JobWorkerPool(args.workers, args.concurrency)
+    signal.signal(signal.SIGTERM, lambda signum, frame: pool.shutdown())
+    try:
+        for process in pool.processes:
+            process.join()
+    except KeyboardInterrupt:
+        pool.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
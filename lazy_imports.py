@@ -0,0 +1,84 @@
+"""Deferred imports and process-wide caches that work with or without Streamlit.
+
+streamlit, openai and pymongo take most of the app's import time, yet the render worker
+processes only need python-docx, and the batch CLI and the API never touch streamlit. Modules
+bind those dependencies with LazyModule, which imports the real module on first attribute
+access, and decorate their shared resources with cache_resource / cache_data: Streamlit's
+caches when the app runs under Streamlit, a process-local memo everywhere else.
+"""
+import functools
+import importlib
+import sys
+import threading
+import time
+
+
+# Module stand-in that imports the real module the first time one of its attributes is read
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        # Only called for attributes the stand-in does not have itself
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+# Function to tell whether the process runs the Streamlit app; the CLI, the API and the render workers never import it
+def streamlit_loaded():
+    return "streamlit" in sys.modules
+
+
+# Function to memoize fn per argument tuple, each value built once even under concurrent calls
+def memoize(fn, ttl=None):
+    entries = {}
+    lock = threading.Lock()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        entry = entries.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+            with lock:
+                entry = entries.get(key)
+                if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+                    entry = (fn(*args, **kwargs), time.monotonic() + ttl if ttl is not None else None)
+                    entries[key] = entry
+        return entry[0]
+
+    return wrapper
+
+
+# Function to pick the cache behind a decorated function on its first call
+def deferred_cache(fn, streamlit_cache, ttl=None):
+    cached = None
+    lock = threading.Lock()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        nonlocal cached
+        if cached is None:
+            with lock:
+                if cached is None:
+                    cached = streamlit_cache(fn) if streamlit_loaded() else memoize(fn, ttl)
+        return cached(*args, **kwargs)
+
+    return wrapper
+
+
+# Decorator for objects shared by every session of the process (clients, pools, caches)
+def cache_resource(fn):
+    return deferred_cache(fn, lambda f: sys.modules["streamlit"].cache_resource(show_spinner=False)(f))
+
+
+# Decorator for data reused for ttl seconds
+def cache_data(ttl):
+    def decorator(fn):
+        return deferred_cache(fn, lambda f: sys.modules["streamlit"].cache_data(ttl=ttl, show_spinner=False)(f), ttl)
+    return decorator
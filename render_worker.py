@@ -0,0 +1,177 @@
+"""Process pool that renders .docx files away from the Streamlit script threads.
+
+python-docx/lxml rendering is CPU-bound and holds the GIL, so a few renders on the script
+threads stall every other session. The pool runs them in separate processes, each one with
+the templates parsed up front, and caps how many renders may be waiting at once.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import instrumentation
+from lazy_imports import cache_resource
+import resume_generator as rg
+
+# Render pool settings (RENDER_WORKERS=0 renders on the calling thread)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+RENDER_MAX_PENDING = int(os.getenv("RENDER_MAX_PENDING", str(max(RENDER_WORKERS, 1) * 4)))
+RENDER_QUEUE_TIMEOUT = float(os.getenv("RENDER_QUEUE_TIMEOUT", "10"))
+
+
+# Raised when the render queue stays full for longer than the queue timeout
+class RenderQueueFull(Exception):
+    pass
+
+
+# Function run once in each worker process to parse every template before the first request
+def warm_worker(templates_dir):
+    for template_name in os.listdir(templates_dir):
+        if template_name.endswith(".docx"):
+            rg.get_template_plan(template_name, templates_dir)
+
+
+# Function run in the worker processes to render one resume
+def render_job(resume_data, name, email, phone, linkedin, template_name, templates_dir):
+    """Return (doc_bytes, render_seconds, trace); the trace carries the stage timings back to the parent"""
+    start = time.perf_counter()
+    trace = instrumentation.start_trace()
+    try:
+        resume = rg.ParsedResume.from_dict(resume_data)
+        doc_bytes = rg.create_word_doc(resume, name, email, phone, linkedin, template_name, templates_dir)
+    finally:
+        instrumentation.end_trace()
+    return doc_bytes, time.perf_counter() - start, trace
+
+
+# Bounded pool of render processes with queue-depth metrics
+class RenderPool:
+    def __init__(self, templates_dir, workers=RENDER_WORKERS, max_pending=RENDER_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.templates_dir = templates_dir
+        self.executor = self.start_executor()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.max_pending_seen = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_queue_wait = 0.0
+        self.total_render_time = 0.0
+        self.restarts = 0
+
+    def start_executor(self):
+        # spawn, not fork: forking the multi-threaded Streamlit server is unsafe
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_worker,
+            initargs=(self.templates_dir,),
+        )
+        # Start every worker now so the templates are parsed before the first request
+        for _ in range(self.workers):
+            executor.submit(os.getpid)
+        return executor
+
+    def restart(self, broken):
+        """Replace an executor whose worker died; returns the executor to submit to"""
+        with self._lock:
+            # Another thread may have replaced it already
+            if self.executor is not broken:
+                return self.executor
+            executor = self.executor = self.start_executor()
+            self.restarts += 1
+        # Outside the lock: cancelling the queued renders runs their callbacks, which take it
+        broken.shutdown(wait=False, cancel_futures=True)
+        print("Processo de renderização encerrado inesperadamente; pool de renderização reiniciado.")
+        return executor
+
+    def submit(self, resume, name, email, phone, linkedin, template_name, templates_dir, timeout=RENDER_QUEUE_TIMEOUT):
+        """Queue a render; the future resolves to (doc_bytes, render_seconds, trace)"""
+        # Under streamlit run the app module is __main__, not resume_generator, so its
+        # ParsedResume is a different class: check for the method rather than the type
+        resume_data = resume.to_dict() if hasattr(resume, "to_dict") else rg.load_resume(resume).to_dict()
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self.rejected += 1
+            raise RenderQueueFull(f"{self.max_pending} renders already waiting")
+
+        submitted = time.perf_counter()
+        with self._lock:
+            self.pending += 1
+            self.max_pending_seen = max(self.max_pending_seen, self.pending)
+
+        def finished(future):
+            self._slots.release()
+            elapsed = time.perf_counter() - submitted
+            with self._lock:
+                self.pending -= 1
+                if future.cancelled() or future.exception() is not None:
+                    self.failed += 1
+                else:
+                    _, render_time, trace = future.result()
+                    instrumentation.record_trace(trace)
+                    self.completed += 1
+                    self.total_render_time += render_time
+                    self.total_queue_wait += max(elapsed - render_time, 0.0)
+
+        job = (render_job, resume_data, name, email, phone, linkedin, template_name, templates_dir)
+        executor = self.executor
+        try:
+            try:
+                future = executor.submit(*job)
+            except BrokenProcessPool:
+                future = self.restart(executor).submit(*job)
+        except Exception:
+            self._slots.release()
+            with self._lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(finished)
+        return future
+
+    def render(self, resume, name, email, phone, linkedin, template_name, templates_dir):
+        try:
+            doc_bytes, _, trace = self.submit(resume, name, email, phone, linkedin, template_name, templates_dir).result()
+        except BrokenProcessPool:
+            # A worker died during this render: the next submit starts new workers, so try once more
+            doc_bytes, _, trace = self.submit(resume, name, email, phone, linkedin, template_name, templates_dir).result()
+        instrumentation.extend_trace(trace)
+        return doc_bytes
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self.pending,
+                "max_queue_depth": self.max_pending_seen,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+                "avg_queue_wait_ms": self.total_queue_wait / self.completed * 1000 if self.completed else 0.0,
+                "avg_render_ms": self.total_render_time / self.completed * 1000 if self.completed else 0.0,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Render pool shared by every session of the process
+@cache_resource
+def get_render_pool(templates_dir):
+    pool = RenderPool(templates_dir)
+    instrumentation.registry.register_collector("render_pool", pool.stats)
+    return pool
+
+
+# Function to render a resume to .docx bytes, in the pool when it is enabled
+def render_docx(resume, name, email, phone, linkedin, template_name, templates_dir):
+    if RENDER_WORKERS <= 0:
+        return rg.create_word_doc(resume, name, email, phone, linkedin, template_name, templates_dir)
+    return get_render_pool(templates_dir).render(resume, name, email, phone, linkedin, template_name, templates_dir)
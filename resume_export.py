@@ -0,0 +1,340 @@
+"""Export of a parsed resume to .docx, PDF, ATS plain text and HTML.
+
+Every format is rendered from the same ParsedResume, without calling the model again, and
+kept in a process-wide cache keyed by a hash of the content, so offering another download
+format (or downloading the same resume twice) never renders it twice. Everything runs
+offline: the PDF writer uses only the standard library and the PDF base-14 fonts.
+"""
+import hashlib
+import html
+import json
+import os
+import threading
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+import instrumentation
+from lazy_imports import cache_resource
+import render_worker
+import resume_generator as rg
+
+# Maximum number of exported files kept in memory
+EXPORT_CACHE_SIZE = int(os.getenv("EXPORT_CACHE_SIZE", "128"))
+
+# Format -> (label, MIME type, file extension)
+EXPORT_FORMATS = {
+    "docx": ("Word", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", "docx"),
+    "pdf": ("PDF", "application/pdf", "pdf"),
+    "txt": ("Texto (ATS)", "text/plain", "txt"),
+    "html": ("HTML", "text/html", "html"),
+}
+
+
+# Function to list the resume as layout blocks shared by the PDF and HTML renderers
+def resume_blocks(resume):
+    """Yield (kind, text) with kind in section, paragraph, heading and bullet, in document order"""
+    for title, key in rg.RESUME_SECTIONS:
+        if key == "Perfil" and resume.profile:
+            yield "section", title
+            for paragraph in resume.profile:
+                yield "paragraph", paragraph
+        elif key == "Experiência Profissional" and resume.experiences:
+            yield "section", title
+            for experience in resume.experiences:
+                yield "heading", experience.heading().upper()
+                for detail in experience.details:
+                    yield "paragraph", detail
+                for bullet in experience.bullets:
+                    yield "bullet", bullet
+        elif key == "Educação" and resume.education:
+            yield "section", title
+            for education in resume.education:
+                yield "heading", education.heading().upper()
+                for detail in education.details:
+                    yield "paragraph", detail
+        elif key == "Habilidades" and resume.skills:
+            yield "section", title
+            for skill in resume.skills:
+                yield "bullet", skill
+        elif key == "Idiomas" and resume.languages:
+            yield "section", title
+            for language in resume.languages:
+                yield "paragraph", language
+        elif key == "Atividades e Interesses" and resume.interests:
+            yield "section", title
+            yield "paragraph", ", ".join(resume.interests)
+
+
+# Function to build the contact line under the name
+def contact_line(email, phone, linkedin):
+    return " | ".join(part for part in (phone, email, linkedin) if part)
+
+
+# Function to render the resume as plain text for applicant tracking systems
+def render_ats_text(resume, name, email, phone, linkedin):
+    parts = [name, contact_line(email, phone, linkedin)]
+    for title, key in rg.RESUME_SECTIONS:
+        text = rg.format_section_text(resume, key)
+        if text:
+            parts.append(f"\n{title}\n{text}")
+    return ("\n".join(parts) + "\n").encode("utf-8")
+
+
+# Function to render the resume as a standalone HTML page
+def render_html(resume, name, email, phone, linkedin):
+    body = []
+    in_list = False
+    for kind, text in resume_blocks(resume):
+        if in_list and kind != "bullet":
+            body.append("</ul>")
+            in_list = False
+        if kind == "section":
+            body.append(f"<h2>{html.escape(text)}</h2>")
+        elif kind == "heading":
+            body.append(f"<h3>{html.escape(text)}</h3>")
+        elif kind == "bullet":
+            if not in_list:
+                body.append("<ul>")
+                in_list = True
+            body.append(f"<li>{html.escape(text)}</li>")
+        else:
+            body.append(f"<p>{html.escape(text)}</p>")
+    if in_list:
+        body.append("</ul>")
+
+    page = f"""<!DOCTYPE html>
+<html lang="pt">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(name)}</title>
+<style>
+body {{ font-family: Helvetica, Arial, sans-serif; max-width: 800px; margin: 40px auto; color: #222; line-height: 1.4; }}
+h1 {{ text-align: center; margin-bottom: 4px; }}
+.contact {{ text-align: center; color: #555; margin-top: 0; }}
+h2 {{ border-bottom: 1px solid #ccc; font-size: 1.1em; letter-spacing: 0.05em; margin-top: 24px; }}
+h3 {{ font-size: 0.95em; margin-bottom: 4px; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(name)}</h1>
+<p class="contact">{html.escape(contact_line(email, phone, linkedin))}</p>
+{chr(10).join(body)}
+</body>
+</html>
+"""
+    return page.encode("utf-8")
+
+
+# Character widths (1/1000 em) of Helvetica and Helvetica-Bold for ASCII 32-126, from the Adobe AFM files
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+
+# PDF page geometry (points) and font sizes
+PDF_PAGE_WIDTH = 595
+PDF_PAGE_HEIGHT = 842
+PDF_MARGIN = 56
+PDF_STYLES = {
+    # kind -> (bold, size, space before, indent)
+    "name": (True, 18, 0, 0),
+    "contact": (False, 10, 4, 0),
+    "section": (True, 12, 16, 0),
+    "heading": (True, 10.5, 8, 0),
+    "paragraph": (False, 10.5, 3, 0),
+    "bullet": (False, 10.5, 2, 14),
+}
+
+
+# Function to measure a text in points
+def text_width(text, size, bold=False):
+    widths = HELVETICA_BOLD_WIDTHS if bold else HELVETICA_WIDTHS
+    total = 0
+    for char in text:
+        code = ord(char)
+        if not 32 <= code <= 126:
+            # Accented letters are as wide as their base letter
+            code = ord(unicodedata.normalize("NFD", char)[0])
+        total += widths[code - 32] if 32 <= code <= 126 else 556
+    return total * size / 1000
+
+
+# Function to break a text into lines that fit a width
+def wrap_text(text, size, bold, width):
+    lines = []
+    line = ""
+    for word in text.split():
+        candidate = f"{line} {word}" if line else word
+        if line and text_width(candidate, size, bold) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line or not lines:
+        lines.append(line)
+    return lines
+
+
+# Function to write a text as a PDF string literal in the fonts' WinAnsi encoding
+def pdf_string(text):
+    data = text.encode("cp1252", errors="replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+# Function to render the resume as a PDF, with the PDF's built-in Helvetica fonts
+def render_pdf(resume, name, email, phone, linkedin):
+    usable_width = PDF_PAGE_WIDTH - 2 * PDF_MARGIN
+    pages = [[]]
+    y = PDF_PAGE_HEIGHT - PDF_MARGIN
+
+    def add(kind, text, centered=False):
+        nonlocal y
+        bold, size, space_before, indent = PDF_STYLES[kind]
+        y -= space_before
+        for i, line in enumerate(wrap_text(text, size, bold, usable_width - indent)):
+            leading = size * 1.3
+            if y - leading < PDF_MARGIN:
+                pages.append([])
+                y = PDF_PAGE_HEIGHT - PDF_MARGIN
+            y -= leading
+            width = text_width(line, size, bold)
+            x = PDF_MARGIN + (usable_width - width) / 2 if centered else PDF_MARGIN + indent
+            font = b"/F2" if bold else b"/F1"
+            pages[-1].append(b"BT %s %.1f Tf %.2f %.2f Td %s Tj ET" % (font, size, x, y, pdf_string(line)))
+            if kind == "bullet" and i == 0:
+                pages[-1].append(b"BT /F1 %.1f Tf %.2f %.2f Td %s Tj ET" % (size, PDF_MARGIN + 3, y, pdf_string("•")))
+            if kind == "section":
+                pages[-1].append(b"0.6 G 0.5 w %.2f %.2f m %.2f %.2f l S 0 G" % (
+                    PDF_MARGIN, y - 3, PDF_PAGE_WIDTH - PDF_MARGIN, y - 3))
+                y -= 4
+
+    add("name", name, centered=True)
+    add("contact", contact_line(email, phone, linkedin), centered=True)
+    for kind, text in resume_blocks(resume):
+        add(kind, text)
+
+    # Objects: 1 catalog, 2 page tree, 3-4 fonts, then a page and its content stream per page
+    objects = [None, None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"]
+    page_ids = []
+    for commands in pages:
+        stream = zlib.compress(b"\n".join(commands))
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>" % (
+            PDF_PAGE_WIDTH, PDF_PAGE_HEIGHT, content_id))
+        page_ids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % i for i in page_ids), len(page_ids))
+
+    output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+# Bounded LRU cache of exported files, keyed by a hash of the format and the content
+class ExportCache:
+    def __init__(self, maxsize=EXPORT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def set(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes": sum(len(data) for data in self._entries.values()),
+            }
+
+
+# Export cache shared by every session of the process
+@cache_resource
+def get_export_cache():
+    cache = ExportCache()
+    instrumentation.registry.register_collector("export_cache", cache.stats)
+    return cache
+
+
+# Function to compute the cache key of one exported file
+def export_cache_key(export_format, resume, name, email, phone, linkedin, template_name, signature=None):
+    payload = {
+        "format": export_format,
+        # Only the .docx depends on the template, and an edited template file gives a new key
+        "template": [template_name, signature] if export_format == "docx" else None,
+        "resume": resume.to_dict(),
+        "contact": [name, email, phone, linkedin],
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Renderers of the formats that run in the calling process
+EXPORT_RENDERERS = {
+    "pdf": render_pdf,
+    "txt": render_ats_text,
+    "html": render_html,
+}
+
+
+# Function to render a resume to several formats at once, reusing files exported before
+def export_resume(resume, name, email, phone, linkedin, template_name, templates_dir, formats=tuple(EXPORT_FORMATS)):
+    """Return {format: bytes}; resume may be a ParsedResume or the generated text/JSON"""
+    if isinstance(resume, str):
+        resume = rg.load_resume(resume)
+    cache = get_export_cache()
+    signature = rg.template_signature(template_name, templates_dir) if "docx" in formats else None
+    files = {}
+    for export_format in formats:
+        key = export_cache_key(export_format, resume, name, email, phone, linkedin, template_name, signature)
+        data = cache.get(key)
+        if data is None:
+            with instrumentation.stage(f"export_{export_format}"):
+                if export_format == "docx":
+                    data = render_worker.render_docx(resume, name, email, phone, linkedin, template_name, templates_dir)
+                else:
+                    data = EXPORT_RENDERERS[export_format](resume, name, email, phone, linkedin)
+            cache.set(key, data)
+        files[export_format] = data
+    return files
@@ -1,28 +1,188 @@
-import streamlit as st
-from openai import OpenAI
 from docx import Document
 import os
 from dotenv import load_dotenv
-from pymongo import MongoClient
 from docx.shared import Pt, RGBColor
+from docx.enum.style import WD_STYLE_TYPE
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.styles.styles import Styles
 import re
+import copy
+import threading
+import time
+import asyncio
+import queue
+import random
+from dataclasses import asdict, dataclass, field
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+import hashlib
+import hmac
+import io
+import json
+import tempfile
+import zlib
 
-# Load environment variables
+# Load environment variables before the local modules below read their settings
 load_dotenv()
 
+from lazy_imports import LazyModule, cache_data, cache_resource
+import instrumentation
+import render_worker
+import resume_export
+import docx_writer
+import job_queue
+
+# Imported on first use: the rendering path (render workers, batch renders) needs none of them
+st = LazyModule("streamlit")
+openai = LazyModule("openai")
+pymongo = LazyModule("pymongo")
+bson = LazyModule("bson")
+
 # Set OpenAI API key
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
+
+# Stream the model output to the screen while it is generated (set to 0 to wait for the full response)
+OPENAI_STREAM = os.getenv("OPENAI_STREAM", "1") == "1"
 
 # MongoDB Atlas connection
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = "resume_generator"
 COLLECTION_NAME = "users"
+HISTORY_COLLECTION = "generation_history"
+JOBS_COLLECTION = "generation_jobs"
+
+# Connection pool settings (tune to the expected number of concurrent sessions)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+
+# Listener that keeps connection pool counters for sizing the pool
+class PoolMetricsListener:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open_connections = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _record_wait(self, duration):
+        if duration is not None:
+            self.total_wait_time += duration
+            self.max_wait_time = max(self.max_wait_time, duration)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(self.open_connections - 1, 0)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self._record_wait(event.duration)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            self._record_wait(event.duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def snapshot(self):
+        with self._lock:
+            attempts = self.checkouts + self.checkout_failures
+            return {
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_wait_ms": (self.total_wait_time / attempts * 1000) if attempts else 0.0,
+                "max_wait_ms": self.max_wait_time * 1000,
+                "max_pool_size": MONGO_MAX_POOL_SIZE,
+            }
+
+# Shared pool listener (one per process, survives Streamlit reruns)
+@cache_resource
+def get_pool_metrics_listener():
+    # pymongo only accepts subclasses of its listener classes, and is imported on first use
+    listener_class = type("PoolMetricsListener", (PoolMetricsListener, pymongo.monitoring.ConnectionPoolListener), {})
+    listener = listener_class()
+    instrumentation.registry.register_collector("mongo_pool", listener.snapshot)
+    return listener
+
+# Shared MongoDB client, created lazily and reused across sessions and reruns
+@cache_resource
+def get_mongo_client():
+    return pymongo.MongoClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[get_pool_metrics_listener()],
+    )
+
+# Indexes every collection needs, created once per process at startup
+@cache_resource
+def ensure_mongo_indexes():
+    db = get_mongo_client()[DB_NAME]
+    try:
+        # Login and quota reservation both look users up by email
+        db[COLLECTION_NAME].create_index("email", unique=True, name="email_unique")
+        # A user's history is listed newest first; _id breaks ties between equal timestamps
+        db[HISTORY_COLLECTION].create_index([("user", 1), ("created_at", -1), ("_id", -1)], name="user_created_at")
+        # Workers claim the oldest runnable job; a user has at most one active job per input
+        db[JOBS_COLLECTION].create_index([("status", 1), ("available_at", 1)], name="status_available_at")
+        db[JOBS_COLLECTION].create_index([("user", 1), ("created_at", -1)], name="user_created_at")
+        db[JOBS_COLLECTION].create_index("active_key", unique=True, sparse=True, name="active_key_unique")
+        # Finished jobs are deleted once their result has been kept long enough to be picked up
+        db[JOBS_COLLECTION].create_index("expires_at", expireAfterSeconds=0, name="expires_at_ttl")
+    except Exception as e:
+        print(f"Erro ao criar os índices do MongoDB: {e}")
+        return False
+    return True
 
 # Connect to MongoDB
+@instrumentation.traced("mongo_connect")
 def connect_to_mongodb():
     try:
-        client = MongoClient(MONGO_URI)
+        client = get_mongo_client()
+        ensure_mongo_indexes()
         db = client[DB_NAME]
         collection = db[COLLECTION_NAME]
         return collection
@@ -30,130 +190,778 @@ def connect_to_mongodb():
         st.error(f"Erro ao conectar ao MongoDB: {e}")
         return None
 
-# Function to check if a user exists in the database
-def check_user_exists(email, collection):
-    user = collection.find_one({"email": email})
-    return user is not None
+# Function to check that MongoDB is reachable (through the shared client unless another one is given)
+def check_mongodb_health(client=None):
+    start = time.perf_counter()
+    try:
+        (client or get_mongo_client()).admin.command("ping")
+        return {"ok": True, "latency_ms": (time.perf_counter() - start) * 1000}
+    except Exception as e:
+        return {"ok": False, "latency_ms": (time.perf_counter() - start) * 1000, "error": str(e)}
 
-# Function to authenticate a user
-def authenticate_user(email, password, collection):
-    user = collection.find_one({"email": email, "password": password})
-    if user:
-        return user
-    else:
+# Function to read the connection pool metrics
+def get_mongo_pool_metrics():
+    return get_pool_metrics_listener().snapshot()
+
+# Password hashing settings (PBKDF2-SHA256)
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "600000"))
+PASSWORD_HASH_PREFIX = "pbkdf2_sha256"
+
+# Function to hash a password for storage
+def hash_password(password, iterations=PASSWORD_HASH_ITERATIONS):
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return f"{PASSWORD_HASH_PREFIX}${iterations}${salt.hex()}${digest.hex()}"
+
+# Function to check a password against its stored hash
+def verify_password(password, stored):
+    if not stored:
+        return False
+    if not stored.startswith(PASSWORD_HASH_PREFIX + "$"):
+        # Accounts created before hashing still hold the plain password
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+    _, iterations, salt, digest = stored.split("$")
+    candidate = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(salt), int(iterations))
+    return hmac.compare_digest(candidate.hex(), digest)
+
+# Function to look a user up by email, returning only the fields the login needs
+@instrumentation.traced("mongo_find_user")
+def find_user(email, collection):
+    return collection.find_one({"email": email}, projection={"_id": 0, "password": 1, "generation_count": 1})
+
+# Function to authenticate a user from the document returned by find_user
+@instrumentation.traced("authenticate_user")
+def authenticate_user(email, password, user, collection):
+    if user is None or not verify_password(password, user.get("password")):
         return None
+    # Upgrade plain-text passwords to a hash on the first successful login
+    if not user["password"].startswith(PASSWORD_HASH_PREFIX + "$"):
+        try:
+            collection.update_one({"email": email}, {"$set": {"password": hash_password(password)}})
+        except Exception as e:
+            print(f"Erro ao atualizar a senha do usuário: {e}")
+    return user
 
 # Function to add a new user to the database
+@instrumentation.traced("mongo_add_user")
 def add_user(email, password, collection):
     try:
-        user_data = {"email": email, "password": password, "generation_count": 0}
+        user_data = {"email": email, "password": hash_password(password), "generation_count": 0}
         collection.insert_one(user_data)
-        st.success("Cadastro bem-sucedido!")
+        return True
+    except pymongo.errors.DuplicateKeyError:
+        st.error("Este email já está cadastrado.")
+        return False
     except Exception as e:
         st.error(f"Erro ao cadastrar usuário: {e}")
+        return False
+
+# Styles and paragraph formats of a template, extracted once when the template is compiled
+@dataclass
+class StyleTable:
+    styles_element: object  # <w:styles> of a new document with the template's definitions merged in
+    style_ids: dict  # paragraph style name -> styleId in styles_element
+
+# Function to map paragraph style names to their ids, so paragraphs get their style without a lookup by name
+def paragraph_style_ids(styles_element):
+    return {style.name: style.style_id for style in Styles(styles_element) if style.type == WD_STYLE_TYPE.PARAGRAPH}
+
+# Style ids of a document created without a template
+@cache_resource
+def get_default_style_ids():
+    return paragraph_style_ids(Document().styles.element)
+
+# Function to extract the style table of a template
+def build_style_table(template_doc):
+    """Merge the template's style definitions into the styles of a new document"""
+    styles_element = copy.deepcopy(Document().styles.element)
+    template_styles = template_doc.styles.element
+
+    defaults = template_styles.find(qn("w:docDefaults"))
+    if defaults is not None:
+        current = styles_element.find(qn("w:docDefaults"))
+        if current is not None:
+            styles_element.replace(current, copy.deepcopy(defaults))
+        else:
+            styles_element.insert(0, copy.deepcopy(defaults))
+
+    existing = {style.get(qn("w:styleId")): style for style in styles_element.iterchildren(qn("w:style"))}
+    numbering_path = f"{qn('w:pPr')}/{qn('w:numPr')}"
+    for style in template_styles.iterchildren(qn("w:style")):
+        style_id = style.get(qn("w:styleId"))
+        current = existing.get(style_id)
+        # List styles point at the template's numbering definitions, which are not copied,
+        # so the new document keeps its own list styles
+        numbered = style.find(numbering_path) is not None
+        if numbered and current is not None:
+            continue
+        definition = copy.deepcopy(style)
+        if numbered:
+            numbering = definition.find(numbering_path)
+            numbering.getparent().remove(numbering)
+        if current is not None:
+            styles_element.replace(current, definition)
+        else:
+            styles_element.append(definition)
+        existing[style_id] = definition
+
+    return StyleTable(styles_element, paragraph_style_ids(styles_element))
 
 # Function to apply the template's styles
-def apply_template_styles(doc, template_doc):
-    """Copy styles from template to the new document"""
-    # Copy the styles from the template
-    for style in template_doc.styles:
-        if style.name not in doc.styles:
-            doc.styles.add_style(style.name, style.type)
-    
-    # Try to match paragraph formatting
-    for i, paragraph in enumerate(doc.paragraphs):
-        try:
-            # If there's a matching paragraph in the template, copy its style
-            if i < len(template_doc.paragraphs):
-                template_paragraph = template_doc.paragraphs[i]
-                paragraph.style = template_paragraph.style
-                
-                # Copy paragraph formatting
-                paragraph_format = paragraph.paragraph_format
-                template_format = template_paragraph.paragraph_format
-                
-                # Copy attributes
-                paragraph_format.alignment = template_format.alignment
-                if template_format.line_spacing:
-                    paragraph_format.line_spacing = template_format.line_spacing
-                if template_format.space_before:
-                    paragraph_format.space_before = template_format.space_before
-                if template_format.space_after:
-                    paragraph_format.space_after = template_format.space_after
-        except Exception as e:
-            print(f"Error copying style for paragraph {i}: {e}")
-    
+@instrumentation.traced("apply_template_styles")
+def apply_template_styles(doc, style_table):
+    """Copy the template's style definitions to the new document
+
+    Called before any paragraph is added: paragraphs take their formatting from these styles.
+    """
+    # One bulk copy of the precomputed styles part instead of a lookup per style
+    doc.styles.element[:] = copy.deepcopy(style_table.styles_element)[:]
     return doc
 
-# Function to generate resume content using OpenAI
-def generate_resume(name, email, phone, industry, job_type, experiences, educations, skills, languages, linkedin):
-    prompt = f"""
-    Crie um currículo profissional em português para {name}, que está buscando uma vaga de {job_type} na indústria de {industry}.
-    
-    **Instruções Específicas:**
-    1. **Perfil:**
-       - Escreva um breve perfil profissional (2-3 frases) que destaque as habilidades e experiências mais relevantes para o cargo de {job_type}.
-       - NÃO use marcações de markdown como ** para negrito.
-
-    2. **Experiências Profissionais:**
-       - Formate as experiências no formato "cargo | empresa | período (mês ano - mês ano)"
-       - Cada responsabilidade deve começar com um verbo no passado e ser escrita em tópicos (bullet points com "-")
-       - Inclua 3-4 responsabilidades por experiência
-       - Destaque conquistas quantificáveis (ex: "Aumentou as vendas em 20%", "Reduziu custos em 15%")
-       - NÃO use marcações de markdown como ** para negrito.
-
-    3. **Educação:**
-       - Formate como "grau | mês ano | instituição, cidade, estado"
-       - NÃO use marcações de markdown como ** para negrito.
-
-    4. **Habilidades:**
-       - Liste as habilidades como tópicos separados
-       - Mantenha cada item breve e direto
-       - NÃO use marcações de markdown como ** para negrito.
-
-    5. **Idiomas:**
-       - Liste todos os idiomas fornecidos
-       - NÃO use marcações de markdown como ** para negrito.
-
-    6. **Atividades e Interesses:**
-       - Liste interesses separados por vírgulas em uma única linha
-       - NÃO use marcações de markdown como ** para negrito.
-
-    IMPORTANTE: NÃO USE NENHUMA FORMATAÇÃO MARKDOWN COMO **, ##, OU OUTROS SÍMBOLOS DE FORMATAÇÃO. O TEXTO DEVE SER SIMPLES SEM MARCAÇÕES.
-
-    **Detalhes do Candidato:**
-    - Nome: {name}
-    - Email: {email}
-    - Telefone: {phone}
-    - LinkedIn: {linkedin}
-    - Idiomas: {', '.join(languages)}
-
-    **Experiências Profissionais:**
-    {experiences}
-
-    **Educação:**
-    {educations}
-
-    **Habilidades:**
-    {', '.join(skills)}
+# Prompt size settings: token budget for the user message (the candidate's fields and the fixed
+# prompt text around them) and cap on the generated answer
+PROMPT_INPUT_TOKEN_BUDGET = int(os.getenv("PROMPT_INPUT_TOKEN_BUDGET", "1500"))
+OPENAI_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "1500"))
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+
+# Answer format: "text" (sections in plain text) or "json" (structured output validated against
+# RESUME_JSON_SCHEMA; needs a model with structured outputs, e.g. gpt-4o)
+RESUME_OUTPUT_FORMAT = os.getenv("RESUME_OUTPUT_FORMAT", "text")
+RESUME_JSON_RETRIES = int(os.getenv("RESUME_JSON_RETRIES", "1"))
+
+# Static instructions, identical for every request so the API can cache this prefix
+RESUME_SYSTEM_PROMPT = """Você é um especialista em redação de currículos profissionais. Escreva currículos em português, com conteúdo conciso e impactante, em texto simples: NÃO use markdown (**, ## ou outros símbolos de formatação) em nenhuma parte.
+
+Escreva as seções abaixo nesta ordem, cada uma começando pelo título numa linha própria:
+Perfil: um breve perfil profissional (2-3 frases) que destaque as habilidades e experiências mais relevantes para o cargo desejado.
+Experiência Profissional: cada experiência no formato "cargo | empresa | período (mês ano - mês ano)", seguida de 3-4 responsabilidades em tópicos começados por "-", cada uma com um verbo no passado. Destaque conquistas quantificáveis (ex: "Aumentou as vendas em 20%", "Reduziu custos em 15%").
+Educação: cada formação no formato "grau | mês ano | instituição, cidade, estado".
+Habilidades: as habilidades como tópicos separados, cada item breve e direto.
+Idiomas: todos os idiomas fornecidos.
+Atividades e Interesses: interesses separados por vírgulas em uma única linha."""
+
+# Static instructions of the structured (JSON) answer
+RESUME_JSON_SYSTEM_PROMPT = """Você é um especialista em redação de currículos profissionais. Escreva currículos em português, com conteúdo conciso e impactante, em texto simples: NÃO use markdown (**, ## ou outros símbolos de formatação) em nenhum campo.
+
+Responda apenas com um objeto JSON com os campos:
+profile: um breve perfil profissional (2-3 frases) que destaque as habilidades e experiências mais relevantes para o cargo desejado.
+experiences: lista de experiências com title (cargo), company (empresa), dates (período "mês ano - mês ano") e bullets (3-4 responsabilidades, cada uma com um verbo no passado, destacando conquistas quantificáveis, ex: "Aumentou as vendas em 20%").
+education: lista de formações com degree (grau), date (mês ano) e institution (instituição, cidade, estado).
+skills: lista de habilidades, cada item breve e direto.
+languages: todos os idiomas fornecidos.
+interests: lista de atividades e interesses."""
+
+# Word and punctuation pieces used to estimate token counts without a tokenizer
+TOKEN_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+# Tokenizer used to measure prompts (tiktoken, from requirements.txt). None when tiktoken is missing or
+# its encoding file cannot be downloaded; prompts are then measured with the estimate below, which
+# only approximates the budget
+@cache_resource
+def get_tokenizer():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        print(f"Tokenizador tiktoken indisponível ({e}); usando contagem aproximada de tokens.")
+        return None
+
+# Function to estimate the tokens of one word or punctuation piece (about 4 characters per token)
+def piece_tokens(piece):
+    return (len(piece) + 3) // 4
+
+# Function to count the tokens of a text
+def count_tokens(text):
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text))
+    return sum(piece_tokens(piece) for piece in TOKEN_PIECE_RE.findall(text))
+
+# Appended to a field that was cut
+TRUNCATION_MARKER = " [...]"
+
+# Function to cut a text down to a number of tokens, the truncation marker included
+def truncate_tokens(text, limit):
+    keep = max(limit - count_tokens(TRUNCATION_MARKER), 0)
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        tokens = tokenizer.encode(text)
+        if len(tokens) <= limit:
+            return text
+        return tokenizer.decode(tokens[:keep]).rstrip() + TRUNCATION_MARKER
+    used = 0
+    cut = None
+    for match in TOKEN_PIECE_RE.finditer(text):
+        used += piece_tokens(match.group())
+        if cut is None and used > keep:
+            cut = match.start()
+        if used > limit:
+            return text[:cut].rstrip() + TRUNCATION_MARKER
+    return text
+
+# Function to fit a list of fields into a token budget
+def fit_to_token_budget(fields, budget):
+    """Cut the longest fields to a common cap so the total fits; fields under the cap are kept whole"""
+    counts = [count_tokens(text) for text in fields]
+    total = sum(counts)
+    if total <= budget:
+        return fields, total
+    remaining = budget
+    cap = 0
+    order = sorted(range(len(fields)), key=counts.__getitem__)
+    for position, i in enumerate(order):
+        cap = remaining // (len(fields) - position)
+        if counts[i] > cap:
+            break
+        remaining -= counts[i]
+    print(f"Dados do candidato acima do orçamento do prompt ({total} > {budget} tokens); campos longos cortados em {cap} tokens.")
+    return [truncate_tokens(text, max(cap, 1)) if count > cap else text for text, count in zip(fields, counts)], budget
+
+# Function to write the user message of a resume request
+def resume_prompt(details, experience_lines, education_lines):
+    name, email, phone, linkedin, industry, job_type, skills_text, languages_text = details
+    newline = "\n"
+    return f"""Crie o currículo de {name}, que está buscando uma vaga de {job_type} na indústria de {industry}.
+
+Detalhes do Candidato:
+- Nome: {name}
+- Email: {email}
+- Telefone: {phone}
+- LinkedIn: {linkedin}
+- Idiomas: {languages_text}
+
+Experiências Profissionais:
+{newline.join(experience_lines)}
+
+Educação:
+{newline.join(education_lines)}
+
+Habilidades:
+{skills_text}"""
+
+# Function to build the chat messages for the resume generation
+def build_resume_messages(name, email, phone, industry, job_type, experiences, educations, skills, languages, linkedin,
+                          budget=PROMPT_INPUT_TOKEN_BUDGET, output_format=RESUME_OUTPUT_FORMAT):
+    experience_lines = [line.strip() for line in experiences.split("\n") if line.strip()]
+    education_lines = [line.strip() for line in educations.split("\n") if line.strip()]
+    skills_text = ", ".join(skill.strip() for skill in skills if skill.strip())
+    languages_text = ", ".join(language.strip() for language in languages if language.strip())
+
+    # Each experience and education is its own field, so one long entry does not crowd out the others
+    fields = [name, email, phone, linkedin, industry, job_type, skills_text, languages_text] + experience_lines + education_lines
+    # The fixed text around the fields counts against the budget too
+    field_budget = budget - count_tokens(resume_prompt([""] * 8, [""] * len(experience_lines), [""] * len(education_lines)))
+    # Tokens can merge across a field's edges and the name is written twice, so check the whole
+    # message and cut again by the excess (rarely more than once)
+    for _ in range(3):
+        fitted, _ = fit_to_token_budget(fields, max(field_budget, len(fields)))
+        prompt = resume_prompt(fitted[:8], fitted[8:8 + len(experience_lines)], fitted[8 + len(experience_lines):])
+        excess = count_tokens(prompt) - budget
+        if excess <= 0:
+            break
+        field_budget -= excess
+
+    return [
+        {"role": "system", "content": RESUME_JSON_SYSTEM_PROMPT if output_format == "json" else RESUME_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+# OpenAI rate limiting and retry settings (size them to the account's rate limit)
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "60"))
+OPENAI_BURST = int(os.getenv("OPENAI_BURST", str(OPENAI_MAX_CONCURRENCY)))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "1.0"))
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "30"))
+
+# Function to list the errors worth retrying: rate limits, timeouts, dropped connections and 5xx responses
+def retryable_openai_errors():
+    return (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+# Function to compute how long to wait before retrying a failed request
+def retry_delay(error, attempt):
+    # Honour the server's Retry-After header when it sends one
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after")), OPENAI_BACKOFF_MAX)
+        except (TypeError, ValueError):
+            pass
+    # Exponential backoff with jitter so that throttled requests do not retry in lockstep
+    delay = min(OPENAI_BACKOFF_MAX, OPENAI_BACKOFF_BASE * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+# Token bucket that spaces requests out to the configured rate
+class TokenBucket:
+    def __init__(self, rate_per_minute, capacity):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# Latency, queue wait and retry counters of the generation requests
+class GenerationMetrics:
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.in_flight = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = deque(maxlen=window)
+        self.queue_waits = deque(maxlen=window)
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, latency, queue_wait, failed=False, usage=None):
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+            if failed:
+                self.errors += 1
+            if usage:
+                self.prompt_tokens += usage.get("prompt_tokens", 0)
+                self.completion_tokens += usage.get("completion_tokens", 0)
+            self.latencies.append(latency)
+            self.queue_waits.append(queue_wait)
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self):
+        def summary(values):
+            if not values:
+                return 0.0, 0.0
+            ordered = sorted(values)
+            return sum(ordered) / len(ordered) * 1000, ordered[int(0.95 * (len(ordered) - 1))] * 1000
+
+        with self._lock:
+            avg_latency, p95_latency = summary(self.latencies)
+            avg_wait, p95_wait = summary(self.queue_waits)
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "retries": self.retries,
+                "in_flight": self.in_flight,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "avg_latency_ms": avg_latency,
+                "p95_latency_ms": p95_latency,
+                "avg_queue_wait_ms": avg_wait,
+                "p95_queue_wait_ms": p95_wait,
+            }
+
+# asyncio generation layer shared by every session of the process
+class GenerationService:
+    """Runs AsyncOpenAI calls on a background event loop behind a concurrency limit and a rate limit.
+
+    Sync callers (Streamlit script threads) use run() and iterate() to wait for the results.
     """
-    
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "Você é um especialista em redação de currículos profissionais. Crie currículos com conteúdo conciso e impactante usando texto simples sem formatação markdown."},
-            {"role": "user", "content": prompt}
-        ]
-    )
-    return response.choices[0].message.content
+
+    def __init__(self, api_key=None, max_concurrency=OPENAI_MAX_CONCURRENCY, requests_per_minute=OPENAI_REQUESTS_PER_MINUTE,
+                 burst=OPENAI_BURST, timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES, max_tokens=OPENAI_MAX_TOKENS):
+        self.max_retries = max_retries
+        self.max_tokens = max_tokens
+        # Retries are handled here, with the limiter, instead of inside the client
+        self.client = openai.AsyncOpenAI(api_key=api_key or OPENAI_API_KEY, timeout=timeout, max_retries=0)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(requests_per_minute, burst)
+        self.metrics = GenerationMetrics()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="openai-generation", daemon=True)
+        self._thread.start()
+
+    async def _request(self, call, timing):
+        """Acquire a slot and a token, then run call(); retries release the slot while backing off"""
+        for attempt in range(self.max_retries + 1):
+            wait_start = time.perf_counter()
+            async with self.semaphore:
+                await self.bucket.acquire()
+                timing["queue_wait"] += time.perf_counter() - wait_start
+                try:
+                    return await call()
+                except retryable_openai_errors() as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = retry_delay(e, attempt)
+                    print(f"Erro temporário da OpenAI ({type(e).__name__}), nova tentativa em {delay:.1f}s")
+            self.metrics.retried()
+            await asyncio.sleep(delay)
+
+    def _log_request(self, usage, latency):
+        print(f"OpenAI: {usage.get('prompt_tokens', '?')} tokens de prompt, "
+              f"{usage.get('completion_tokens', '?')} tokens de resposta, {latency:.1f}s")
+
+    async def complete(self, messages, usage=None, **kwargs):
+        """Return the completion text; pass a dict as usage to receive the token counts"""
+        kwargs.setdefault("max_tokens", self.max_tokens)
+
+        async def call():
+            return await self.client.chat.completions.create(model=OPENAI_MODEL, messages=messages, **kwargs)
+
+        start = time.perf_counter()
+        timing = {"queue_wait": 0.0}
+        usage = {} if usage is None else usage
+        failed = True
+        self.metrics.started()
+        try:
+            response = await self._request(call, timing)
+            if response.usage is not None:
+                usage["prompt_tokens"] = response.usage.prompt_tokens
+                usage["completion_tokens"] = response.usage.completion_tokens
+            failed = False
+        finally:
+            self.metrics.finished(time.perf_counter() - start, timing["queue_wait"], failed, usage)
+        self._log_request(usage, time.perf_counter() - start)
+        return response.choices[0].message.content
+
+    async def stream(self, messages, usage=None, **kwargs):
+        """Yield the text deltas; the request is retried only until the first delta arrives"""
+        kwargs.setdefault("max_tokens", self.max_tokens)
+
+        async def call():
+            # include_usage adds a last chunk, without choices, holding the token counts
+            stream = await self.client.chat.completions.create(
+                model=OPENAI_MODEL, messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs
+            )
+            iterator = stream.__aiter__()
+            return await iterator.__anext__(), iterator
+
+        start = time.perf_counter()
+        timing = {"queue_wait": 0.0}
+        usage = {} if usage is None else usage
+        failed = True
+        self.metrics.started()
+        try:
+            chunk, iterator = await self._request(call, timing)
+            while True:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if getattr(chunk, "usage", None) is not None:
+                    usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                    usage["completion_tokens"] = chunk.usage.completion_tokens
+                try:
+                    chunk = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+            failed = False
+        finally:
+            self.metrics.finished(time.perf_counter() - start, timing["queue_wait"], failed, usage)
+        self._log_request(usage, time.perf_counter() - start)
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def iterate(self, agen):
+        """Consume an async generator from a sync thread"""
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(item)
+            except Exception as e:
+                items.put(e)
+            finally:
+                items.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        try:
+            while True:
+                item = items.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Stop the request if the caller goes away (e.g. the Streamlit session reruns)
+            future.cancel()
+
+# Generation service shared by every session of the process
+@cache_resource
+def get_generation_service():
+    service = GenerationService()
+    instrumentation.registry.register_collector("openai", service.metrics.snapshot)
+    return service
+
+# Function to build the prompt and record its size
+def build_traced_messages(*generation_args):
+    with instrumentation.stage("prompt_build"):
+        messages = build_resume_messages(*generation_args)
+    instrumentation.count("payload_bytes", sum(len(message["content"].encode("utf-8")) for message in messages), kind="prompt")
+    return messages
+
+# Function to record the token counts and output size of a completion
+def record_completion(usage, content):
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if kind in usage:
+            instrumentation.count("openai_tokens", usage[kind], kind=kind.split("_")[0])
+    instrumentation.count("payload_bytes", len(content.encode("utf-8")), kind="completion")
+
+# Function to generate resume content using OpenAI
+def generate_resume(name, email, phone, industry, job_type, experiences, educations, skills, languages, linkedin, service=None):
+    service = service or get_generation_service()
+    messages = build_traced_messages(name, email, phone, industry, job_type, experiences, educations, skills, languages, linkedin)
+    usage = {}
+    with instrumentation.stage("openai_completion"):
+        content = service.run(service.complete(messages, usage=usage))
+    record_completion(usage, content)
+    return content
+
+# Function to generate resume content using OpenAI, yielding the text as it arrives
+def generate_resume_stream(name, email, phone, industry, job_type, experiences, educations, skills, languages, linkedin):
+    service = get_generation_service()
+    messages = build_traced_messages(name, email, phone, industry, job_type, experiences, educations, skills, languages, linkedin)
+    usage = {}
+    chunks = []
+    with instrumentation.stage("openai_stream"):
+        for delta in service.iterate(service.stream(messages, usage=usage)):
+            chunks.append(delta)
+            yield delta
+    record_completion(usage, "".join(chunks))
+
+# Function to request a structured resume, asking the model to fix answers that fail validation
+async def complete_resume_json(service, messages, usage=None):
+    """Return (ParsedResume, normalized JSON text)"""
+    usage = {} if usage is None else usage
+    for attempt in range(RESUME_JSON_RETRIES + 1):
+        content = await service.complete(messages, usage=usage, response_format=RESUME_RESPONSE_FORMAT)
+        try:
+            # A refusal comes back without content
+            if not (content or "").strip():
+                raise ValueError("resposta vazia")
+            resume = resume_from_json(content)
+            return resume, resume_to_json(resume)
+        except ValueError as e:
+            if attempt == RESUME_JSON_RETRIES:
+                raise ValueError(f"A resposta estruturada da OpenAI é inválida: {e}") from e
+            print(f"Resposta JSON inválida ({e}); pedindo correção ao modelo.")
+            previous = [{"role": "assistant", "content": content}] if content else []
+            messages = messages + previous + [
+                {"role": "user", "content": f"A resposta anterior não segue o formato pedido ({e}). Responda novamente apenas com o objeto JSON corrigido."},
+            ]
+
+# Function to generate the resume as validated structured output
+def generate_resume_json(name, email, phone, industry, job_type, experiences, educations, skills, languages, linkedin, service=None):
+    """Return (ParsedResume, normalized JSON text)"""
+    service = service or get_generation_service()
+    messages = build_traced_messages(name, email, phone, industry, job_type, experiences, educations, skills, languages, linkedin)
+    usage = {}
+    with instrumentation.stage("openai_completion"):
+        resume, content = service.run(complete_resume_json(service, messages, usage))
+    record_completion(usage, content)
+    return resume, content
+
+# Bump whenever build_resume_messages changes, so cached responses from the old prompt are not reused
+PROMPT_VERSION = "3"
+
+# Generated resume cache settings
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # memory, disk, mongodb or none
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "responses"))
+RESPONSE_CACHE_COLLECTION = "resume_cache"
+
+# Function to normalize one form input before hashing
+def normalize_cache_input(value):
+    if isinstance(value, (list, tuple)):
+        return [normalize_cache_input(item) for item in value if str(item).strip()]
+    return " ".join(str(value or "").split())
+
+# Function to compute the cache key of a generation from its inputs
+def resume_cache_key(name, email, phone, industry, job_type, experiences, educations, skills, languages, linkedin):
+    payload = {
+        "model": OPENAI_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "output_format": RESUME_OUTPUT_FORMAT,
+        "inputs": [normalize_cache_input(value) for value in (
+            name, email, phone, industry, job_type, experiences, educations, skills, languages, linkedin
+        )],
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+# In-process LRU backend
+class MemoryResponseCache:
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+# On-disk backend, one file per key, shared by every process on the machine
+class DiskResponseCache:
+    def __init__(self, directory=RESPONSE_CACHE_DIR, ttl=RESPONSE_CACHE_TTL):
+        self.directory = directory
+        self.ttl = ttl
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.txt")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl < time.time():
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(value)
+        os.replace(tmp_path, path)
+
+# MongoDB backend, expired entries are removed by a TTL index
+class MongoResponseCache:
+    def __init__(self, collection, ttl=RESPONSE_CACHE_TTL):
+        self.collection = collection
+        self.ttl = ttl
+        self.collection.create_index("created_at", expireAfterSeconds=ttl)
+
+    def get(self, key):
+        entry = self.collection.find_one({"_id": key}, {"content": 1, "created_at": 1})
+        if entry is None:
+            return None
+        # The TTL monitor only runs once a minute, so check the age as well
+        created_at = entry["created_at"].replace(tzinfo=timezone.utc)
+        if created_at + timedelta(seconds=self.ttl) < datetime.now(timezone.utc):
+            return None
+        return entry["content"]
+
+    def set(self, key, value):
+        self.collection.replace_one(
+            {"_id": key},
+            {"content": value, "created_at": datetime.now(timezone.utc)},
+            upsert=True
+        )
+
+# Cache of generated resume text in front of the OpenAI call
+class ResponseCache:
+    """Wraps a backend and counts hits and misses; backend errors count as misses"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key):
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Erro ao ler o cache de currículos: {e}")
+            value = None
+            with self._lock:
+                self.errors += 1
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if self.backend is None or not value:
+            return
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            print(f"Erro ao gravar no cache de currículos: {e}")
+            with self._lock:
+                self.errors += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__ if self.backend is not None else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+# Function to create the response cache backend selected in the configuration
+def create_response_cache_backend(kind=RESPONSE_CACHE_BACKEND):
+    if kind == "memory":
+        return MemoryResponseCache()
+    if kind == "disk":
+        return DiskResponseCache()
+    if kind == "mongodb":
+        return MongoResponseCache(get_mongo_client()[DB_NAME][RESPONSE_CACHE_COLLECTION])
+    return None
+
+# Response cache shared by every session of the process
+@cache_resource
+def get_response_cache():
+    cache = ResponseCache(create_response_cache_backend())
+    instrumentation.registry.register_collector("response_cache", cache.stats)
+    return cache
+
+# How long the template list is reused before the directory is read again (seconds)
+TEMPLATE_LIST_TTL = int(os.getenv("TEMPLATE_LIST_TTL", "60"))
+
+# Function to read the templates directory, cached so reruns do not touch the disk
+@cache_data(ttl=TEMPLATE_LIST_TTL)
+def scan_templates(templates_dir):
+    """Return (template file names, whether the directory had to be created)"""
+    created = not os.path.exists(templates_dir)
+    if created:
+        os.makedirs(templates_dir)
+    return [f for f in os.listdir(templates_dir) if f.endswith(".docx")], created
 
 # Function to list available templates
 def list_templates():
     templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")  # Use absolute path
-    if not os.path.exists(templates_dir):
-        os.makedirs(templates_dir)
+    templates, created = scan_templates(templates_dir)
+    if created:
         st.warning(f"Diretório 'templates' criado em: {os.path.abspath(templates_dir)}")
-    templates = [f for f in os.listdir(templates_dir) if f.endswith(".docx")]
     if not templates:
         st.warning("Nenhum template encontrado na pasta 'templates'. Adicione templates .docx para continuar.")
     return templates, templates_dir
@@ -172,423 +980,1141 @@ def load_template(template_name, templates_dir):
         st.error(f"Erro ao carregar o template: {e}")
         return None
 
-# Function to format template2
-def template2(doc, resume_content, name, email, phone, linkedin):
-    # Clear the document
-    for paragraph in doc.paragraphs[:]:
-        p = paragraph._element
-        p.getparent().remove(p)
-        paragraph._p = paragraph._element = None
-    
-    # Add contact info at top
-    header = doc.add_paragraph()
-    header.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    header_run = header.add_run(name)
-    header_run.bold = True
-    header_run.font.size = Pt(16)
-    
-    contact = doc.add_paragraph()
-    contact.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    contact.add_run(f"{phone} | {email}")
-    if linkedin:
-        contact.add_run(f" | {linkedin}")
-    
-    # Add sections with proper ATS formatting
+# Resume sections in the order the model writes them, with the keyword that starts each one
+RESUME_SECTIONS = [
+    ("PERFIL", "Perfil"),
+    ("EXPERIÊNCIA", "Experiência Profissional"),
+    ("EDUCAÇÃO", "Educação"),
+    ("HABILIDADES E COMPETÊNCIAS", "Habilidades"),
+    ("IDIOMAS", "Idiomas"),
+    ("ATIVIDADES E INTERESSES", "Atividades e Interesses")
+]
+
+# Placeholders used in the .docx templates to mark where each section goes
+TEMPLATE_PLACEHOLDERS = {
+    "{PROFILE}": "Perfil",
+    "{EXPERIENCE}": "Experiência Profissional",
+    "{EDUCATION}": "Educação",
+    "{SKILLS}": "Habilidades",
+    "{LANGUAGES}": "Idiomas",
+    "{INTERESTS}": "Atividades e Interesses",
+}
+
+# Header phrases that open each section of the generated resume
+SECTION_HEADER_PHRASES = [
+    r"perfil(?: profissional)?", r"resumo(?: profissional)?",
+    r"experi[eê]ncias?(?: profissiona(?:l|is))?",
+    r"educa[cç][aã]o", r"forma[cç][aã]o(?: acad[eéê]mica)?",
+    r"habilidades(?: e compet[eê]ncias| t[eé]cnicas)?", r"compet[eê]ncias(?: t[eé]cnicas)?",
+    r"idiomas", r"l[ií]nguas",
+    r"a(?:c)?tividades(?: e interesses)?", r"interesses",
+]
+
+# A header is one of those phrases as the whole line, after optional markdown (#, **) and
+# numbering ("2." or "2)"), optionally followed by a colon and the section's first line
+SECTION_HEADER_RE = re.compile(
+    r"^[\s#*]*(?:\d+[.)]\s*)?(?P<keyword>" + "|".join(SECTION_HEADER_PHRASES) + r")[\s*]*(?::[\s*]*(?P<inline>.*))?$",
+    re.IGNORECASE,
+)
+
+# Keyword prefix of a section header -> section key
+SECTION_HEADER_KEYS = [
+    ("perfil", "Perfil"),
+    ("resumo", "Perfil"),
+    ("experi", "Experiência Profissional"),
+    ("educa", "Educação"),
+    ("forma", "Educação"),
+    ("habilidades", "Habilidades"),
+    ("compet", "Habilidades"),
+    ("idiomas", "Idiomas"),
+    ("língua", "Idiomas"),
+    ("lingua", "Idiomas"),
+    ("atividades", "Atividades e Interesses"),
+    ("actividades", "Atividades e Interesses"),
+    ("interesses", "Atividades e Interesses"),
+]
+
+# Bullet markers the model uses in lists
+BULLET_MARKERS = ("-", "•", "*", "–")
+
+# Commas that separate items, ignoring the ones inside parentheses
+ITEM_SEPARATOR_RE = re.compile(r",\s*(?![^()]*\))")
+
+# One professional experience of the parsed resume
+@dataclass
+class Experience:
+    title: str
+    company: str = ""
+    dates: str = ""
+    bullets: list = field(default_factory=list)
+    details: list = field(default_factory=list)
+    start: int = 0
+    end: int = 0
+
+    def heading(self):
+        return " | ".join(part for part in (self.title, self.company, self.dates) if part)
+
+# One education entry of the parsed resume
+@dataclass
+class Education:
+    degree: str
+    date: str = ""
+    institution: str = ""
+    details: list = field(default_factory=list)
+    start: int = 0
+    end: int = 0
+
+    def heading(self):
+        return " | ".join(part for part in (self.degree, self.date, self.institution) if part)
+
+# Typed structure of a generated resume
+@dataclass
+class ParsedResume:
+    profile: list = field(default_factory=list)
+    experiences: list = field(default_factory=list)
+    education: list = field(default_factory=list)
+    skills: list = field(default_factory=list)
+    languages: list = field(default_factory=list)
+    interests: list = field(default_factory=list)
+    # Section key -> (start, end) character offsets of the section body
+    spans: dict = field(default_factory=dict)
+
+    def has_section(self, key):
+        return key in self.spans
+
+    def to_dict(self):
+        """Plain dict form, safe to pickle across processes or store as JSON"""
+        data = asdict(self)
+        data["spans"] = {key: list(span) for key, span in self.spans.items()}
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            profile=list(data.get("profile", [])),
+            experiences=[Experience(**experience) for experience in data.get("experiences", [])],
+            education=[Education(**education) for education in data.get("education", [])],
+            skills=list(data.get("skills", [])),
+            languages=list(data.get("languages", [])),
+            interests=list(data.get("interests", [])),
+            spans={key: tuple(span) for key, span in data.get("spans", {}).items()},
+        )
+
+# Function to clean markdown syntax
+def clean_markdown(text):
+    # Remove bold markdown
+    text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
+    # Remove other markdown formatting as needed
+    return text
+
+# Function to map a header line to its section key
+def match_section_header(line):
+    match = SECTION_HEADER_RE.match(line)
+    if match is None:
+        return None, None
+    keyword = match.group("keyword").lower()
+    key = next(key for prefix, key in SECTION_HEADER_KEYS if keyword.startswith(prefix))
+    return key, match
+
+# Function to strip a bullet marker, returning whether the line had one
+def strip_bullet(line):
+    if line[0] in BULLET_MARKERS and not line.startswith("**"):
+        return True, line[1:].strip()
+    return False, line
+
+# Function to split a list line into items
+def split_items(line):
+    return [item.strip() for item in ITEM_SEPARATOR_RE.split(line) if item.strip()]
+
+# Function to parse the generated resume text in a single pass
+def parse_resume(resume_content):
+    """Walk the text line by line, tracking offsets instead of slicing out each section"""
+    resume = ParsedResume()
+    preamble = []
+    key = None
+    section_start = 0
+    first_header = None
+    after_blank = True
+    length = len(resume_content)
+    pos = 0
+
+    while pos <= length:
+        newline = resume_content.find("\n", pos)
+        line_end = length if newline == -1 else newline
+        raw_line = resume_content[pos:line_end]
+        line = raw_line.strip()
+        line_start = pos
+        pos = line_end + 1
+
+        if not line:
+            after_blank = True
+            continue
+
+        # Bullet lines can never be section headers, so skip the regex for them
+        is_bullet, text = strip_bullet(line)
+        header_key, header = (None, None) if is_bullet else match_section_header(line)
+        if header_key is not None:
+            if key is not None:
+                resume.spans[key] = (section_start, line_start)
+            elif first_header is None:
+                first_header = line_start
+            key = header_key
+            after_blank = True
+            inline = (header.group("inline") or "").strip()
+            if not inline:
+                section_start = min(line_end + 1, length)
+                continue
+            # Content on the header line itself, e.g. "Idiomas: Português, Inglês"
+            section_start = line_start + len(raw_line) - len(raw_line.lstrip()) + header.start("inline")
+            is_bullet, text = strip_bullet(inline)
+
+        if "**" in text:
+            text = clean_markdown(text).strip()
+            if text.startswith("**") or text.endswith("**"):
+                text = text.strip("*").strip()
+            if not text:
+                continue
+
+        if key is None:
+            preamble.append(text)
+        elif key == "Perfil":
+            resume.profile.append(text)
+        elif key == "Experiência Profissional":
+            parts = [part.strip() for part in text.split("|")] if "|" in text else [text]
+            if len(parts) >= 3 or (not is_bullet and (after_blank or not resume.experiences)):
+                resume.experiences.append(Experience(*parts[:3], start=line_start))
+            else:
+                if not resume.experiences:
+                    resume.experiences.append(Experience("", start=line_start))
+                current = resume.experiences[-1]
+                (current.bullets if is_bullet else current.details).append(text)
+            resume.experiences[-1].end = line_end
+        elif key == "Educação":
+            parts = [part.strip() for part in text.split("|")] if "|" in text else [text]
+            if len(parts) >= 2 or after_blank or not resume.education or is_bullet:
+                resume.education.append(Education(*parts[:3], start=line_start))
+            else:
+                resume.education[-1].details.append(text)
+            resume.education[-1].end = line_end
+        elif key == "Habilidades":
+            resume.skills.extend([text] if is_bullet else split_items(text))
+        elif key == "Idiomas":
+            resume.languages.extend([text] if is_bullet else split_items(text))
+        elif key == "Atividades e Interesses":
+            resume.interests.extend(split_items(text))
+
+        after_blank = False
+
+    if key is not None:
+        resume.spans[key] = (section_start, length)
+    # Without a profile header, whatever came before the first section is the profile
+    if "Perfil" not in resume.spans and preamble:
+        resume.profile = preamble
+        resume.spans["Perfil"] = (0, length if first_header is None else first_header)
+    return resume
+
+# Function to format one parsed section as plain text
+def format_section_text(resume, key):
+    if key == "Perfil":
+        return "\n".join(resume.profile)
+    if key == "Experiência Profissional":
+        entries = []
+        for experience in resume.experiences:
+            lines = [experience.heading()] + experience.details + [f"- {bullet}" for bullet in experience.bullets]
+            entries.append("\n".join(line for line in lines if line))
+        return "\n\n".join(entries)
+    if key == "Educação":
+        return "\n".join("\n".join([education.heading()] + education.details) for education in resume.education)
+    if key == "Habilidades":
+        return "\n".join(f"- {skill}" for skill in resume.skills)
+    if key == "Idiomas":
+        return "\n".join(resume.languages)
+    if key == "Atividades e Interesses":
+        return ", ".join(resume.interests)
+    return ""
+
+# Function to write a parsed resume back as plain text, with one header per section
+def resume_to_text(resume):
+    return "\n\n".join(f"{key}\n{format_section_text(resume, key)}" for _, key in RESUME_SECTIONS)
+
+# JSON schema of the structured answer (structured outputs require every field and no extra ones)
+RESUME_JSON_SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": ["profile", "experiences", "education", "skills", "languages", "interests"],
+    "properties": {
+        "profile": {"type": "string"},
+        "experiences": {"type": "array", "items": {
+            "type": "object",
+            "additionalProperties": False,
+            "required": ["title", "company", "dates", "bullets"],
+            "properties": {
+                "title": {"type": "string"},
+                "company": {"type": "string"},
+                "dates": {"type": "string"},
+                "bullets": {"type": "array", "items": {"type": "string"}},
+            },
+        }},
+        "education": {"type": "array", "items": {
+            "type": "object",
+            "additionalProperties": False,
+            "required": ["degree", "date", "institution"],
+            "properties": {
+                "degree": {"type": "string"},
+                "date": {"type": "string"},
+                "institution": {"type": "string"},
+            },
+        }},
+        "skills": {"type": "array", "items": {"type": "string"}},
+        "languages": {"type": "array", "items": {"type": "string"}},
+        "interests": {"type": "array", "items": {"type": "string"}},
+    },
+}
+
+# Request options asking the model for an answer that matches RESUME_JSON_SCHEMA
+RESUME_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "resume", "strict": True, "schema": RESUME_JSON_SCHEMA},
+}
+
+# Function to read a text field of the structured answer
+def json_text(value, path):
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if not isinstance(value, str):
+        raise ValueError(f"{path} deve ser um texto")
+    return clean_markdown(value).strip()
+
+# Function to read a list of texts; a comma-separated text is accepted too
+def json_list(value, path):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [clean_markdown(item) for item in split_items(value)]
+    if not isinstance(value, list):
+        raise ValueError(f"{path} deve ser uma lista")
+    items = (json_text(item, f"{path}[{i}]") for i, item in enumerate(value))
+    return [item for item in items if item]
+
+# Function to read a list of objects of the structured answer
+def json_objects(value, path):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ValueError(f"{path} deve ser uma lista")
+    for i, item in enumerate(value):
+        if not isinstance(item, dict):
+            raise ValueError(f"{path}[{i}] deve ser um objeto")
+    return value
+
+# Function to validate a structured answer and build the resume the renderers use
+def resume_from_json(content):
+    """Raise ValueError with the reason when the answer cannot be used"""
+    text = content.strip()
+    # Repair the usual slips: code fences or text around the object
+    if not text.startswith("{"):
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            raise ValueError("a resposta não contém um objeto JSON")
+        text = text[start:end + 1]
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON inválido: {e}") from e
+    if not isinstance(data, dict):
+        raise ValueError("a resposta deve ser um objeto JSON")
+
+    profile = data.get("profile")
+    resume = ParsedResume(
+        profile=json_list(profile, "profile") if isinstance(profile, list)
+        else [line.strip() for line in json_text(profile, "profile").split("\n") if line.strip()],
+        experiences=[
+            Experience(
+                title=json_text(item.get("title"), f"experiences[{i}].title"),
+                company=json_text(item.get("company"), f"experiences[{i}].company"),
+                dates=json_text(item.get("dates"), f"experiences[{i}].dates"),
+                bullets=json_list(item.get("bullets"), f"experiences[{i}].bullets"),
+            )
+            for i, item in enumerate(json_objects(data.get("experiences"), "experiences"))
+        ],
+        education=[
+            Education(
+                degree=json_text(item.get("degree"), f"education[{i}].degree"),
+                date=json_text(item.get("date"), f"education[{i}].date"),
+                institution=json_text(item.get("institution"), f"education[{i}].institution"),
+            )
+            for i, item in enumerate(json_objects(data.get("education"), "education"))
+        ],
+        skills=json_list(data.get("skills"), "skills"),
+        languages=json_list(data.get("languages"), "languages"),
+        interests=json_list(data.get("interests"), "interests"),
+    )
+    if not resume.profile and not resume.experiences:
+        raise ValueError("perfil e experiências estão vazios")
+    # Every section came from its own field, so all of them count as present
+    resume.spans = {key: (0, 0) for _, key in RESUME_SECTIONS}
+    return resume
+
+# Function to write a parsed resume as the JSON stored in the response cache
+def resume_to_json(resume):
+    return json.dumps({
+        "profile": "\n".join(resume.profile),
+        "experiences": [
+            {"title": item.title, "company": item.company, "dates": item.dates, "bullets": item.bullets}
+            for item in resume.experiences
+        ],
+        "education": [
+            {"degree": item.degree, "date": item.date, "institution": item.institution}
+            for item in resume.education
+        ],
+        "skills": resume.skills,
+        "languages": resume.languages,
+        "interests": resume.interests,
+    }, ensure_ascii=False)
+
+# Function to parse a generated resume stored either as structured JSON or as plain text
+def load_resume(content):
+    if content.lstrip().startswith("{"):
+        try:
+            return resume_from_json(content)
+        except ValueError:
+            pass
+    return parse_resume(content)
+
+# Function to get the text shown on screen for a generated resume
+def resume_display_text(content, resume):
+    return resume_to_text(resume) if content.lstrip().startswith("{") else content
+
+# Function to show the sections recognised so far in the generated resume
+def show_resume_preview(resume):
+    for title, key in RESUME_SECTIONS:
+        if resume.has_section(key):
+            st.markdown(f"**{title}**")
+            text = format_section_text(resume, key)
+            if text:
+                st.text(text)
+
+# Paragraph style and formatting captured from a template paragraph
+@dataclass
+class ParagraphSpec:
+    style: str = None
+    alignment: object = None
+    line_spacing: object = None
+    space_before: object = None
+    space_after: object = None
+    # Style name -> id table of the documents this spec renders into, bound when the plan is compiled
+    style_ids: dict = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_paragraph(cls, paragraph):
+        paragraph_format = paragraph.paragraph_format
+        return cls(
+            style=paragraph.style.name if paragraph.style is not None else None,
+            alignment=paragraph_format.alignment,
+            line_spacing=paragraph_format.line_spacing,
+            space_before=paragraph_format.space_before,
+            space_after=paragraph_format.space_after,
+        )
+
+    def add_to(self, doc, text=None, style=None):
+        paragraph = doc.add_paragraph(text)
+        style = style or self.style
+        if style:
+            style_id = self.style_ids.get(style) if self.style_ids else None
+            if style_id is not None:
+                paragraph._p.style = style_id
+            else:
+                try:
+                    paragraph.style = style
+                except KeyError:
+                    pass
+        paragraph_format = paragraph.paragraph_format
+        if self.alignment is not None:
+            paragraph_format.alignment = self.alignment
+        if self.line_spacing:
+            paragraph_format.line_spacing = self.line_spacing
+        if self.space_before:
+            paragraph_format.space_before = self.space_before
+        if self.space_after:
+            paragraph_format.space_after = self.space_after
+        return paragraph
+
+# One section of a compiled template: which content goes there and how it looks
+@dataclass
+class SectionPlan:
+    key: str
+    title: str
+    heading: ParagraphSpec
+    body: ParagraphSpec
+
+# Compiled render plan for a template, built once and reused for every resume
+@dataclass
+class TemplatePlan:
+    name: str
+    header: ParagraphSpec
+    contact: ParagraphSpec
+    sections: list
+    template_doc: object = None
+    style_table: StyleTable = None
+    # Document with the parts every resume shares, built on first use and cloned per render
+    skeleton: object = field(default=None, repr=False, compare=False)
+    # Raw zip members and fixed XML of the skeleton, used by the streaming writer (docx_writer)
+    package_image: object = field(default=None, repr=False, compare=False)
+
+    def bind_style_ids(self, style_ids):
+        for spec in [self.header, self.contact] + [part for section in self.sections for part in (section.heading, section.body)]:
+            spec.style_ids = style_ids
+
+    def get_skeleton(self):
+        # Two threads may build it at the same time; both results are equivalent
+        if self.skeleton is None:
+            self.skeleton = build_skeleton(self)
+        return self.skeleton
+
+# Function to build the plan used when a template has no section placeholders
+def default_template_plan(name="default", template_doc=None):
     sections = [
-        ("PERFIL", "Perfil"),
-        ("EXPERIÊNCIA", "Experiência Profissional"),
-        ("EDUCAÇÃO", "Educação"),
-        ("HABILIDADES E COMPETÊNCIAS", "Habilidades"),
-        ("IDIOMAS", "Idiomas"),
-        ("ATIVIDADES E INTERESSES", "Atividades e Interesses")
+        SectionPlan(key, title, ParagraphSpec(style="Heading 1"), ParagraphSpec())
+        for title, key in RESUME_SECTIONS
     ]
-    
-    for section_title, content_key in sections:
-        # Add section header
-        section_header = doc.add_paragraph()
-        section_header.style = 'Heading 1'
-        section_run = section_header.add_run(section_title)
+    plan = TemplatePlan(
+        name=name,
+        header=ParagraphSpec(alignment=WD_ALIGN_PARAGRAPH.CENTER),
+        contact=ParagraphSpec(alignment=WD_ALIGN_PARAGRAPH.CENTER),
+        sections=sections,
+        template_doc=template_doc,
+    )
+    plan.bind_style_ids(get_default_style_ids())
+    return plan
+
+# Plan used when the selected template is missing, shared so its skeleton is built once
+@cache_resource
+def get_default_template_plan():
+    return default_template_plan()
+
+# Function to compile a parsed template into a render plan
+def compile_template_plan(template_doc, name):
+    """Read the section order, headings and paragraph formats from the template placeholders"""
+    plan = default_template_plan(name, template_doc)
+    sections = []
+    previous = None
+    for paragraph in template_doc.paragraphs:
+        text = paragraph.text
+        if "{NAME}" in text:
+            plan.header = ParagraphSpec.from_paragraph(paragraph)
+            if plan.header.alignment is None:
+                plan.header.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        elif "{EMAIL}" in text or "{PHONE}" in text:
+            plan.contact = ParagraphSpec.from_paragraph(paragraph)
+            if plan.contact.alignment is None:
+                plan.contact.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        else:
+            key = next((key for placeholder, key in TEMPLATE_PLACEHOLDERS.items() if placeholder in text), None)
+            if key is not None:
+                if previous is not None and previous.text.strip():
+                    title = previous.text.strip().upper()
+                    heading = ParagraphSpec.from_paragraph(previous)
+                else:
+                    title = next(title for title, section_key in RESUME_SECTIONS if section_key == key)
+                    heading = ParagraphSpec(style="Heading 1")
+                sections.append(SectionPlan(key, title, heading, ParagraphSpec.from_paragraph(paragraph)))
+        previous = paragraph
+
+    if sections:
+        plan.sections = sections
+    plan.style_table = build_style_table(template_doc)
+    plan.bind_style_ids(plan.style_table.style_ids)
+    plan.get_skeleton()
+    if DOCX_WRITER == "stream":
+        docx_writer.get_package_image(plan)
+    return plan
+
+# Function to write the profile paragraphs
+def render_profile(doc, body, resume):
+    for paragraph in resume.profile:
+        body.add_to(doc, paragraph)
+
+# Function to write the experiences with their responsibilities as bullet points
+def render_experiences(doc, body, resume):
+    for experience in resume.experiences:
+        heading = experience.heading()
+        if heading:
+            body.add_to(doc).add_run(heading.upper()).bold = True
+        for detail in experience.details:
+            body.add_to(doc, detail)
+        for bullet in experience.bullets:
+            body.add_to(doc, bullet, style='List Bullet')
+
+# Function to write the education entries
+def render_education(doc, body, resume):
+    for education in resume.education:
+        body.add_to(doc).add_run(education.heading().upper()).bold = True
+        for detail in education.details:
+            body.add_to(doc, detail)
+
+# Function to write the skills as bullet points
+def render_skills(doc, body, resume):
+    for skill in resume.skills:
+        body.add_to(doc, skill, style='List Bullet')
+
+# Function to write one language per line
+def render_languages(doc, body, resume):
+    for language in resume.languages:
+        body.add_to(doc, language)
+
+# Function to write the interests on a single line
+def render_interests(doc, body, resume):
+    if resume.interests:
+        body.add_to(doc, ", ".join(resume.interests))
+
+# Section key -> function that writes its content
+SECTION_RENDERERS = {
+    "Perfil": render_profile,
+    "Experiência Profissional": render_experiences,
+    "Educação": render_education,
+    "Habilidades": render_skills,
+    "Idiomas": render_languages,
+    "Atividades e Interesses": render_interests,
+}
+
+# Function to pre-render the parts of a plan that are the same for every resume
+def build_skeleton(plan):
+    """Return a document with the template styles, an empty header and contact line and every section heading"""
+    doc = Document()
+
+    # Bring the template styles in before any paragraph references them
+    if plan.style_table is not None:
+        doc = apply_template_styles(doc, plan.style_table)
+
+    # The name goes into this run when a resume is rendered
+    header_run = plan.header.add_to(doc).add_run()
+    header_run.bold = True
+    header_run.font.size = Pt(16)
+    plan.contact.add_to(doc)
+
+    for section in plan.sections:
+        section_run = section.heading.add_to(doc).add_run(section.title)
         section_run.bold = True
         section_run.font.all_caps = True
-        
-        # Get content for this section
-        content = ""
-        if content_key == "Perfil":
-            if "Experiência Profissional" in resume_content:
-                content = resume_content.split("Experiência Profissional")[0].strip()
-            else:
-                content = resume_content
-        elif content_key == "Experiência Profissional":
-            if content_key in resume_content and "Educação" in resume_content:
-                content = resume_content.split(content_key)[1].split("Educação")[0].strip()
-        elif content_key == "Educação":
-            if content_key in resume_content and "Habilidades" in resume_content:
-                content = resume_content.split(content_key)[1].split("Habilidades")[0].strip()
-        elif content_key == "Habilidades":
-            if content_key in resume_content:
-                if "Idiomas" in resume_content:
-                    content = resume_content.split(content_key)[1].split("Idiomas")[0].strip()
-                else:
-                    content = resume_content.split(content_key)[1].strip()
-        elif content_key == "Idiomas":
-            if content_key in resume_content:
-                if "Atividades e Interesses" in resume_content:
-                    content = resume_content.split(content_key)[1].split("Atividades e Interesses")[0].strip()
-                else:
-                    content = resume_content.split(content_key)[1].strip()
-        elif content_key == "Atividades e Interesses":
-            if content_key in resume_content:
-                content = resume_content.split(content_key)[1].strip()
-        
-        # Format the content appropriately
-        if content:
-            if content_key == "Habilidades":
-                skills_list = content.split(",")
-                for skill in skills_list:
-                    skill = skill.strip()
-                    if skill:
-                        doc.add_paragraph(skill, style='List Bullet')
-            elif content_key == "Experiência Profissional":
-                # Parse experience entries
-                experience_entries = content.split("\n\n")
-                for entry in experience_entries:
-                    lines = entry.strip().split("\n")
-                    if lines and len(lines) >= 1:
-                        title_line = lines[0].strip()
-                        if " | " in title_line:
-                            parts = title_line.split(" | ")
-                            if len(parts) >= 3:
-                                job_title, company, dates = parts[0], parts[1], parts[2]
-                                job_heading = doc.add_paragraph()
-                                job_heading.add_run(f"{job_title.upper()} | {company.upper()} | {dates.upper()}").bold = True
-                        
-                        # Add responsibilities as bullet points
-                        for i in range(1, len(lines)):
-                            line = lines[i].strip()
-                            if line.startswith("-"):
-                                p = doc.add_paragraph(line[1:].strip(), style='List Bullet')
-                            else:
-                                doc.add_paragraph(line)
-            else:
-                # Add regular paragraphs for other sections
-                paragraphs = content.split("\n")
-                for para in paragraphs:
-                    if para.strip():
-                        doc.add_paragraph(para.strip())
-    
+
     return doc
 
-# Function to format template 1
-def template1(doc, resume_content, name, email, phone, linkedin):
-    # Clear the document
-    for paragraph in doc.paragraphs[:]:
-        p = paragraph._element
-        p.getparent().remove(p)
-        paragraph._p = paragraph._element = None
-    
+# Function to copy a document with all of its package parts
+def clone_document(doc):
+    """Deep-copy the package, mapping each part's XML root to its copy first; a plain deepcopy of
+    the Document would copy elements reached through different objects as separate trees"""
+    memo = {}
+    for part in doc.part.package.iter_parts():
+        element = getattr(part, "_element", None)
+        if element is not None:
+            memo[id(element)] = copy.deepcopy(element)
+    return copy.deepcopy(doc.part, memo).document
+
+# Function to render a parsed resume into a new document following a template plan
+def render_resume(plan, resume, name, email, phone, linkedin):
+    # Clone the prebuilt skeleton instead of loading and styling a new document
+    doc = clone_document(plan.get_skeleton())
+    header, contact, *headings = doc.paragraphs
+
     # Add contact info at top
-    header = doc.add_paragraph()
-    header.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    header_run = header.add_run(name)
-    header_run.bold = True
-    header_run.font.size = Pt(16)
-    
-    contact = doc.add_paragraph()
-    contact.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    header.runs[0].text = name
     contact.add_run(f"{phone} | {email}")
     if linkedin:
         contact.add_run(f" | {linkedin}")
-    
-    # Add sections with proper ATS formatting
-    sections = [
-        ("PERFIL", "Perfil"),
-        ("EXPERIÊNCIA", "Experiência Profissional"),
-        ("EDUCAÇÃO", "Educação"),
-        ("HABILIDADES E COMPETÊNCIAS", "Habilidades"),
-        ("IDIOMAS", "Idiomas"),
-        ("ATIVIDADES E INTERESSES", "Atividades e Interesses")
-    ]
-    
-    for section_title, content_key in sections:
-        # Add section header
-        section_header = doc.add_paragraph()
-        section_header.style = 'Heading 1'
-        section_run = section_header.add_run(section_title)
-        section_run.bold = True
-        section_run.font.all_caps = True
-        
-        # Get content for this section
-        content = ""
-        if content_key == "Perfil":
-            if "Experiência Profissional" in resume_content:
-                content = resume_content.split("Experiência Profissional")[0].strip()
-            else:
-                content = resume_content
-        elif content_key == "Experiência Profissional":
-            if content_key in resume_content and "Educação" in resume_content:
-                content = resume_content.split(content_key)[1].split("Educação")[0].strip()
-        elif content_key == "Educação":
-            if content_key in resume_content and "Habilidades" in resume_content:
-                content = resume_content.split(content_key)[1].split("Habilidades")[0].strip()
-        elif content_key == "Habilidades":
-            if content_key in resume_content:
-                if "Idiomas" in resume_content:
-                    content = resume_content.split(content_key)[1].split("Idiomas")[0].strip()
-                else:
-                    content = resume_content.split(content_key)[1].strip()
-        elif content_key == "Idiomas":
-            if content_key in resume_content:
-                if "Atividades e Interesses" in resume_content:
-                    content = resume_content.split(content_key)[1].split("Atividades e Interesses")[0].strip()
-                else:
-                    content = resume_content.split(content_key)[1].strip()
-        elif content_key == "Atividades e Interesses":
-            if content_key in resume_content:
-                content = resume_content.split(content_key)[1].strip()
-        
-        # Format the content appropriately
-        if content:
-            if content_key == "Habilidades":
-                skills_list = content.split(",")
-                for skill in skills_list:
-                    skill = skill.strip()
-                    if skill:
-                        doc.add_paragraph(skill, style='List Bullet')
-            elif content_key == "Experiência Profissional":
-                # Parse experience entries
-                experience_entries = content.split("\n\n")
-                for entry in experience_entries:
-                    lines = entry.strip().split("\n")
-                    if lines and len(lines) >= 1:
-                        title_line = lines[0].strip()
-                        if " | " in title_line:
-                            parts = title_line.split(" | ")
-                            if len(parts) >= 3:
-                                job_title, company, dates = parts[0], parts[1], parts[2]
-                                job_heading = doc.add_paragraph()
-                                job_heading.add_run(f"{job_title.upper()} | {company.upper()} | {dates.upper()}").bold = True
-                        
-                        # Add responsibilities as bullet points
-                        for i in range(1, len(lines)):
-                            line = lines[i].strip()
-                            if line.startswith("-"):
-                                p = doc.add_paragraph(line[1:].strip(), style='List Bullet')
-                            else:
-                                doc.add_paragraph(line)
-            else:
-                # Add regular paragraphs for other sections
-                paragraphs = content.split("\n")
-                for para in paragraphs:
-                    if para.strip():
-                        doc.add_paragraph(para.strip())
-    
+
+    # Add sections in the order defined by the template: each heading moves to the end of
+    # the body (the headings not placed yet are all before it), then its content follows
+    sect_pr = doc.element.body.sectPr
+    for section, heading in zip(plan.sections, headings):
+        sect_pr.addprevious(heading._p)
+        SECTION_RENDERERS[section.key](doc, section.body, resume)
+
     return doc
 
-# Function to format as generic resume
-def format_as_generic_resume(doc, resume_content, name, email, phone, linkedin):
-     # Clear the document content if it's not empty
-    for paragraph in doc.paragraphs[:]:
-        p = paragraph._element
-        p.getparent().remove(p)
-        paragraph._p = paragraph._element = None
-
-    # Add header with contact information
-    header_paragraph = doc.add_paragraph()
-    header_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    run = header_paragraph.add_run(f"{name}")
-    run.bold = True
-    run.font.size = Pt(16)
-    
-    contact_paragraph = doc.add_paragraph()
-    contact_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    contact_paragraph.add_run(f"{phone} | {email}")
-    if linkedin:
-        contact_paragraph.add_run(f" | {linkedin}")
-
-    # Function to clean markdown syntax
-    def clean_markdown(text):
-        # Remove bold markdown
-        text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
-        # Remove other markdown formatting as needed
-        return text
-
-    # Add Perfil/Profile section
-    section_heading = doc.add_paragraph()
-    section_heading.add_run("PERFIL").bold = True
-    section_heading.style = 'Heading 1'
-    
-    if "Experiência Profissional" in resume_content:
-        profile_text = resume_content.split("Experiência Profissional")[0].strip()
-        profile_text = clean_markdown(profile_text)
-        doc.add_paragraph(profile_text)
-    else:
-        profile_text = clean_markdown(resume_content)
-        doc.add_paragraph(profile_text)
-    
-    # Add Experience section
-    section_heading = doc.add_paragraph()
-    section_heading.add_run("EXPERIÊNCIA").bold = True
-    section_heading.style = 'Heading 1'
-    
-    if "Experiência Profissional" in resume_content and "Educação" in resume_content:
-        experience_text = resume_content.split("Experiência Profissional")[1].split("Educação")[0].strip()
-        
-        # Parse and format experience entries
-        experience_entries = experience_text.split("\n\n")
-        for entry in experience_entries:
-            lines = entry.strip().split("\n")
-            if lines and len(lines) >= 1:
-                # First line typically contains job title, company, dates
-                title_line = clean_markdown(lines[0].strip())
-                if " | " in title_line:
-                    parts = title_line.split(" | ")
-                    if len(parts) >= 3:
-                        job_title, company, dates = parts[0], parts[1], parts[2]
-                        job_heading = doc.add_paragraph()
-                        job_heading.add_run(f"{job_title.upper()} | {company.upper()} | {dates.upper()}").bold = True
-                        job_heading.style = 'Heading 2'
-                
-                # Add bullet points for responsibilities
-                for i in range(1, len(lines)):
-                    line = clean_markdown(lines[i].strip())
-                    if line.startswith("-"):
-                        p = doc.add_paragraph(line[1:].strip(), style='List Bullet')
-                    else:
-                        doc.add_paragraph(line)
-    
-    # Add Education section
-    section_heading = doc.add_paragraph()
-    section_heading.add_run("EDUCAÇÃO").bold = True
-    section_heading.style = 'Heading 1'
-    
-    if "Educação" in resume_content and "Habilidades" in resume_content:
-        education_text = resume_content.split("Educação")[1].split("Habilidades")[0].strip()
-        
-        # Parse and format education entries
-        education_entries = education_text.split("\n\n")
-        for entry in education_entries:
-            lines = entry.strip().split("\n")
-            if lines and len(lines) >= 1:
-                education_paragraph = doc.add_paragraph()
-                clean_line = clean_markdown(lines[0])
-                education_paragraph.add_run(clean_line.upper()).bold = True
-                
-                for i in range(1, len(lines)):
-                    doc.add_paragraph(clean_markdown(lines[i]))
-    
-    # Add Skills section
-    section_heading = doc.add_paragraph()
-    section_heading.add_run("HABILIDADES E COMPETÊNCIAS").bold = True
-    section_heading.style = 'Heading 1'
-    
-    if "Habilidades" in resume_content:
-        skills_text = None
-        if "Idiomas" in resume_content:
-            skills_text = resume_content.split("Habilidades")[1].split("Idiomas")[0].strip()
-        else:
-            skills_text = resume_content.split("Habilidades")[1].strip()
-            
-        # Format skills as bullet points
-        skills_list = skills_text.split(",")
-        for skill in skills_list:
-            skill = clean_markdown(skill.strip())
-            if skill:
-                doc.add_paragraph(skill, style='List Bullet')
-    
-    # Add Languages section if present
-    if "Idiomas" in resume_content:
-        section_heading = doc.add_paragraph()
-        section_heading.add_run("IDIOMAS").bold = True
-        section_heading.style = 'Heading 1'
-        
-        languages_text = None
-        if "Atividades e Interesses" in resume_content:
-            languages_text = resume_content.split("Idiomas")[1].split("Atividades e Interesses")[0].strip()
-        else:
-            languages_text = resume_content.split("Idiomas")[1].strip()
-        
-        languages_list = languages_text.split(",")
-        for language in languages_list:
-            language = clean_markdown(language.strip())
-            if language:
-                doc.add_paragraph(language)
-    
-    # Add Interests section
-    section_heading = doc.add_paragraph()
-    section_heading.add_run("ATIVIDADES E INTERESSES").bold = True
-    section_heading.style = 'Heading 1'
-    
-    if "Atividades e Interesses" in resume_content:
-        interests_text = resume_content.split("Atividades e Interesses")[1].strip()
-        interests_text = clean_markdown(interests_text)
-        interests_paragraph = doc.add_paragraph(interests_text)
-    
-    # Apply consistent formatting
-    for paragraph in doc.paragraphs:
-        if paragraph.style.name.startswith('Heading'):
-            for run in paragraph.runs:
-                run.bold = True
-                run.font.all_caps = True
+# Maximum number of parsed templates kept in memory
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "16"))
+
+# Function to identify the current version of a template file; None when it cannot be read
+def template_signature(template_name, templates_dir):
+    try:
+        stat = os.stat(os.path.join(templates_dir, template_name))
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+# Bounded LRU cache of parsed templates and their compiled plans
+class TemplateCache:
+    """Entries are keyed by path and revalidated against the file's mtime and size"""
+
+    def __init__(self, maxsize=TEMPLATE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, template_name, templates_dir):
+        template_path = os.path.join(templates_dir, template_name)
+        signature = template_signature(template_name, templates_dir)
+
+        with self._lock:
+            entry = self._entries.get(template_path)
+            if entry is not None and signature is not None and entry[0] == signature:
+                self._entries.move_to_end(template_path)
+                self.hits += 1
+                return entry[1]
+            # The file changed or disappeared, so the cached copy is stale
+            self._entries.pop(template_path, None)
+            self.misses += 1
+
+        # Parse outside the lock so a slow template does not block the others
+        template_doc = load_template(template_name, templates_dir)
+        if template_doc is None or signature is None:
+            return None
+        plan = compile_template_plan(template_doc, template_name)
+
+        with self._lock:
+            self._entries[template_path] = (signature, plan)
+            self._entries.move_to_end(template_path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+# Template cache shared by every session of the process
+@cache_resource
+def get_template_cache():
+    cache = TemplateCache()
+    instrumentation.registry.register_collector("template_cache", cache.stats)
+    return cache
+
+# Function to get the compiled plan for a template, parsing it only when the file changed
+@instrumentation.traced("template_load")
+def get_template_plan(template_name, templates_dir):
+    return get_template_cache().get(template_name, templates_dir)
+
+# How .docx files are written: "stream" (docx_writer, copies the fixed zip members and streams
+# word/document.xml) or "python-docx" (builds the document and saves the whole package)
+DOCX_WRITER = os.getenv("DOCX_WRITER", "stream").lower()
 
 # Function to populate the Word document template
-def create_word_doc(resume_content, name, email, phone, linkedin, template_name, templates_dir, filename="curriculo.docx"):
-     # Load the template for reference
-    template_doc = load_template(template_name, templates_dir)
-    if template_doc is None:
+@instrumentation.traced("create_word_doc")
+def create_word_doc(resume_content, name, email, phone, linkedin, template_name, templates_dir):
+    plan = get_template_plan(template_name, templates_dir)
+    if plan is None:
         st.warning("Template não encontrado. Criando um novo documento do zero.")
-        doc = Document()
-    else:
-        # Create a new document
-        doc = Document()
-        
-        # Based on template name, apply appropriate formatting
-        if "template2" in template_name:
-            doc = template2(doc, resume_content, name, email, phone, linkedin)
-        elif "template1" in template_name:
-            doc = template1(doc, resume_content, name, email, phone, linkedin)
-        else:
-            # Generic formatting
-            doc = format_as_generic_resume(doc, resume_content, name, email, phone, linkedin)
-        
-        # Apply any remaining template styles
-        if template_doc:
-            doc = apply_template_styles(doc, template_doc)
-    
-    # Save the document
-    doc.save(filename)
-    with open(filename, "rb") as file:
-        doc_bytes = file.read()
+        plan = get_default_template_plan()
+
+    # Accept either the raw model output or an already parsed resume
+    resume = load_resume(resume_content) if isinstance(resume_content, str) else resume_content
+    if DOCX_WRITER == "stream":
+        buffer = io.BytesIO()
+        with instrumentation.stage("docx_stream"):
+            docx_writer.write_docx(buffer, plan, resume, name, email, phone, linkedin)
+        doc_bytes = buffer.getvalue()
+        instrumentation.count("payload_bytes", len(doc_bytes), kind="docx")
+        return doc_bytes
+
+    with instrumentation.stage("render_resume"):
+        doc = render_resume(plan, resume, name, email, phone, linkedin)
+
+    # Save the document to memory, so concurrent sessions never share a file
+    buffer = io.BytesIO()
+    with instrumentation.stage("docx_save"):
+        doc.save(buffer)
+    doc_bytes = buffer.getvalue()
+    instrumentation.count("payload_bytes", len(doc_bytes), kind="docx")
     return doc_bytes
 
-# Function to update generation count for a user
-def update_generation_count(email, collection):
+# Free generations per account
+GENERATION_LIMIT = int(os.getenv("GENERATION_LIMIT", "2"))
+
+# How long the generation count kept in the session is trusted before MongoDB is read again (seconds)
+QUOTA_CACHE_TTL = int(os.getenv("QUOTA_CACHE_TTL", "60"))
+
+# Function to keep a generation count read from (or written to) MongoDB in the session
+def set_generation_count(count):
+    st.session_state.generation_count = count
+    st.session_state.generation_count_checked_at = time.monotonic()
+
+# Function to read the user's generation count, at most once every QUOTA_CACHE_TTL seconds per session
+def get_generation_count(email, collection):
+    checked_at = st.session_state.get("generation_count_checked_at")
+    if checked_at is not None and time.monotonic() - checked_at < QUOTA_CACHE_TTL:
+        return st.session_state.generation_count
+    try:
+        # Picks up generations made from other tabs or sessions of the same account
+        user = collection.find_one({"email": email}, projection={"_id": 0, "generation_count": 1})
+    except Exception as e:
+        print(f"Erro ao ler a contagem de gerações: {e}")
+        return st.session_state.generation_count
+    set_generation_count((user or {}).get("generation_count", 0))
+    return st.session_state.generation_count
+
+# Function to reserve one generation for a user, atomically and in a single round-trip
+@instrumentation.traced("mongo_reserve_generation")
+def reserve_generation(email, collection, limit=GENERATION_LIMIT):
+    """Return the new generation count, or None if the user has already reached the limit"""
+    user = collection.find_one_and_update(
+        # Accounts created before the counter existed have no generation_count yet
+        {"email": email, "$or": [{"generation_count": {"$lt": limit}}, {"generation_count": {"$exists": False}}]},
+        {"$inc": {"generation_count": 1}},
+        projection={"generation_count": 1},
+        return_document=pymongo.ReturnDocument.AFTER
+    )
+    if user is None:
+        return None
+    return user["generation_count"]
+
+# Function to give a reserved generation back when the generation failed
+@instrumentation.traced("mongo_refund_generation")
+def refund_generation(email, collection):
     try:
-        # Update the generation count in the database
-        result = collection.update_one(
-            {"email": email},
-            {"$inc": {"generation_count": 1}}
+        collection.update_one(
+            {"email": email, "generation_count": {"$gt": 0}},
+            {"$inc": {"generation_count": -1}}
         )
-        
-        # Get the updated user data
-        user = collection.find_one({"email": email})
-        return user.get("generation_count", 0)
     except Exception as e:
         st.error(f"Erro ao atualizar contagem de gerações: {e}")
+
+# Number of history entries shown per page
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "10"))
+
+# Function to get the generation history collection (kept apart so the user documents stay small)
+def get_history_collection():
+    return get_mongo_client()[DB_NAME][HISTORY_COLLECTION]
+
+# Function to get the generation jobs collection
+def get_jobs_collection():
+    return get_mongo_client()[DB_NAME][JOBS_COLLECTION]
+
+# Function to store one generation in the user's history
+@instrumentation.traced("mongo_record_history")
+def record_generation(history, email, input_hash, content, template_name, contact, timings, entry_id=None):
+    """Return the id of the new entry, or None if it could not be stored
+
+    Passing entry_id makes the write idempotent: a job retried after its worker died stores
+    one entry, not two.
+    """
+    data = content.encode("utf-8")
+    # BSON dates keep milliseconds, so round now to have the cursor match the stored value
+    now = datetime.now(timezone.utc)
+    entry = {
+        "user": email,
+        "created_at": now.replace(microsecond=now.microsecond // 1000 * 1000),
+        "input_hash": input_hash,
+        "template": template_name,
+        "content": bson.Binary(zlib.compress(data, 6)),
+        "content_size": len(data),
+        # (name, phone, linkedin), needed to render the document again
+        "contact": list(contact),
+        "timings_ms": {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()},
+    }
+    if entry_id is not None:
+        entry["_id"] = entry_id
+    try:
+        return history.insert_one(entry).inserted_id
+    except pymongo.errors.DuplicateKeyError:
+        return entry_id
+    except Exception as e:
+        print(f"Erro ao gravar o histórico de gerações: {e}")
         return None
 
-# Function to check if user has reached generation limit
-def check_generation_limit(email, collection, limit=2):
-    user = collection.find_one({"email": email})
-    if user:
-        generation_count = user.get("generation_count", 0)
-        return generation_count >= limit
-    return False
+# Function to decompress the stored model output of a history entry
+def history_content(entry):
+    return zlib.decompress(entry["content"]).decode("utf-8")
+
+# Function to encode the position after a history entry as a page cursor
+def history_cursor(entry):
+    created_at = entry["created_at"].replace(tzinfo=timezone.utc)
+    return f"{int(created_at.timestamp() * 1000)}-{entry['_id']}"
+
+# Function to list a page of a user's history, newest first, without the stored content
+@instrumentation.traced("mongo_list_history")
+def list_history(history, email, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """Return (entries, cursor of the next page or None)"""
+    query = {"user": email}
+    if cursor:
+        millis, entry_id = cursor.split("-", 1)
+        created_at = datetime.fromtimestamp(int(millis) / 1000, timezone.utc)
+        entry_id = bson.ObjectId(entry_id)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": entry_id}},
+        ]
+    entries = list(
+        history.find(query, projection={"content": 0})
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+    )
+    if len(entries) > limit:
+        return entries[:limit], history_cursor(entries[limit - 1])
+    return entries, None
+
+# Function to load one history entry of a user, with its content
+def get_history_entry(history, email, entry_id):
+    try:
+        return history.find_one({"_id": bson.ObjectId(entry_id), "user": email})
+    except Exception as e:
+        print(f"Erro ao ler o histórico de gerações: {e}")
+        return None
+
+# Function to export a user's whole history as JSON lines, streaming from MongoDB in batches
+def export_history(history, email, batch_size=100):
+    entries = history.find({"user": email}).sort([("created_at", -1), ("_id", -1)]).batch_size(batch_size)
+    for entry in entries:
+        yield json.dumps({
+            "id": str(entry["_id"]),
+            "created_at": entry["created_at"].replace(tzinfo=timezone.utc).isoformat(),
+            "input_hash": entry["input_hash"],
+            "template": entry["template"],
+            "timings_ms": entry.get("timings_ms", {}),
+            "content": history_content(entry),
+        }, ensure_ascii=False) + "\n"
+
+# Function to render a past generation again, from its stored content and without calling the model
+def render_history_entry(entry, templates_dir, template_name=None, formats=None):
+    name, phone, linkedin = entry.get("contact") or ("", "", "")
+    # Resolved here: resume_export may still be importing when this module loads
+    formats = formats or tuple(resume_export.EXPORT_FORMATS)
+    return resume_export.export_resume(
+        load_resume(history_content(entry)), name, entry["user"], phone, linkedin,
+        template_name or entry["template"], templates_dir, formats,
+    )
+
+# Accounts that see the per-request timing table
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+# Function to tell whether a user is an admin
+def is_admin(email):
+    return bool(email) and email.lower() in ADMIN_EMAILS
+
+# Prometheus /metrics endpoint, started once per process when METRICS_ENABLED=1
+@cache_resource
+def get_metrics_server():
+    try:
+        return instrumentation.start_metrics_server()
+    except OSError as e:
+        print(f"Erro ao iniciar o servidor de métricas na porta {instrumentation.METRICS_PORT}: {e}")
+        return None
+
+# Function to show admins whether MongoDB answers and how busy its connection pool is
+def show_admin_metrics():
+    with st.expander("MongoDB (admin)"):
+        health = check_mongodb_health()
+        if health["ok"]:
+            st.success(f"MongoDB respondeu em {health['latency_ms']:.0f} ms.")
+        else:
+            st.error(f"MongoDB não respondeu: {health['error']}")
+        st.table([get_mongo_pool_metrics()])
+
+# Last generation of a session, kept across reruns so its text and downloads survive widget changes
+@dataclass
+class GenerationResult:
+    cache_key: str
+    content: str
+    resume: ParsedResume
+    # (name, email, phone, linkedin) the resume was generated with
+    contact: tuple
+    template: str
+    from_cache: bool = False
+    # Streamed results are shown section by section, the others as plain text
+    streamed: bool = False
+    # Template name -> {format: bytes}, filled as the user switches templates
+    files: dict = field(default_factory=dict)
+
+# Function to export a stored result with a template, once per template and session
+def get_result_files(result, template_name, templates_dir):
+    files = result.files.get(template_name)
+    if files is None:
+        name, email, phone, linkedin = result.contact
+        with instrumentation.stage("render_docx"):
+            files = resume_export.export_resume(result.resume, name, email, phone, linkedin, template_name, templates_dir)
+        result.files[template_name] = files
+    return files
+
+# Function to show a stored result and its download buttons
+def show_generation_result(result, template_name, templates_dir, inputs_changed=False):
+    st.subheader("Seu Currículo Gerado")
+    if result.from_cache:
+        st.caption("Currículo reutilizado de uma geração anterior com os mesmos dados.")
+    if inputs_changed:
+        st.caption("Os dados do formulário mudaram desde esta geração. Clique em \"Gerar Currículo\" para atualizá-lo.")
+    if result.streamed:
+        show_resume_preview(result.resume)
+    else:
+        st.text(resume_display_text(result.content, result.resume))
+
+    with st.spinner("Preparando o documento..."):
+        # Export every format from the same parsed resume; the .docx is built in the render pool
+        try:
+            files = get_result_files(result, template_name, templates_dir)
+        except render_worker.RenderQueueFull:
+            st.error("O servidor está ocupado. Tente baixar o currículo novamente em instantes.")
+            files = {}
+    if files:
+        columns = st.columns(len(files))
+        for column, (export_format, data) in zip(columns, files.items()):
+            label, mime, extension = resume_export.EXPORT_FORMATS[export_format]
+            column.download_button(
+                label=f"Baixar em {label}",
+                data=data,
+                file_name=f"curriculo.{extension}",
+                mime=mime,
+                key=f"download_{export_format}"
+            )
+
+# Function to read a page of the user's history, kept in the session until the next generation
+def get_history_page(history, email, cursor):
+    pages = st.session_state.setdefault("history_pages", {})
+    if cursor not in pages:
+        pages[cursor] = list_history(history, email, cursor)
+    return pages[cursor]
+
+# Function to show the user's past generations, one page at a time, with downloads rendered on demand
+def show_generation_history(email, templates_dir):
+    if not st.toggle("Mostrar histórico de currículos"):
+        return
+    history = get_history_collection()
+    cursors = st.session_state.setdefault("history_cursors", [None])
+    entries, next_cursor = get_history_page(history, email, cursors[-1])
+    if not entries:
+        st.write("Nenhum currículo gerado ainda.")
+        return
+
+    prepared = st.session_state.setdefault("history_files", {})
+    for entry in entries:
+        entry_id = str(entry["_id"])
+        created_at = entry["created_at"].replace(tzinfo=timezone.utc).astimezone()
+        st.write(f"**{created_at:%d/%m/%Y %H:%M}** · {entry['template']} · {entry['content_size'] / 1024:.1f} KB")
+        if entry_id not in prepared:
+            if st.button("Preparar download", key=f"history_{entry_id}"):
+                full_entry = get_history_entry(history, email, entry_id)
+                if full_entry is None:
+                    st.error("Não foi possível carregar este currículo.")
+                else:
+                    try:
+                        with st.spinner("Preparando o documento..."):
+                            prepared[entry_id] = render_history_entry(full_entry, templates_dir)
+                    except render_worker.RenderQueueFull:
+                        st.error("O servidor está ocupado. Tente novamente em instantes.")
+        if entry_id in prepared:
+            files = prepared[entry_id]
+            columns = st.columns(len(files))
+            for column, (export_format, data) in zip(columns, files.items()):
+                label, mime, extension = resume_export.EXPORT_FORMATS[export_format]
+                column.download_button(
+                    label=f"Baixar em {label}",
+                    data=data,
+                    file_name=f"curriculo-{created_at:%Y%m%d-%H%M}.{extension}",
+                    mime=mime,
+                    key=f"history_{entry_id}_{export_format}"
+                )
+
+    previous_column, next_column, export_column = st.columns(3)
+    if len(cursors) > 1 and previous_column.button("Página anterior"):
+        cursors.pop()
+        st.rerun()
+    if next_cursor and next_column.button("Próxima página"):
+        cursors.append(next_cursor)
+        st.rerun()
+    if export_column.button("Exportar histórico completo"):
+        export_column.download_button(
+            label="Baixar histórico (JSONL)",
+            data="".join(export_history(history, email)),
+            file_name="historico-curriculos.jsonl",
+            mime="application/x-ndjson",
+            key="history_export"
+        )
+
+# Function to turn the user's finished generation job into the session's result; returns the job while it is still running
+def pickup_generation_job(email):
+    jobs = get_jobs_collection()
+    job_id = st.session_state.get("generation_job_id")
+    if job_id is not None:
+        job = job_queue.get_job(jobs, job_id)
+    elif not st.session_state.get("generation_job_checked"):
+        # Once per session: a job queued before the tab was closed or reloaded
+        st.session_state.generation_job_checked = True
+        job = job_queue.find_unseen_job(jobs, email)
+    else:
+        return None
+    if job is None:
+        st.session_state.generation_job_id = None
+        return None
+    if job["status"] in job_queue.ACTIVE_STATUSES:
+        st.session_state.generation_job_id = job["_id"]
+        return job
+
+    st.session_state.generation_job_id = None
+    job_queue.mark_picked_up(jobs, job["_id"])
+    if job["status"] == job_queue.FAILED:
+        st.error(f"Erro ao gerar o currículo: {job.get('error')}")
+        # The worker gave the credit back, so the count is read again
+        st.session_state.generation_count_checked_at = None
+        return None
+    # The worker stored the result in the history, under the job's id
+    entry = get_history_entry(get_history_collection(), email, job["_id"])
+    if entry is None:
+        st.error("Não foi possível carregar o currículo gerado.")
+        return None
+    content = history_content(entry)
+    get_response_cache().set(job["input_hash"], content)
+    name, phone, linkedin = job["contact"]
+    st.session_state.generation_result = GenerationResult(
+        cache_key=job["input_hash"],
+        content=content,
+        resume=load_resume(content),
+        contact=(name, email, phone, linkedin),
+        template=job["template"],
+    )
+    st.session_state.history_pages = {}
+    st.session_state.history_cursors = [None]
+    return None
+
+# Function to show a queued generation, checking it every JOB_STATUS_POLL_SECONDS until it finishes
+def show_generation_job(job_id):
+    jobs = get_jobs_collection()
+
+    def poll():
+        job = job_queue.get_job(jobs, job_id)
+        if job is None or job["status"] not in job_queue.ACTIVE_STATUSES:
+            # The full rerun picks the result up
+            st.rerun()
+        if job["status"] == job_queue.RUNNING:
+            st.info("Gerando seu currículo... Você pode fechar esta página e voltar depois.")
+        elif job["attempts"]:
+            st.info("A geração falhou e será tentada de novo em instantes.")
+        else:
+            st.info(f"Seu currículo está na fila (posição {job_queue.queue_position(jobs, job)}). Você pode fechar esta página e voltar depois.")
+
+    st.fragment(poll, run_every=job_queue.JOB_STATUS_POLL_SECONDS)()
 
     # Main function
 def main():
     st.set_page_config(page_title="Gerador de Currículo", page_icon="📄", layout="wide")
     st.title("📄 Gerador de Currículo Personalizado")
 
+    if instrumentation.METRICS_ENABLED:
+        get_metrics_server()
+
     # Initialize session state for user authentication and generation count
     if "signed_in" not in st.session_state:
         st.session_state.signed_in = False
@@ -607,21 +2133,22 @@ def main():
         password = st.text_input("Senha", type="password")
         if st.button("Entrar/Cadastrar"):
             if email and password:
-                if check_user_exists(email, collection):
-                    user = authenticate_user(email, password, collection)
+                # A single lookup tells whether the account exists and holds the password hash
+                user = find_user(email, collection)
+                if user is not None:
+                    user = authenticate_user(email, password, user, collection)
                     if user:
                         st.session_state.signed_in = True
                         st.session_state.email = email
-                        st.session_state.generation_count = user.get("generation_count", 0)
+                        set_generation_count(user.get("generation_count", 0))
                         st.success("Login bem-sucedido!")
                         st.rerun()
                     else:
                         st.error("Email ou senha incorretos.")
-                else:
-                    add_user(email, password, collection)
+                elif add_user(email, password, collection):
                     st.session_state.signed_in = True
                     st.session_state.email = email
-                    st.session_state.generation_count = 0
+                    set_generation_count(0)
                     st.success("Cadastro bem-sucedido!")
                     st.rerun()
             else:
@@ -630,17 +2157,30 @@ def main():
 
     # Main content for signed-in users
     st.write(f"Bem-vindo, {st.session_state.email}!")
+    if is_admin(st.session_state.email):
+        show_admin_metrics()
+    if job_queue.JOB_QUEUE_ENABLED:
+        job_queue.get_job_worker_pool()
+        pickup_generation_job(st.session_state.email)
+    result = st.session_state.get("generation_result")
     
-    # Check generation limit
-    has_reached_limit = check_generation_limit(st.session_state.email, collection)
+    # Check generation limit (the count is reused for QUOTA_CACHE_TTL seconds; the reservation below is the real check)
+    has_reached_limit = get_generation_count(st.session_state.email, collection) >= GENERATION_LIMIT
     if has_reached_limit:
-        st.warning("⚠️ Você atingiu o limite de 2 currículos gerados. Para gerar mais currículos, por favor, realize um pagamento. Pague uma taxa de 200 MTS para o número 876513064 (Ernestina Jose).")
+        st.warning(f"⚠️ Você atingiu o limite de {GENERATION_LIMIT} currículos gerados. Para gerar mais currículos, por favor, realize um pagamento. Pague uma taxa de 200 MTS para o número 876513064 (Ernestina Jose).")
         # st.button("Realizar Pagamento", type="primary")
         st.info("Entre em contato conosco para mais informações sobre pagamentos.")
+        # The last resume and the history stay available for download
+        templates_dir = list_templates()[1]
+        if st.session_state.get("generation_job_id") is not None:
+            show_generation_job(st.session_state.generation_job_id)
+        if result is not None:
+            show_generation_result(result, result.template, templates_dir)
+        show_generation_history(st.session_state.email, templates_dir)
         return
     
     # Display remaining generations
-    st.info(f"Você tem {2 - st.session_state.generation_count} gerações de currículo restantes em sua conta gratuita.")
+    st.info(f"Você tem {GENERATION_LIMIT - st.session_state.generation_count} gerações de currículo restantes em sua conta gratuita.")
     st.write("Preencha os detalhes abaixo para gerar seu currículo.")
 
     # List available templates
@@ -692,47 +2232,146 @@ def main():
         st.header("Habilidades")
         skills = st.text_area("Liste suas habilidades (separadas por vírgula)", "Contabilidade, PDV, Comunicação")
 
+    # Format experiences and educations
+    experiences_formatted = "\n".join([f"- {exp}" for exp in experiences])
+    educations_formatted = "\n".join([f"- {edu}" for edu in educations])
+    generation_args = (
+        name, st.session_state.email, phone, industry, job_type,
+        experiences_formatted, educations_formatted, skills.split(","), languages.split(","), linkedin
+    )
+    cache_key = resume_cache_key(*generation_args)
+
     # Generate Resume
+    trace = None
+    generated = False
     if st.button("Gerar Currículo"):
-        if not client.api_key:
+        if not OPENAI_API_KEY:
             st.error("Por favor, configure sua chave da API da OpenAI.")
-        else:
-            with st.spinner("Gerando seu currículo..."):
-                # Format experiences and educations
-                experiences_formatted = "\n".join([f"- {exp}" for exp in experiences])
-                educations_formatted = "\n".join([f"- {edu}" for edu in educations])
-
-                # Generate resume content
-                resume_content = generate_resume(
-                    name, st.session_state.email, phone, industry, job_type,
-                    experiences_formatted, educations_formatted, skills.split(","), languages.split(","), linkedin
+        elif job_queue.JOB_QUEUE_ENABLED and get_response_cache().get(cache_key) is None:
+            # A worker generates the resume; the job outlives reruns and closed tabs
+            try:
+                job, new_count = job_queue.enqueue_job(
+                    get_jobs_collection(), collection, generation_args, cache_key, selected_template,
                 )
+            except Exception as e:
+                st.error(f"Erro ao enfileirar a geração: {e}")
+                return
+            if job is None:
+                set_generation_count(GENERATION_LIMIT)
+                st.warning(f"⚠️ Você atingiu o limite de {GENERATION_LIMIT} currículos gerados. Para gerar mais currículos, por favor, realize um pagamento. Pague uma taxa de 200 MTS para o número 876513064 (Ernestina Jose).")
+                return
+            if new_count is not None:
+                set_generation_count(new_count)
+            st.session_state.generation_job_id = job["_id"]
+            generated = True
+        else:
+            # Stage timings go to the history; admins also get them as a table
+            trace = instrumentation.start_trace()
 
-                # Update generation count in the database
-                new_count = update_generation_count(st.session_state.email, collection)
-                if new_count is not None:
-                    st.session_state.generation_count = new_count
-
-                # Display Resume
-                st.subheader("Seu Currículo Gerado")
-                st.text(resume_content)
-
-                # Create Word document
-                doc_bytes = create_word_doc(resume_content, name, st.session_state.email, phone, linkedin, selected_template, templates_dir)
-                if doc_bytes:
-                    st.download_button(
-                        label="Baixar Currículo em Word",
-                        data=doc_bytes,
-                        file_name="curriculo.docx",
-                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                    )
-
-                # Show warning if user reached limit after this generation
-                if st.session_state.generation_count >= 2:
-                    st.warning("⚠️ Você atingiu o limite de currículos gratuitos. Para gerar mais currículos, por favor, realize um pagamento. Pague uma taxa de 200 MTS para o número 876513064 (Ernestina Jose).")
-                    # st.button("Realizar Pagamento", type="primary")
+            # Identical inputs reuse the previous result without calling the API or spending a credit
+            response_cache = get_response_cache()
+            resume_content = response_cache.get(cache_key)
+            from_cache = resume_content is not None
+
+            if not from_cache:
+                # Reserve the credit up front so parallel tabs cannot go over the limit
+                try:
+                    new_count = reserve_generation(st.session_state.email, collection)
+                except Exception as e:
+                    st.error(f"Erro ao atualizar contagem de gerações: {e}")
+                    instrumentation.end_trace()
+                    return
+                if new_count is None:
+                    set_generation_count(GENERATION_LIMIT)
+                    st.warning(f"⚠️ Você atingiu o limite de {GENERATION_LIMIT} currículos gerados. Para gerar mais currículos, por favor, realize um pagamento. Pague uma taxa de 200 MTS para o número 876513064 (Ernestina Jose).")
+                    instrumentation.end_trace()
+                    return
+                set_generation_count(new_count)
+
+            streamed = False
+            try:
+                if from_cache:
+                    with instrumentation.stage("parse_resume"):
+                        resume = load_resume(resume_content)
+                elif RESUME_OUTPUT_FORMAT == "json":
+                    # Structured output arrives validated, so there is no text to parse
+                    with st.spinner("Gerando seu currículo..."):
+                        resume, resume_content = generate_resume_json(*generation_args)
+                elif OPENAI_STREAM:
+                    # Show each section as soon as its lines arrive; the final result replaces the preview
+                    streamed = True
+                    preview = st.empty()
+                    chunks = []
+                    for delta in generate_resume_stream(*generation_args):
+                        chunks.append(delta)
+                        if "\n" in delta:
+                            with preview.container():
+                                st.subheader("Seu Currículo Gerado")
+                                show_resume_preview(parse_resume("".join(chunks)))
+                    resume_content = "".join(chunks)
+                    with instrumentation.stage("parse_resume"):
+                        resume = parse_resume(resume_content)
+                    preview.empty()
                 else:
-                    st.info(f"Você tem {2 - st.session_state.generation_count} gerações de currículo restantes em sua conta gratuita.")
+                    with st.spinner("Gerando seu currículo..."):
+                        # Generate resume content
+                        resume_content = generate_resume(*generation_args)
+                        with instrumentation.stage("parse_resume"):
+                            resume = parse_resume(resume_content)
+            except Exception as e:
+                # The model call failed, so the reserved credit goes back to the user
+                if not from_cache:
+                    refund_generation(st.session_state.email, collection)
+                    set_generation_count(max(st.session_state.generation_count - 1, 0))
+                st.error(f"Erro ao gerar o currículo: {e}")
+                instrumentation.end_trace()
+                return
+
+            if not from_cache:
+                response_cache.set(cache_key, resume_content)
+                record_generation(
+                    get_history_collection(), st.session_state.email, cache_key, resume_content,
+                    selected_template, (name, phone, linkedin), trace.totals(),
+                )
+                # The history pages read before this generation are out of date
+                st.session_state.history_pages = {}
+                st.session_state.history_cursors = [None]
+
+            # Keep the result in the session, so reruns (e.g. clicking a download button) show it again
+            result = GenerationResult(
+                cache_key=cache_key,
+                content=resume_content,
+                resume=resume,
+                contact=(name, st.session_state.email, phone, linkedin),
+                template=selected_template,
+                from_cache=from_cache,
+                streamed=streamed,
+            )
+            st.session_state.generation_result = result
+            generated = True
+
+    if st.session_state.get("generation_job_id") is not None:
+        show_generation_job(st.session_state.generation_job_id)
+
+    # Display the last result, exported with the template selected now
+    if result is not None:
+        show_generation_result(result, selected_template, templates_dir, inputs_changed=result.cache_key != cache_key)
+
+    if generated:
+        # Show warning if user reached limit after this generation
+        if st.session_state.generation_count >= GENERATION_LIMIT:
+            st.warning("⚠️ Você atingiu o limite de currículos gratuitos. Para gerar mais currículos, por favor, realize um pagamento. Pague uma taxa de 200 MTS para o número 876513064 (Ernestina Jose).")
+            # st.button("Realizar Pagamento", type="primary")
+        else:
+            st.info(f"Você tem {GENERATION_LIMIT - st.session_state.generation_count} gerações de currículo restantes em sua conta gratuita.")
+
+    if trace is not None:
+        instrumentation.end_trace()
+        if is_admin(st.session_state.email):
+            with st.expander("Tempos desta geração (admin)"):
+                st.table(trace.rows())
+
+    show_generation_history(st.session_state.email, templates_dir)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file